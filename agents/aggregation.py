@@ -0,0 +1,216 @@
+"""Local clinical digest of tool results for the answer prompt.
+
+Observations are grouped by code into one row per measurement with its
+latest value, range, count and trend, and repeated conditions and
+medications are collapsed, so the model reads a few rows instead of every
+resource.
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.tool_output import flatten_value, format_tool_output
+
+LOINC_SYSTEM = 'http://loinc.org'
+
+# Relative change across the series below which a trend counts as stable
+TREND_THRESHOLD = 0.05
+
+
+def _coding(concept: Optional[Dict[str, Any]]) -> Tuple[str, str]:
+    """Return the (code, display) of a CodeableConcept, preferring LOINC."""
+    codings = (concept or {}).get('coding') or []
+    coding = next((c for c in codings if c.get('system') == LOINC_SYSTEM), codings[0] if codings else {})
+    code = coding.get('code') or (concept or {}).get('text') or 'unknown'
+    return code, coding.get('display') or (concept or {}).get('text') or code
+
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp() if value else None
+    except ValueError:
+        return None
+
+
+def _when(resource: Dict[str, Any], *fields: str) -> str:
+    for field in fields:
+        value = resource.get(field)
+        if isinstance(value, dict):
+            value = value.get('start')
+        if value:
+            return value
+    return ''
+
+
+def trend(points: List[Tuple[Optional[float], float]]) -> str:
+    """Describe a series by the sign of its least-squares slope.
+
+    Args:
+        points: (timestamp or None, value) pairs in time order. Undated points
+            are dropped when any point has a timestamp; a series with none is
+            spaced evenly
+
+    Returns:
+        "rising", "falling" or "stable", or "" for fewer than three points
+    """
+    # Positions and epoch seconds are on different scales, so a series never mixes them
+    dated = [(t, value) for t, value in points if t is not None]
+    if dated:
+        points = dated
+    else:
+        points = [(float(i), value) for i, (_, value) in enumerate(points)]
+    if len(points) < 3:
+        return ''
+    xs = [t for t, _ in points]
+    ys = [value for _, value in points]
+    n = len(points)
+    mean_x, mean_y = sum(xs) / n, sum(ys) / n
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    if not variance or not mean_y:
+        return 'stable'
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+    change = slope * (xs[-1] - xs[0]) / abs(mean_y)
+    if change > TREND_THRESHOLD:
+        return 'rising'
+    if change < -TREND_THRESHOLD:
+        return 'falling'
+    return 'stable'
+
+
+def _measurements(observation: Dict[str, Any]) -> Iterable[Tuple[str, str, Any]]:
+    """Yield (code, display, value) per measured value, one per component if any."""
+    for component in observation.get('component') or []:
+        value = next((component[k] for k in component if k.startswith('value')), None)
+        if value is not None:
+            yield (*_coding(component.get('code')), value)
+    value = next((observation[k] for k in observation if k.startswith('value')), None)
+    if value is not None:
+        yield (*_coding(observation.get('code')), value)
+
+
+def summarize_observations(observations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Group observations by code and describe each series.
+
+    Blood pressure and other multi-component observations produce one series
+    per component.
+
+    Args:
+        observations: Observation resources
+
+    Returns:
+        One row per code with display, count, latest value and date, min, max
+        and trend, most recently measured first
+    """
+    series: Dict[str, Dict[str, Any]] = {}
+    for observation in sorted(observations, key=lambda o: _when(o, 'effectiveDateTime', 'effectivePeriod', 'issued')):
+        when = _when(observation, 'effectiveDateTime', 'effectivePeriod', 'issued')
+        for code, display, value in _measurements(observation):
+            row = series.setdefault(code, {'code': code, 'display': display, 'count': 0, 'points': []})
+            row['count'] += 1
+            row['latest'], row['latest_date'] = value, when
+            if isinstance(value, dict) and isinstance(value.get('value'), (int, float)):
+                row['unit'] = value.get('unit') or value.get('code')
+                row['points'].append((_timestamp(when), float(value['value'])))
+
+    rows = []
+    for row in series.values():
+        points = row.pop('points')
+        numbers = [value for _, value in points]
+        rows.append({
+            'code': row['code'],
+            'display': row['display'],
+            'count': row['count'],
+            'latest': flatten_value(row['latest']),
+            'latest_date': row['latest_date'],
+            'min': min(numbers) if numbers else None,
+            'max': max(numbers) if numbers else None,
+            'unit': row.get('unit'),
+            'trend': trend(points),
+        })
+    return sorted(rows, key=lambda r: r['latest_date'], reverse=True)
+
+
+def summarize_conditions(conditions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Collapse repeated conditions into one row per code.
+
+    Args:
+        conditions: Condition resources
+
+    Returns:
+        One row per code with the latest clinical status, earliest onset and
+        number of records
+    """
+    rows: Dict[str, Dict[str, Any]] = {}
+    for condition in sorted(conditions, key=lambda c: _when(c, 'recordedDate', 'onsetDateTime')):
+        code, display = _coding(condition.get('code'))
+        onset = _when(condition, 'onsetDateTime', 'onsetPeriod', 'recordedDate')
+        row = rows.setdefault(code, {'code': code, 'condition': display, 'onset': onset, 'records': 0})
+        row['records'] += 1
+        row['status'] = flatten_value(condition.get('clinicalStatus'))
+        if onset and (not row['onset'] or onset < row['onset']):
+            row['onset'] = onset
+    return list(rows.values())
+
+
+def summarize_medications(medications: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Collapse repeated medication requests into one row per medication.
+
+    Args:
+        medications: MedicationRequest resources
+
+    Returns:
+        One row per medication with the latest status, authored date and
+        dosage, and the number of requests
+    """
+    rows: Dict[str, Dict[str, Any]] = {}
+    for medication in sorted(medications, key=lambda m: m.get('authoredOn') or ''):
+        concept = medication.get('medicationCodeableConcept')
+        if concept:
+            code, display = _coding(concept)
+        else:
+            code = display = flatten_value(medication.get('medicationReference')) or 'unknown'
+        row = rows.setdefault(code, {'code': code, 'medication': display, 'requests': 0})
+        row['requests'] += 1
+        row['status'] = medication.get('status')
+        row['last_authored'] = medication.get('authoredOn')
+        dosage = medication.get('dosageInstruction') or []
+        if dosage:
+            row['dosage'] = dosage[0].get('text') or flatten_value(dosage[0].get('timing'))
+    return list(rows.values())
+
+
+def record_count(records: Dict[str, List[Dict[str, Any]]]) -> int:
+    """Number of resources across all types of a tool artifact."""
+    return sum(len(resources) for resources in records.values())
+
+
+def clinical_digest(records: Dict[str, List[Dict[str, Any]]], totals: Optional[Dict[str, int]] = None) -> str:
+    """Render a compact digest of a tool's resources for the answer prompt.
+
+    Args:
+        records: Resources by type, as attached by the tools
+        totals: Server-side totals by type when only a page was fetched
+
+    Returns:
+        Compact text with one section per resource type
+    """
+    digest: Dict[str, Any] = {}
+    for patient in records.get('Patient', []):
+        digest['patient'] = {key: patient.get(key) for key in ('id', 'name', 'gender', 'birthDate', 'address')}
+    if records.get('Observation'):
+        digest['observations by code'] = summarize_observations(records['Observation'])
+    if records.get('Condition'):
+        digest['conditions'] = summarize_conditions(records['Condition'])
+    if records.get('Encounter'):
+        digest['encounters'] = [
+            {'id': e.get('id'), 'status': e.get('status'), 'class': e.get('class'), 'type': e.get('type'),
+             'period': e.get('period')}
+            for e in records['Encounter']
+        ]
+    if records.get('MedicationRequest'):
+        digest['medications'] = summarize_medications(records['MedicationRequest'])
+    digest['records summarized'] = ', '.join(
+        f"{resource_type}={len(resources)}" + (f" of {totals[resource_type]}" if totals and resource_type in totals
+                                               and totals[resource_type] != len(resources) else '')
+        for resource_type, resources in records.items() if resource_type != 'Patient'
+    )
+    return format_tool_output(digest)
@@ -1,25 +1,102 @@
 """LangGraph definition for the healthcare agent."""
+import sqlite3
+import threading
+from typing import Callable, Optional
+
+import aiosqlite
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from langgraph.graph import StateGraph, END
+from langgraph.graph.state import CompiledStateGraph
 from agents.state import AgentState
-from agents.nodes import intent_classifier_node, agent_node, response_formatter_node
+from agents.nodes import (
+    prefetch_node,
+    aprefetch_node,
+    intent_classifier_node,
+    aintent_classifier_node,
+    agent_node,
+    aagent_node,
+    response_formatter_node,
+)
+from config import CHECKPOINT_PATH
+from utils import telemetry
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def create_healthcare_graph():
+def sqlite_checkpointer(path: str = CHECKPOINT_PATH) -> SqliteSaver:
+    """Create a checkpointer for ``invoke``/``stream`` backed by a SQLite file.
+
+    Args:
+        path: SQLite database file, or ':memory:'
+
+    Returns:
+        Checkpointer that may be shared between threads
+    """
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL keeps the database consistent on a crash; only the last turn may be lost
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return SqliteSaver(conn)
+
+
+async def async_sqlite_checkpointer(path: str = CHECKPOINT_PATH) -> AsyncSqliteSaver:
+    """Create a checkpointer for ``ainvoke``/``astream`` backed by a SQLite file.
+
+    Must be called from the event loop that will run the graph.
+
+    Args:
+        path: SQLite database file, or ':memory:'
+
+    Returns:
+        Checkpointer bound to the running event loop
+    """
+    conn = await aiosqlite.connect(path)
+    await conn.execute("PRAGMA journal_mode=WAL")
+    await conn.execute("PRAGMA synchronous=NORMAL")
+    return AsyncSqliteSaver(conn)
+
+
+def traced_node(name: str, func: Callable, afunc: Optional[Callable] = None) -> RunnableLambda:
+    """Wrap a node's functions so each run is recorded as a span named after the node.
+
+    Args:
+        name: Node name
+        func: Function used by ``invoke``/``stream``
+        afunc: Function used by ``ainvoke``/``astream``, if the node has one
+
+    Returns:
+        Runnable for ``StateGraph.add_node``
+    """
+    trace = telemetry.traced('graph_node', name)
+    return RunnableLambda(trace(func), afunc=trace(afunc) if afunc else None, name=name)
+
+
+def create_healthcare_graph(checkpointer: Optional[BaseCheckpointSaver] = None):
     """Create and compile the healthcare agent graph.
 
+    With a checkpointer, state is saved per ``thread_id`` in the run config,
+    so each turn only needs to pass the new query; see ``turn_input``.
+
+    Args:
+        checkpointer: Where to persist conversation state between turns, or
+            None to keep state only for the duration of a run
+
     Returns:
         Compiled LangGraph
     """
     # Create the graph
     workflow = StateGraph(AgentState)
 
-    # Add nodes
-    workflow.add_node("intent_classifier", intent_classifier_node)
-    workflow.add_node("agent", agent_node)
-    workflow.add_node("response_formatter", response_formatter_node)
+    # Add nodes; invoke runs the sync functions, ainvoke/astream the async ones
+    workflow.add_node("prefetch", traced_node("prefetch", prefetch_node, aprefetch_node))
+    workflow.add_node("intent_classifier",
+                      traced_node("intent_classifier", intent_classifier_node, aintent_classifier_node))
+    workflow.add_node("agent", traced_node("agent", agent_node, aagent_node))
+    workflow.add_node("response_formatter", traced_node("response_formatter", response_formatter_node))
 
     # Define routing logic
     def route_after_intent(state: AgentState) -> str:
@@ -47,7 +124,9 @@ def create_healthcare_graph():
         return "response_formatter"
 
     # Add edges
-    workflow.set_entry_point("intent_classifier")
+    # Prefetching starts first and runs behind the model calls of the next nodes
+    workflow.set_entry_point("prefetch")
+    workflow.add_edge("prefetch", "intent_classifier")
     workflow.add_conditional_edges(
         "intent_classifier",
         route_after_intent,
@@ -65,12 +144,49 @@ def create_healthcare_graph():
     workflow.add_edge("response_formatter", END)
 
     # Compile the graph
-    app = workflow.compile()
+    app = workflow.compile(checkpointer=checkpointer)
 
     logger.info("Healthcare agent graph compiled successfully")
     return app
 
 
-# Create the graph instance
-healthcare_graph = create_healthcare_graph()
+def turn_input(user_query: str) -> AgentState:
+    """Build the graph input for one turn of a checkpointed conversation.
+
+    History comes from the checkpoint; per-turn fields are reset.
+
+    Args:
+        user_query: The new user message
+
+    Returns:
+        Partial state for ``invoke``/``astream``
+    """
+    return {
+        "user_query": user_query,
+        "intent": None,
+        "resource_type": None,
+        "operation": None,
+        "fhir_params": None,
+        "fhir_response": None,
+        "prefetch_id": None,
+        "agent_response": None,
+        "error": None,
+        "iteration_count": 0
+    }
+
+
+# Graph without a checkpointer, compiled on first use; the UI compiles its own
+# with a persistent checkpointer
+healthcare_graph: Optional[CompiledStateGraph] = None
+_graph_lock = threading.Lock()
+
+
+def get_healthcare_graph() -> CompiledStateGraph:
+    """Return the graph without a checkpointer, compiling it on first use."""
+    global healthcare_graph
+    if healthcare_graph is None:
+        with _graph_lock:
+            if healthcare_graph is None:
+                healthcare_graph = create_healthcare_graph()
+    return healthcare_graph
 
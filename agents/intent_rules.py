@@ -0,0 +1,99 @@
+"""Rule-based intent classification that avoids an LLM call for common queries."""
+import re
+import threading
+from typing import Any, Dict, Optional
+
+GREETING = re.compile(
+    r"^\s*(hi|hello|hey|good (morning|afternoon|evening)|thanks|thank you|bye|goodbye)\b(?:[\s!.,?]+\w+){0,3}[\s!.?]*$",
+    re.I,
+)
+PATIENT_ID = re.compile(r"\bpatients?\s+(?:id\s+|#\s*)?([A-Za-z0-9\-.]*\d[A-Za-z0-9\-.]*)\b", re.I)
+SEARCH = re.compile(r"\b(search|find|look up|lookup|named|family name|given name|born on|patients with)\b", re.I)
+CREATE = re.compile(r"\b(create|add|register|record a new|new patient)\b", re.I)
+UPDATE = re.compile(r"\b(update|change|modify|edit|correct)\b", re.I)
+ALL_DATA = re.compile(r"\b(all data|all (the )?information|everything|complete|full (record|history)|summary)\b", re.I)
+PATIENT_WORDS = re.compile(r"\b(patient|demographics?|record)s?\b", re.I)
+
+# Keyword patterns per resource type; more than one match means "All"
+RESOURCE_KEYWORDS = {
+    'Observation': re.compile(r"\b(observations?|vitals?|vital signs?|labs?|lab results?|blood pressure|"
+                              r"temperature|heart rate|weight|height|bmi|measurements?)\b", re.I),
+    'Condition': re.compile(r"\b(conditions?|diagnos[ie]s|problems?|diseases?)\b", re.I),
+    'Encounter': re.compile(r"\b(encounters?|visits?|appointments?|admissions?|hospitali[sz]ations?)\b", re.I),
+    'MedicationRequest': re.compile(r"\b(medications?|meds|prescriptions?|drugs?|medicines?)\b", re.I),
+}
+
+
+def classify_by_rules(query: str) -> Optional[Dict[str, Any]]:
+    """Classify a query without the LLM.
+
+    Args:
+        query: User query
+
+    Returns:
+        Dict with intent, resource_type, operation and a confidence between 0
+        and 1, or None if no rule applies
+    """
+    resource_types = [name for name, pattern in RESOURCE_KEYWORDS.items() if pattern.search(query)]
+    patient_id = PATIENT_ID.search(query)
+
+    if GREETING.match(query) and not patient_id and not resource_types:
+        return {'intent': 'greeting', 'resource_type': None, 'operation': None, 'confidence': 0.95}
+
+    if CREATE.search(query) or UPDATE.search(query):
+        operation = 'create' if CREATE.search(query) else 'update'
+        resource_type = resource_types[0] if len(resource_types) == 1 else 'Patient'
+        # Writes need the model to build the resource, so only routing is decided here
+        return {'intent': 'patient_data_query', 'resource_type': resource_type, 'operation': operation,
+                'confidence': 0.85 if patient_id or operation == 'create' else 0.5}
+
+    if SEARCH.search(query) and not patient_id:
+        resource_type = resource_types[0] if len(resource_types) == 1 else 'Patient'
+        return {'intent': 'search_query', 'resource_type': resource_type, 'operation': 'search',
+                'confidence': 0.9}
+
+    if patient_id:
+        if ALL_DATA.search(query) or len(resource_types) > 1:
+            resource_type, confidence = 'All', 0.9
+        elif resource_types:
+            resource_type, confidence = resource_types[0], 0.95
+        else:
+            resource_type, confidence = 'Patient', 0.85
+        return {'intent': 'patient_data_query', 'resource_type': resource_type, 'operation': 'read',
+                'confidence': confidence}
+
+    if resource_types or PATIENT_WORDS.search(query):
+        # Asks about patient data without saying which patient
+        return {'intent': 'clarification_needed', 'resource_type': resource_types[0] if resource_types else None,
+                'operation': 'read', 'confidence': 0.6}
+    return None
+
+
+class IntentStats:
+    """Thread-safe counts of which path classified each query."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def record(self, path: str) -> None:
+        """Count one classification.
+
+        Args:
+            path: "rules", "llm" or "llm_error"
+        """
+        with self._lock:
+            self.counts[path] = self.counts.get(path, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counts and hit rates per path."""
+        with self._lock:
+            total = sum(self.counts.values())
+            return {
+                'total': total,
+                'counts': dict(self.counts),
+                'hit_rates': {path: count / total for path, count in self.counts.items()} if total else {},
+            }
+
+
+intent_stats = IntentStats()
@@ -0,0 +1,113 @@
+"""Bounded, token-aware conversation history with a rolling summary."""
+import re
+from typing import Callable, Dict, List, Optional
+
+from config import CONVERSATION_MAX_MESSAGES, CONVERSATION_SUMMARY_TOKENS, CONVERSATION_TOKEN_BUDGET
+
+Message = Dict[str, str]
+
+# Roles that carry conversation; anything else is graph bookkeeping
+CONVERSATION_ROLES = ('user', 'assistant', 'system')
+
+SUMMARY_PREFIX = "Summary of earlier conversation:\n"
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s|\n")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of English text at about four characters per token."""
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text so that ``estimate_tokens`` stays within ``max_tokens``."""
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else text[:max(0, max_chars - 3)].rstrip() + '...'
+
+
+def gist(text: str, max_chars: int = 160) -> str:
+    """Return the first sentence or line of text, shortened to ``max_chars``."""
+    first = SENTENCE_END.split(text.strip(), 1)[0]
+    return first if len(first) <= max_chars else first[:max_chars - 3].rstrip() + '...'
+
+
+def extractive_summary(summary: str, turns: List[Message]) -> str:
+    """Fold turns into the summary as one short line each, without a model call.
+
+    Args:
+        summary: Summary so far, one line per turn
+        turns: Turns leaving the recent window, oldest first
+
+    Returns:
+        Updated summary
+    """
+    lines = [summary] if summary else []
+    lines.extend(f"{turn['role'].title()}: {gist(turn['content'])}" for turn in turns)
+    return '\n'.join(lines)
+
+
+def compact_messages(
+    messages: List[Message],
+    token_budget: int = CONVERSATION_TOKEN_BUDGET,
+    summary_tokens: int = CONVERSATION_SUMMARY_TOKENS,
+    summarize: Callable[[str, List[Message]], str] = extractive_summary,
+    max_messages: Optional[int] = None,
+) -> List[Message]:
+    """Keep recent turns within a token budget, folding older ones into a summary.
+
+    When the turns exceed the budget, the oldest are folded into the summary
+    until half the budget is left, so summarizing happens every few turns
+    rather than on each one. Turns beyond ``max_messages`` are folded in the
+    same way. The summary is capped by dropping its oldest lines, so the
+    result stays the same size however long the chat runs.
+
+    Args:
+        messages: Conversation, optionally starting with a summary system message
+        token_budget: Estimated tokens kept as verbatim recent turns
+        summary_tokens: Estimated tokens kept in the summary of older turns
+        summarize: Folds evicted turns into the summary; receives the current
+            summary and the turns, oldest first
+        max_messages: Most recent turns kept verbatim, unlimited if None
+
+    Returns:
+        Summary system message, if any, followed by the recent turns
+    """
+    summary = ''
+    turns = list(messages)
+    if turns and turns[0]['role'] == 'system' and turns[0]['content'].startswith(SUMMARY_PREFIX):
+        summary = turns.pop(0)['content'][len(SUMMARY_PREFIX):]
+    # A single turn may use at most half the budget
+    turns = [{**turn, 'content': truncate_to_tokens(turn['content'], token_budget // 2)} for turn in turns]
+
+    tokens = sum(estimate_tokens(turn['content']) for turn in turns)
+    target = token_budget // 2 if tokens > token_budget else token_budget
+    evicted = []
+    while len(turns) > 1 and (tokens > target or (max_messages is not None and len(turns) > max_messages)):
+        turn = turns.pop(0)
+        tokens -= estimate_tokens(turn['content'])
+        evicted.append(turn)
+    if evicted:
+        summary = summarize(summary, evicted)
+        while estimate_tokens(summary) > summary_tokens and '\n' in summary:
+            summary = summary.split('\n', 1)[1]
+        summary = truncate_to_tokens(summary, summary_tokens)
+
+    return ([{'role': 'system', 'content': SUMMARY_PREFIX + summary}] if summary else []) + turns
+
+
+def bounded_add(left: List[Message], right: List[Message]) -> List[Message]:
+    """State reducer that appends messages and keeps the history bounded.
+
+    Bookkeeping entries are dropped and the turns are compacted to the token
+    budget and to at most CONVERSATION_MAX_MESSAGES turns; older turns live on
+    in the summary.
+
+    Args:
+        left: Messages already in the state
+        right: Messages returned by a node
+
+    Returns:
+        Bounded conversation
+    """
+    merged = [m for m in (left or []) + (right or []) if m.get('role') in CONVERSATION_ROLES and m.get('content')]
+    return compact_messages(merged, max_messages=CONVERSATION_MAX_MESSAGES)
@@ -1,25 +1,390 @@
 """Node functions for the LangGraph healthcare agent."""
-from typing import Dict, Any
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
-from langchain_core.prompts import ChatPromptTemplate
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, ToolMessage
+from langchain_core.runnables import Runnable
+from langgraph.config import get_stream_writer
+from agents.aggregation import clinical_digest, record_count
 from agents.state import AgentState
-from agents.tools import healthcare_tools
-from config import OPENAI_API_KEY, OPENAI_MODEL
+from agents.intent_rules import classify_by_rules, intent_stats
+from agents.prefetch import prefetcher
+from agents.prompts import AGENT_PROMPT, ANSWER_PROMPT, CLASSIFICATION_PROMPT, log_usage
+from agents.tools import healthcare_tools, TOOLS_BY_NAME, WRITE_TOOLS
+from config import (
+    OPENAI_API_KEY,
+    OPENAI_MODEL,
+    CLINICAL_DIGEST_ENABLED,
+    CLINICAL_DIGEST_MIN_RECORDS,
+    INTENT_RULES_ENABLED,
+    INTENT_CONFIDENCE_THRESHOLD,
+    TOOL_MAX_WORKERS,
+    TOOL_TIMEOUT,
+    TOOL_TIMEOUTS,
+)
+from utils.fhir_cache import parse_ttls
+from utils.llm_cache import build_llm_cache, cache_key, dump_message, load_message, model_fingerprint
+from utils import telemetry
+import asyncio
+import contextvars
 import logging
 import json
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
-# Initialize LLM
-llm = ChatOpenAI(
-    api_key=OPENAI_API_KEY,
-    model=OPENAI_MODEL,
-    temperature=0.7
-)
+# Chat models are created on first use, so importing the nodes needs no API
+# key and stays fast; assign ``llm`` (and optionally ``llm_with_tools``) to
+# run the graph with another model
+llm: Optional[BaseChatModel] = None
+llm_with_tools: Optional[Runnable] = None
+_bound_llm: Optional[Tuple[BaseChatModel, Runnable]] = None
+_llm_lock = threading.Lock()
+
+# Responses to identical prompts are reused when LLM_CACHE_ENABLED is set
+llm_cache = build_llm_cache()
+
+# Flows whose model calls must never be answered from the cache
+WRITE_OPERATIONS = ("create", "update")
+
+# Tool calls of one turn run concurrently; FHIR requests release the GIL
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool")
+tool_timeouts = parse_ttls(TOOL_TIMEOUTS)
+
+# Tag on LLM calls whose text is the answer itself; the UI streams only these
+STREAM_TAG = "user_facing"
+
+
+def build_llm() -> BaseChatModel:
+    """Create the OpenAI chat model from the configuration."""
+    # langchain_openai takes most of the import time of the agent
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        api_key=OPENAI_API_KEY,
+        model=OPENAI_MODEL,
+        temperature=0.7,
+        # Report token usage, including prompt-cache hits, on streamed responses too
+        stream_usage=True
+    )
+
+
+def get_llm() -> BaseChatModel:
+    """Return the chat model, creating it on first use."""
+    global llm
+    if llm is None:
+        with _llm_lock:
+            if llm is None:
+                llm = build_llm()
+    return llm
+
+
+def get_llm_with_tools() -> Runnable:
+    """Return the chat model with the healthcare tools bound.
+
+    An assigned ``llm_with_tools`` wins; otherwise the binding follows
+    whatever ``get_llm`` returns, so replacing ``llm`` is enough.
+    """
+    global _bound_llm
+    if llm_with_tools is not None:
+        return llm_with_tools
+    model = get_llm()
+    bound = _bound_llm
+    if bound is None or bound[0] is not model:
+        bound = _bound_llm = (model, model.bind_tools(healthcare_tools))
+    return bound[1]
+
+
+def stream_writer() -> Optional[Callable[[Any], None]]:
+    """Return the graph's custom stream writer, or None outside a graph run."""
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return None
+
+
+def _calls_write_tool(response: BaseMessage) -> bool:
+    """Whether a model response asks for a tool that changes server data."""
+    return any(call['name'] in WRITE_TOOLS for call in getattr(response, 'tool_calls', None) or [])
+
+
+def _cache_lookup(model: Any, messages: List[BaseMessage], tool_results: List[str],
+                  cacheable: bool) -> Tuple[Optional[str], Optional[BaseMessage]]:
+    """Return the cache key and cached response for a model call, if caching applies."""
+    if llm_cache is None or not cacheable:
+        return None, None
+    key = cache_key(model_fingerprint(model), messages, tool_results)
+    value = llm_cache.get(key)
+    return key, load_message(value) if value is not None else None
+
+
+def _cache_store(key: Optional[str], response: BaseMessage) -> None:
+    """Cache a response unless it asks for a write."""
+    if key is None or _calls_write_tool(response):
+        return
+    llm_cache.set(key, dump_message(response))
+
+
+def _llm_attributes(model: Any) -> Dict[str, Any]:
+    """Initial attributes of a model call span; tool bindings report their bound model."""
+    bound = getattr(model, 'bound', model)
+    return {'gen_ai.operation.name': 'chat',
+            'gen_ai.request.model': getattr(bound, 'model_name', None) or type(bound).__name__}
+
+
+def call_model(prompt: str, model: Any, messages: List[BaseMessage], tool_results: Optional[List[str]] = None,
+               cacheable: bool = True, config: Optional[Dict[str, Any]] = None) -> BaseMessage:
+    """Invoke a chat model through the response cache.
+
+    Responses that call a write tool are never stored, and callers pass
+    ``cacheable=False`` for create and update flows so they always reach the
+    model.
+
+    Args:
+        prompt: Prompt name used when logging token usage
+        model: Chat model or tool binding
+        messages: Prompt messages
+        tool_results: Tool outputs the answer is grounded on, part of the key
+        cacheable: Whether the cache may answer or store this call
+        config: Runnable config, e.g. stream tags
 
-# Bind tools to LLM
-llm_with_tools = llm.bind_tools(healthcare_tools)
+    Returns:
+        Model response
+    """
+    with telemetry.span('llm_call', prompt, _llm_attributes(model), telemetry.SPAN_KIND_CLIENT) as span:
+        key, cached = _cache_lookup(model, messages, tool_results or [], cacheable)
+        span.set_attribute('llm.cache_hit', cached is not None)
+        if cached is not None:
+            logger.debug("Model response served from cache")
+            return cached
+        response = model.invoke(messages, config=config)
+        log_usage(prompt, response)
+        _cache_store(key, response)
+        return response
+
+
+async def acall_model(prompt: str, model: Any, messages: List[BaseMessage], tool_results: Optional[List[str]] = None,
+                      cacheable: bool = True, config: Optional[Dict[str, Any]] = None) -> BaseMessage:
+    """Async counterpart of ``call_model``."""
+    with telemetry.span('llm_call', prompt, _llm_attributes(model), telemetry.SPAN_KIND_CLIENT) as span:
+        key, cached = _cache_lookup(model, messages, tool_results or [], cacheable)
+        span.set_attribute('llm.cache_hit', cached is not None)
+        if cached is not None:
+            logger.debug("Model response served from cache")
+            return cached
+        response = await model.ainvoke(messages, config=config)
+        log_usage(prompt, response)
+        _cache_store(key, response)
+        return response
+
+
+def _tool_input(tool_call: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """Build the ToolCall a tool is invoked with, so it returns a ToolMessage with its artifact."""
+    return {"name": tool_call.get('name'), "args": tool_call.get('args', {}),
+            "id": tool_call.get('id') or f"call_{index}", "type": "tool_call"}
+
+
+def _tool_output(output: Any) -> Tuple[str, str]:
+    """Split a tool's output into the text reported to the user and the text for the answer prompt.
+
+    Data tools attach the resources behind their text as the message
+    artifact; results with at least CLINICAL_DIGEST_MIN_RECORDS resources
+    reach the prompt as a clinical digest instead of the raw listing.
+
+    Args:
+        output: ToolMessage returned by the tool, or its plain result
+
+    Returns:
+        Tuple of (raw result, prompt text)
+    """
+    if not isinstance(output, ToolMessage):
+        return str(output), str(output)
+    content = str(output.content)
+    artifact = output.artifact
+    if CLINICAL_DIGEST_ENABLED and artifact and record_count(artifact["records"]) >= CLINICAL_DIGEST_MIN_RECORDS:
+        return content, clinical_digest(artifact["records"], artifact.get("totals"))
+    return content, content
+
+
+def _run_tool(tool: Any, tool_input: Dict[str, Any]) -> Any:
+    """Invoke a tool in a span recording the size of its result."""
+    with telemetry.span('tool', tool.name) as span:
+        output = tool.invoke(tool_input)
+        span.set_attribute('tool.result.size', len(str(getattr(output, 'content', output))))
+        return output
+
+
+async def _arun_tool(tool: Any, tool_input: Dict[str, Any]) -> Any:
+    """Async counterpart of ``_run_tool``."""
+    with telemetry.span('tool', tool.name) as span:
+        output = await tool.ainvoke(tool_input)
+        span.set_attribute('tool.result.size', len(str(getattr(output, 'content', output))))
+        return output
+
+
+def _record_timeout(tool_name: str) -> None:
+    telemetry.metrics.counter('tool_timeouts_total', 'Tool calls abandoned after their timeout').inc(
+        {'name': tool_name})
+
+
+def execute_tool_calls(tool_calls: List[Dict[str, Any]],
+                       on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[str]:
+    """Run the tool calls of one model response concurrently.
+
+    Each call's timeout counts from when the batch was submitted, so a turn
+    takes about as long as its slowest call. A call that times out or raises
+    is reported in its result instead of failing the whole turn; a timed-out
+    tool keeps running in the background but its result is discarded. Large
+    clinical results are returned as their digest (see ``_tool_output``).
+
+    Args:
+        tool_calls: Tool calls from the model response
+        on_result: Called with the tool name, args, result and elapsed seconds
+            as soon as each call finishes
+
+    Returns:
+        "Tool: name\nResult: ..." strings in the order the calls were made
+    """
+    started = time.monotonic()
+    submitted = {}
+    for tool_call in tool_calls:
+        tool_name = tool_call.get('name')
+        tool_args = tool_call.get('args', {})
+        tool = TOOLS_BY_NAME.get(tool_name)
+        if tool is None:
+            logger.warning(f"Model requested unknown tool: {tool_name}")
+            continue
+        logger.info(f"Executing tool: {tool_name} with args: {tool_args}")
+        timeout = tool_timeouts.get(tool_name, TOOL_TIMEOUT)
+        # Run in a copy of this context so the tool's span nests under the current one
+        future = tool_executor.submit(contextvars.copy_context().run, _run_tool, tool,
+                                      _tool_input(tool_call, len(submitted)))
+        submitted[future] = (len(submitted), tool_name, tool_args, timeout)
+
+    tool_results: List[str] = [''] * len(submitted)
+    pending = set(submitted)
+    while pending:
+        next_deadline = min(started + submitted[future][3] for future in pending)
+        done, pending = wait(pending, timeout=max(0.0, next_deadline - time.monotonic()),
+                             return_when=FIRST_COMPLETED)
+        elapsed = time.monotonic() - started
+        expired = {future for future in pending if submitted[future][3] <= elapsed}
+        pending -= expired
+        for future in sorted(done | expired, key=lambda f: submitted[f][0]):
+            index, tool_name, tool_args, timeout = submitted[future]
+            if future in expired:
+                future.cancel()
+                _record_timeout(tool_name)
+                logger.error(f"Tool {tool_name} timed out after {timeout:g}s")
+                result = prompt_text = f"Error: {tool_name} did not finish within {timeout:g} seconds"
+            else:
+                try:
+                    result, prompt_text = _tool_output(future.result())
+                except Exception as e:
+                    logger.error(f"Tool {tool_name} failed: {e}")
+                    result = prompt_text = f"Error: {tool_name} failed: {str(e)}"
+            tool_results[index] = f"Tool: {tool_name}\nResult: {prompt_text}"
+            if on_result:
+                on_result({"tool": tool_name, "args": tool_args, "result": result, "seconds": round(elapsed, 3)})
+    return tool_results
+
+
+async def aexecute_tool_calls(tool_calls: List[Dict[str, Any]],
+                              on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[str]:
+    """Async counterpart of ``execute_tool_calls`` running tools on the event loop.
+
+    Args:
+        tool_calls: Tool calls from the model response
+        on_result: Called with the tool name, args, result and elapsed seconds
+            as soon as each call finishes
+
+    Returns:
+        "Tool: name\nResult: ..." strings in the order the calls were made
+    """
+    started = time.monotonic()
+
+    async def run(tool: Any, tool_call: Dict[str, Any], index: int) -> str:
+        tool_name = tool_call.get('name')
+        timeout = tool_timeouts.get(tool_name, TOOL_TIMEOUT)
+        try:
+            result, prompt_text = _tool_output(
+                await asyncio.wait_for(_arun_tool(tool, _tool_input(tool_call, index)), timeout))
+        except asyncio.TimeoutError:
+            _record_timeout(tool_name)
+            logger.error(f"Tool {tool_name} timed out after {timeout:g}s")
+            result = prompt_text = f"Error: {tool_name} did not finish within {timeout:g} seconds"
+        except Exception as e:
+            logger.error(f"Tool {tool_name} failed: {e}")
+            result = prompt_text = f"Error: {tool_name} failed: {str(e)}"
+        if on_result:
+            on_result({"tool": tool_name, "args": tool_call.get('args', {}), "result": result,
+                       "seconds": round(time.monotonic() - started, 3)})
+        return f"Tool: {tool_name}\nResult: {prompt_text}"
+
+    calls = []
+    for tool_call in tool_calls:
+        tool_name = tool_call.get('name')
+        tool_args = tool_call.get('args', {})
+        tool = TOOLS_BY_NAME.get(tool_name)
+        if tool is None:
+            logger.warning(f"Model requested unknown tool: {tool_name}")
+            continue
+        logger.info(f"Executing tool: {tool_name} with args: {tool_args}")
+        calls.append(run(tool, tool_call, len(calls)))
+    return list(await asyncio.gather(*calls))
+
+
+def _rule_classification(user_query: str) -> Optional[Dict[str, Any]]:
+    """Return the state update for a confident rule match, or None to ask the LLM."""
+    # Common queries are classified locally; only unclear ones cost a model call
+    rule_result = classify_by_rules(user_query) if INTENT_RULES_ENABLED else None
+    if not rule_result or rule_result["confidence"] < INTENT_CONFIDENCE_THRESHOLD:
+        return None
+    intent_stats.record("rules")
+    logger.debug(f"Rule-classified intent {rule_result['intent']} ({rule_result['confidence']:.2f})")
+    return {
+        "intent": rule_result["intent"],
+        "resource_type": rule_result["resource_type"],
+        "operation": rule_result["operation"]
+    }
+
+
+def _llm_classification(content: str) -> Dict[str, Any]:
+    """Turn the classifier model's JSON reply into a state update."""
+    classification = json.loads(content)
+    intent_stats.record("llm")
+
+    return {
+        "intent": classification.get("intent"),
+        "resource_type": classification.get("resource_type"),
+        "operation": classification.get("operation")
+    }
+
+
+def _classification_error(e: Exception) -> Dict[str, Any]:
+    logger.error(f"Error in intent classification: {e}")
+    intent_stats.record("llm_error")
+    return {
+        "intent": "general_question",
+        "error": str(e)
+    }
+
+
+def prefetch_node(state: AgentState) -> Dict[str, Any]:
+    """Start fetching the named patient's data so it is cached by the time tools run.
+
+    Args:
+        state: Current agent state
+
+    Returns:
+        Updated state with the prefetch ID, or None if nothing was started
+    """
+    return {"prefetch_id": prefetcher.start(state.get("user_query", ""))}
+
+
+async def aprefetch_node(state: AgentState) -> Dict[str, Any]:
+    """Async counterpart of ``prefetch_node``; requests run as tasks on the event loop."""
+    return {"prefetch_id": await prefetcher.astart(state.get("user_query", ""))}
 
 
 def intent_classifier_node(state: AgentState) -> Dict[str, Any]:
@@ -32,50 +397,69 @@ def intent_classifier_node(state: AgentState) -> Dict[str, Any]:
         Updated state with intent classification
     """
     user_query = state.get("user_query", "")
+    rule_update = _rule_classification(user_query)
+    if rule_update:
+        return rule_update
 
-    classification_prompt = ChatPromptTemplate.from_messages([
-        ("system", """You are a healthcare intent classifier for a FHIR data retrieval system.
-
-Analyze the user's query and determine:
-1. The intent (greeting, patient_data_query, search_query, general_question, clarification_needed)
-2. The resource type if applicable (Patient, Observation, Condition, Encounter, MedicationRequest, All)
-3. The operation type (read, search, create, update)
-
-IMPORTANT:
-- If the query mentions a patient ID or asks for patient data, set intent to "patient_data_query"
-- If asking for "all data" or "everything" about a patient, set resource_type to "All"
-- If the query is unclear or missing required info (like patient ID), set intent to "clarification_needed"
+    try:
+        response = call_model("classification", get_llm(), CLASSIFICATION_PROMPT.format_messages(query=user_query))
+        return _llm_classification(response.content)
+    except Exception as e:
+        return _classification_error(e)
 
-Respond in JSON format:
-{"intent": "...", "resource_type": "...", "operation": "...", "requires_clarification": false}
 
-Examples:
-- "Get all data for patient 592598" -> {"intent": "patient_data_query", "resource_type": "All", "operation": "read"}
-- "Show observations for patient 123" -> {"intent": "patient_data_query", "resource_type": "Observation", "operation": "read"}
-- "What conditions does patient 456 have?" -> {"intent": "patient_data_query", "resource_type": "Condition", "operation": "read"}
-- "Search for patients named Smith" -> {"intent": "search_query", "resource_type": "Patient", "operation": "search"}
-- "Tell me about a patient" -> {"intent": "clarification_needed", "requires_clarification": true}
-"""),
-        ("human", "{query}")
-    ])
+async def aintent_classifier_node(state: AgentState) -> Dict[str, Any]:
+    """Async counterpart of ``intent_classifier_node``."""
+    user_query = state.get("user_query", "")
+    rule_update = _rule_classification(user_query)
+    if rule_update:
+        return rule_update
 
     try:
-        response = llm.invoke(classification_prompt.format_messages(query=user_query))
-        classification = json.loads(response.content)
-
-        return {
-            "intent": classification.get("intent"),
-            "resource_type": classification.get("resource_type"),
-            "operation": classification.get("operation"),
-            "messages": [{"role": "assistant", "content": f"Classified intent: {classification.get('intent')}"}]
-        }
+        response = await acall_model("classification", get_llm(),
+                                     CLASSIFICATION_PROMPT.format_messages(query=user_query))
+        return _llm_classification(response.content)
     except Exception as e:
-        logger.error(f"Error in intent classification: {e}")
-        return {
-            "intent": "general_question",
-            "error": str(e),
-            "messages": [{"role": "assistant", "content": "Processing your request..."}]
-        }
+        return _classification_error(e)
+
+
+def _agent_messages(state: AgentState) -> List[BaseMessage]:
+    """Build the agent prompt from the bounded history and current query."""
+    # History is already bounded by the bounded_add reducer (compact_messages in agents/memory.py)
+    return AGENT_PROMPT.format_messages(history=state.get("messages", []), query=state.get("user_query", ""))
+
+
+def _final_messages(tool_results: List[str], user_query: str) -> List[BaseMessage]:
+    """Build the prompt that turns tool results into the answer."""
+    return ANSWER_PROMPT.format_messages(tool_results="\n\n".join(tool_results), query=user_query)
+
+
+def _tool_event_callback() -> Optional[Callable[[Dict[str, Any]], None]]:
+    writer = stream_writer()
+    return (lambda event: writer({"type": "tool_result", **event})) if writer else None
+
+
+def _turn_messages(state: AgentState, agent_response: str) -> List[Dict[str, str]]:
+    """Record the query and answer; the prompt passed the query separately from history."""
+    return [{"role": "user", "content": state.get("user_query", "")}, {"role": "assistant", "content": agent_response}]
+
+
+def _agent_update(state: AgentState, agent_response: str) -> Dict[str, Any]:
+    return {
+        "agent_response": agent_response,
+        "messages": _turn_messages(state, agent_response),
+        "iteration_count": state.get("iteration_count", 0) + 1
+    }
+
+
+def _agent_error(state: AgentState, e: Exception) -> Dict[str, Any]:
+    logger.error(f"Error in agent node: {e}")
+    error_msg = f"I apologize, but I encountered an error while trying to fetch data from the FHIR server: {str(e)}"
+    return {
+        "agent_response": error_msg,
+        "error": str(e),
+        "messages": _turn_messages(state, error_msg)
+    }
 
 
 def agent_node(state: AgentState) -> Dict[str, Any]:
@@ -87,117 +471,63 @@ def agent_node(state: AgentState) -> Dict[str, Any]:
     Returns:
         Updated state with agent actions
     """
-    user_query = state.get("user_query", "")
-    intent = state.get("intent", "")
-    messages = state.get("messages", [])
-
-    # Build conversation history
-    conversation = []
-    for msg in messages[-10:]:  # Keep last 10 messages for context
-        if msg.get("role") == "user":
-            conversation.append(HumanMessage(content=msg.get("content", "")))
-        elif msg.get("role") == "assistant":
-            conversation.append(AIMessage(content=msg.get("content", "")))
-
-    # Add current query
-    conversation.append(HumanMessage(content=user_query))
-
-    system_prompt = """You are a FHIR healthcare data assistant. You MUST follow these strict rules:
-
-CRITICAL RULES - NEVER VIOLATE:
-1. NEVER hallucinate or make up patient data
-2. ONLY provide information that comes directly from FHIR API calls via tools
-3. If data is not available from the API, explicitly state "This information is not available in the FHIR system"
-4. ALWAYS use tools to fetch data before answering patient-specific questions
-5. NEVER provide medical diagnosis or medical advice
-6. If a query is ambiguous, ask clarifying questions
-
-WHAT YOU CAN DO:
-- Retrieve patient demographics from the FHIR server
-- Fetch observations, conditions, encounters, and medication requests
-- Search for patients
-- Explain FHIR resources and healthcare data standards
-- Answer general questions about the system's capabilities
-
-WHAT YOU CANNOT DO:
-- Diagnose medical conditions
-- Recommend treatments or medications
-- Make up or infer patient data that wasn't retrieved from FHIR
-- Provide medical advice
-
-DATA RETRIEVAL:
-- Always fetch fresh data from the FHIR server using the provided tools
-- If data is missing, say "No [resource type] data found for this patient"
-- Format responses in a clear, human-readable way
-- Include relevant context from the FHIR data
-
-MEDICAL DISCLAIMER:
-Always remind users that you cannot provide medical advice and that they should consult healthcare professionals for medical decisions.
-
-When creating or updating FHIR resources, ensure the data follows FHIR R4 specifications.
-"""
-
-    full_messages = [SystemMessage(content=system_prompt)] + conversation
-
+    cacheable = state.get("operation") not in WRITE_OPERATIONS
+    prefetch = prefetcher.take(state.get("prefetch_id"))
     try:
         # Invoke LLM with tools
-        response = llm_with_tools.invoke(full_messages)
+        response = call_model("agent", get_llm_with_tools(), _agent_messages(state), cacheable=cacheable,
+                              config={"tags": [STREAM_TAG]})
+        if prefetch:
+            # Requests the chosen tools repeat are now served from the cache
+            prefetch.settle(getattr(response, 'tool_calls', None) or [])
 
         # Check if tools were called
         if hasattr(response, 'tool_calls') and response.tool_calls:
-            tool_results = []
-            for tool_call in response.tool_calls:
-                # Execute tool
-                tool_name = tool_call.get('name')
-                tool_args = tool_call.get('args', {})
-
-                logger.info(f"Executing tool: {tool_name} with args: {tool_args}")
-
-                # Find and execute the tool
-                for tool in healthcare_tools:
-                    if tool.name == tool_name:
-                        result = tool.invoke(tool_args)
-                        tool_results.append(f"Tool: {tool_name}\nResult: {result}")
-                        break
-
-            # Generate final response based on tool results
-            tool_summary = "\n\n".join(tool_results)
-            final_prompt = f"""Based STRICTLY on the following tool execution results, provide a clear, accurate, human-readable response.
-
-TOOL RESULTS:
-{tool_summary}
-
-USER QUERY: {user_query}
-
-INSTRUCTIONS:
-- Use ONLY the data from the tool results above
-- Do NOT make up or infer any information
-- If data is missing or not found, explicitly state that
-- Format the response in a clear, conversational way
-- Include a medical disclaimer if relevant
-- If the query cannot be answered with the available data, say so clearly"""
-
-            final_response = llm.invoke([
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=final_prompt)
-            ])
+            tool_results = execute_tool_calls(response.tool_calls, on_result=_tool_event_callback())
+
+            # Generate final response based on tool results; fresh tool data changes the cache key
+            final_response = call_model(
+                "answer", get_llm(), _final_messages(tool_results, state.get("user_query", "")), tool_results,
+                cacheable=cacheable and not _calls_write_tool(response), config={"tags": [STREAM_TAG]}
+            )
             agent_response = final_response.content
         else:
             agent_response = response.content
 
-        return {
-            "agent_response": agent_response,
-            "messages": [{"role": "assistant", "content": agent_response}],
-            "iteration_count": state.get("iteration_count", 0) + 1
-        }
+        return _agent_update(state, agent_response)
     except Exception as e:
-        logger.error(f"Error in agent node: {e}")
-        error_msg = f"I apologize, but I encountered an error while trying to fetch data from the FHIR server: {str(e)}"
-        return {
-            "agent_response": error_msg,
-            "error": str(e),
-            "messages": [{"role": "assistant", "content": error_msg}]
-        }
+        return _agent_error(state, e)
+    finally:
+        if prefetch:
+            prefetch.cancel()
+
+
+async def aagent_node(state: AgentState) -> Dict[str, Any]:
+    """Async counterpart of ``agent_node``; tools run concurrently on the event loop."""
+    cacheable = state.get("operation") not in WRITE_OPERATIONS
+    prefetch = prefetcher.take(state.get("prefetch_id"))
+    try:
+        response = await acall_model("agent", get_llm_with_tools(), _agent_messages(state), cacheable=cacheable,
+                                     config={"tags": [STREAM_TAG]})
+        if prefetch:
+            await prefetch.asettle(getattr(response, 'tool_calls', None) or [])
+
+        if hasattr(response, 'tool_calls') and response.tool_calls:
+            tool_results = await aexecute_tool_calls(response.tool_calls, on_result=_tool_event_callback())
+            final_response = await acall_model(
+                "answer", get_llm(), _final_messages(tool_results, state.get("user_query", "")), tool_results,
+                cacheable=cacheable and not _calls_write_tool(response), config={"tags": [STREAM_TAG]}
+            )
+            agent_response = final_response.content
+        else:
+            agent_response = response.content
+
+        return _agent_update(state, agent_response)
+    except Exception as e:
+        return _agent_error(state, e)
+    finally:
+        if prefetch:
+            prefetch.cancel()
 
 
 def response_formatter_node(state: AgentState) -> Dict[str, Any]:
@@ -217,8 +547,6 @@ def response_formatter_node(state: AgentState) -> Dict[str, Any]:
     else:
         formatted_response = agent_response
 
-    return {
-        "agent_response": formatted_response,
-        "messages": [{"role": "assistant", "content": formatted_response}]
-    }
+    # The agent node already recorded the answer in messages
+    return {"agent_response": formatted_response}
 
@@ -0,0 +1,278 @@
+"""Speculative prefetch of a patient's resources while the model picks its tools.
+
+When a query names a patient, the requests of the tools it points at are
+started at the beginning of the turn and fill the FHIR cache. Once the agent
+model has chosen its tool calls, the prefetch is settled: requests a tool
+will repeat are awaited so the tool is served from the cache, and the rest
+are cancelled. Each request is counted as used or wasted.
+"""
+import asyncio
+import concurrent.futures
+import itertools
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from agents.intent_rules import ALL_DATA, PATIENT_ID, RESOURCE_KEYWORDS, classify_by_rules
+from agents.tools import (
+    CONDITION_ELEMENTS,
+    ENCOUNTER_ELEMENTS,
+    MEDICATION_ELEMENTS,
+    OBSERVATION_ELEMENTS,
+    PATIENT_SUMMARY_ELEMENTS,
+    get_async_fhir_client,
+)
+from config import FHIR_PATIENT_RECORD_STRATEGY, FHIR_PREFETCH_ENABLED, TOOL_TIMEOUT
+from utils.async_fhir_client import AsyncFHIRClient, submit
+from utils.fhir_client import PATIENT_RECORD_TYPES
+
+logger = logging.getLogger(__name__)
+
+AnyFuture = Union[concurrent.futures.Future, asyncio.Future]
+
+
+class PatientFetch(NamedTuple):
+    """One request a per-patient tool makes, with the same parameters so it shares the cache key."""
+
+    resource_type: str
+    limit: Optional[int] = None
+    elements: Optional[Tuple[str, ...]] = None
+    accurate_total: bool = False
+
+
+# Requests made by each per-patient tool in agents/tools.py; keep in sync with the tools
+TOOL_FETCHES: Dict[str, Tuple[PatientFetch, ...]] = {
+    'get_patient': (PatientFetch('Patient'),),
+    'get_patient_observations': (PatientFetch('Observation', 20, OBSERVATION_ELEMENTS),),
+    'get_patient_conditions': (PatientFetch('Condition', 20, CONDITION_ELEMENTS),),
+    'get_patient_encounters': (PatientFetch('Encounter', 20, ENCOUNTER_ELEMENTS),),
+    'get_patient_medications': (PatientFetch('MedicationRequest', 20, MEDICATION_ELEMENTS),),
+}
+# The "single" strategy fetches everything in one uncached request
+if FHIR_PATIENT_RECORD_STRATEGY != 'single':
+    TOOL_FETCHES['get_complete_patient_data'] = (
+        (PatientFetch('Patient', elements=PATIENT_SUMMARY_ELEMENTS),)
+        + tuple(PatientFetch(resource_type, 10, accurate_total=True) for resource_type in PATIENT_RECORD_TYPES)
+    )
+
+# Per-type tool the model is expected to call when a query names that type
+RESOURCE_TOOLS = {
+    'Observation': 'get_patient_observations',
+    'Condition': 'get_patient_conditions',
+    'Encounter': 'get_patient_encounters',
+    'MedicationRequest': 'get_patient_medications',
+}
+
+
+def predict_tools(query: str) -> Tuple[Optional[str], List[str]]:
+    """Guess the patient and per-patient tools a read query will lead to.
+
+    Args:
+        query: User query
+
+    Returns:
+        Tuple of (patient ID, tool names); no tools unless the query reads a
+        named patient's data
+    """
+    rule = classify_by_rules(query)
+    patient_id = PATIENT_ID.search(query)
+    if not patient_id or not rule or rule['intent'] != 'patient_data_query' or rule['operation'] != 'read':
+        return None, []
+    if ALL_DATA.search(query):
+        tools = ['get_complete_patient_data']
+    else:
+        tools = [tool for resource_type, tool in RESOURCE_TOOLS.items()
+                 if RESOURCE_KEYWORDS[resource_type].search(query)]
+    return patient_id.group(1), [tool for tool in tools or ['get_patient'] if tool in TOOL_FETCHES]
+
+
+async def fetch(client: AsyncFHIRClient, patient_id: str, request: PatientFetch) -> Any:
+    """Issue one prefetch request through the client, and so through its cache."""
+    if request.resource_type == 'Patient':
+        return await client.read_resource('Patient', patient_id, elements=request.elements)
+    params = {'patient': patient_id}
+    if request.accurate_total:
+        params['_total'] = 'accurate'
+    return await client.collect_resources(request.resource_type, params, limit=request.limit,
+                                          elements=request.elements)
+
+
+class Prefetch:
+    """Requests started for one turn, settled once the agent's tool calls are known."""
+
+    def __init__(self, patient_id: str, futures: Dict[PatientFetch, AnyFuture], stats: "PrefetchStats"):
+        """Initialize the prefetch.
+
+        Args:
+            patient_id: Patient the requests are for
+            futures: Running request per fetch
+            stats: Where outcomes are counted
+        """
+        self.patient_id = patient_id
+        self.futures = futures
+        self.stats = stats
+        self.settled = False
+
+    def needed(self, tool_calls: Iterable[Dict[str, Any]]) -> List[PatientFetch]:
+        """Return the prefetched requests the tool calls will repeat."""
+        requests = set()
+        for tool_call in tool_calls:
+            if str((tool_call.get('args') or {}).get('patient_id')) == self.patient_id:
+                requests.update(TOOL_FETCHES.get(tool_call.get('name'), ()))
+        return [request for request in self.futures if request in requests]
+
+    def settle(self, tool_calls: Iterable[Dict[str, Any]], timeout: float = TOOL_TIMEOUT) -> None:
+        """Wait for the requests the tools need, cancel the rest and count the outcomes.
+
+        Args:
+            tool_calls: Tool calls of the agent response
+            timeout: Longest wait for requests still in flight
+        """
+        needed = self.needed(tool_calls)
+        done_before = {request: future.done() for request, future in self.futures.items()}
+        waiting = [self.futures[request] for request in needed if not done_before[request]]
+        if waiting:
+            concurrent.futures.wait(waiting, timeout)
+        self._finish(needed, done_before)
+
+    async def asettle(self, tool_calls: Iterable[Dict[str, Any]], timeout: float = TOOL_TIMEOUT) -> None:
+        """Async counterpart of ``settle`` for prefetches running on the event loop."""
+        needed = self.needed(tool_calls)
+        done_before = {request: future.done() for request, future in self.futures.items()}
+        waiting = [self.futures[request] for request in needed if not done_before[request]]
+        if waiting:
+            await asyncio.wait([f if isinstance(f, asyncio.Future) else asyncio.wrap_future(f) for f in waiting],
+                               timeout=timeout)
+        self._finish(needed, done_before)
+
+    def cancel(self) -> None:
+        """Settle as if no tool used the prefetch, e.g. when the turn failed."""
+        if not self.settled:
+            self._finish([], {request: future.done() for request, future in self.futures.items()})
+
+    def _finish(self, needed: List[PatientFetch], done_before: Dict[PatientFetch, bool]) -> None:
+        if self.settled:
+            return
+        self.settled = True
+        for request, future in self.futures.items():
+            # Reading the exception also keeps asyncio from reporting it as never retrieved
+            failed = future.done() and (future.cancelled() or future.exception() is not None)
+            if request not in needed:
+                outcome = 'wasted' if done_before[request] else 'cancelled'
+            elif failed or not future.done():
+                outcome = 'failed'
+            else:
+                outcome = 'used' if done_before[request] else 'awaited'
+            future.cancel()
+            self.stats.record(outcome)
+            logger.info(f"Prefetch of {request.resource_type} for patient {self.patient_id}: {outcome}")
+
+
+class PrefetchStats:
+    """Thread-safe counts of prefetch outcomes.
+
+    "used" requests had finished when the tool needed them, "awaited" ones
+    were still in flight and the tool waited for them, "wasted" ones finished
+    but no tool needed them, and "cancelled" ones were stopped unneeded.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def record(self, outcome: str) -> None:
+        """Count one settled request."""
+        with self._lock:
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counts and the share of requests a tool used."""
+        with self._lock:
+            total = sum(self.counts.values())
+            used = self.counts.get('used', 0) + self.counts.get('awaited', 0)
+            return {'total': total, 'counts': dict(self.counts), 'used_ratio': used / total if total else 0.0}
+
+
+class Prefetcher:
+    """Starts prefetches and hands them from the prefetch node to the agent node.
+
+    Graph state only carries the prefetch ID, since running requests cannot be
+    checkpointed. Prefetches never taken (a run that stopped early) are
+    cancelled once more than ``max_pending`` are outstanding.
+    """
+
+    def __init__(self, enabled: bool = FHIR_PREFETCH_ENABLED, max_pending: int = 256):
+        """Initialize the prefetcher.
+
+        Args:
+            enabled: Whether to prefetch at all
+            max_pending: Prefetches kept before the oldest is cancelled
+        """
+        self.enabled = enabled
+        self.max_pending = max_pending
+        self.stats = PrefetchStats()
+        self._pending: "OrderedDict[str, Prefetch]" = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _plan(self, query: str) -> Tuple[Optional[str], List[PatientFetch], Optional[AsyncFHIRClient]]:
+        if not self.enabled:
+            return None, [], None
+        patient_id, tools = predict_tools(query)
+        client = get_async_fhir_client()
+        if not tools or client.cache is None:
+            # Without a cache there is nowhere to put the responses
+            return None, [], None
+        requests = list(dict.fromkeys(request for tool in tools for request in TOOL_FETCHES[tool]))
+        return patient_id, requests, client
+
+    def _register(self, prefetch: Prefetch) -> str:
+        prefetch_id = str(next(self._ids))
+        with self._lock:
+            self._pending[prefetch_id] = prefetch
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)[1].cancel()
+        logger.info(f"Prefetching {', '.join(r.resource_type for r in prefetch.futures)} "
+                    f"for patient {prefetch.patient_id}")
+        return prefetch_id
+
+    def start(self, query: str) -> Optional[str]:
+        """Start prefetching on the background loop for a synchronous graph run.
+
+        Args:
+            query: User query
+
+        Returns:
+            Prefetch ID for ``take``, or None when nothing was started
+        """
+        patient_id, requests, client = self._plan(query)
+        if not requests:
+            return None
+        futures = {request: submit(fetch(client, patient_id, request)) for request in requests}
+        return self._register(Prefetch(patient_id, futures, self.stats))
+
+    async def astart(self, query: str) -> Optional[str]:
+        """Start prefetching as tasks on the running event loop.
+
+        Args:
+            query: User query
+
+        Returns:
+            Prefetch ID for ``take``, or None when nothing was started
+        """
+        patient_id, requests, client = self._plan(query)
+        if not requests:
+            return None
+        futures = {request: asyncio.ensure_future(fetch(client, patient_id, request)) for request in requests}
+        return self._register(Prefetch(patient_id, futures, self.stats))
+
+    def take(self, prefetch_id: Optional[str]) -> Optional[Prefetch]:
+        """Remove and return a started prefetch, or None if unknown."""
+        if prefetch_id is None:
+            return None
+        with self._lock:
+            return self._pending.pop(prefetch_id, None)
+
+
+prefetcher = Prefetcher()
@@ -0,0 +1,164 @@
+"""Prompts for the agent nodes, compiled once at import.
+
+Every prompt starts with fixed system text and ends with the per-turn
+content, so the byte-identical prefix can be served from the provider's
+automatic prompt cache. Keep anything that varies per call (queries, tool
+results, dates, IDs) out of the system messages.
+"""
+import logging
+import threading
+from typing import Any, Dict
+
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from utils import telemetry
+
+logger = logging.getLogger(__name__)
+
+CLASSIFICATION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a healthcare intent classifier for a FHIR data retrieval system.
+
+Analyze the user's query and determine:
+1. The intent (greeting, patient_data_query, search_query, general_question, clarification_needed)
+2. The resource type if applicable (Patient, Observation, Condition, Encounter, MedicationRequest, All)
+3. The operation type (read, search, create, update)
+
+IMPORTANT:
+- If the query mentions a patient ID or asks for patient data, set intent to "patient_data_query"
+- If asking for "all data" or "everything" about a patient, set resource_type to "All"
+- If the query is unclear or missing required info (like patient ID), set intent to "clarification_needed"
+
+Respond in JSON format:
+{{"intent": "...", "resource_type": "...", "operation": "...", "requires_clarification": false}}
+
+Examples:
+- "Get all data for patient 592598" -> {{"intent": "patient_data_query", "resource_type": "All", "operation": "read"}}
+- "Show observations for patient 123" -> {{"intent": "patient_data_query", "resource_type": "Observation", "operation": "read"}}
+- "What conditions does patient 456 have?" -> {{"intent": "patient_data_query", "resource_type": "Condition", "operation": "read"}}
+- "Search for patients named Smith" -> {{"intent": "search_query", "resource_type": "Patient", "operation": "search"}}
+- "Tell me about a patient" -> {{"intent": "clarification_needed", "requires_clarification": true}}
+"""),
+    ("human", "{query}")
+])
+
+AGENT_SYSTEM_PROMPT = """You are a FHIR healthcare data assistant. You MUST follow these strict rules:
+
+CRITICAL RULES - NEVER VIOLATE:
+1. NEVER hallucinate or make up patient data
+2. ONLY provide information that comes directly from FHIR API calls via tools
+3. If data is not available from the API, explicitly state "This information is not available in the FHIR system"
+4. ALWAYS use tools to fetch data before answering patient-specific questions
+5. NEVER provide medical diagnosis or medical advice
+6. If a query is ambiguous, ask clarifying questions
+
+WHAT YOU CAN DO:
+- Retrieve patient demographics from the FHIR server
+- Fetch observations, conditions, encounters, and medication requests
+- Search for patients
+- Explain FHIR resources and healthcare data standards
+- Answer general questions about the system's capabilities
+
+WHAT YOU CANNOT DO:
+- Diagnose medical conditions
+- Recommend treatments or medications
+- Make up or infer patient data that wasn't retrieved from FHIR
+- Provide medical advice
+
+DATA RETRIEVAL:
+- Always fetch fresh data from the FHIR server using the provided tools
+- If data is missing, say "No [resource type] data found for this patient"
+- Format responses in a clear, human-readable way
+- Include relevant context from the FHIR data
+
+MEDICAL DISCLAIMER:
+Always remind users that you cannot provide medical advice and that they should consult healthcare professionals for medical decisions.
+
+When creating or updating FHIR resources, ensure the data follows FHIR R4 specifications.
+"""
+
+GROUNDING_INSTRUCTIONS = """
+ANSWERING FROM TOOL RESULTS:
+Based STRICTLY on the tool execution results in the user's message, provide a clear, accurate, human-readable response.
+- Use ONLY the data from the tool results
+- Do NOT make up or infer any information
+- If data is missing or not found, explicitly state that
+- Format the response in a clear, conversational way
+- Include a medical disclaimer if relevant
+- If the query cannot be answered with the available data, say so clearly
+"""
+
+# Static system prompt, then the bounded history (summary first), then the query
+AGENT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", AGENT_SYSTEM_PROMPT),
+    MessagesPlaceholder("history"),
+    ("human", "{query}")
+])
+
+# Static system prompt, so the answer call's prefix is the same on every turn. It is not
+# shared with AGENT_PROMPT's call, which binds the tools and so sends their schemas first.
+ANSWER_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", AGENT_SYSTEM_PROMPT + GROUNDING_INSTRUCTIONS),
+    ("human", "TOOL RESULTS:\n{tool_results}\n\nUSER QUERY: {query}")
+])
+
+
+class PromptCacheStats:
+    """Thread-safe per-prompt totals of input tokens and provider-cached input tokens."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals: Dict[str, Dict[str, int]] = {}
+
+    def record(self, prompt: str, usage: Dict[str, Any]) -> None:
+        """Add one call's usage.
+
+        Args:
+            prompt: Prompt name, e.g. "classification"
+            usage: The response's ``usage_metadata``
+        """
+        cached = (usage.get('input_token_details') or {}).get('cache_read') or 0
+        with self._lock:
+            totals = self.totals.setdefault(prompt, {'calls': 0, 'input_tokens': 0, 'cached_tokens': 0})
+            totals['calls'] += 1
+            totals['input_tokens'] += usage.get('input_tokens', 0)
+            totals['cached_tokens'] += cached
+
+    def stats(self) -> Dict[str, Any]:
+        """Return totals and the cached share of input tokens per prompt."""
+        with self._lock:
+            return {
+                prompt: {**totals, 'cached_ratio': totals['cached_tokens'] / totals['input_tokens']
+                         if totals['input_tokens'] else 0.0}
+                for prompt, totals in self.totals.items()
+            }
+
+
+prompt_cache_stats = PromptCacheStats()
+
+
+def log_usage(prompt: str, response: Any) -> None:
+    """Log a model call's token usage, including tokens served from the prompt cache.
+
+    The counts are also added to the current model call span and to the
+    ``llm_tokens_total`` metric.
+
+    Args:
+        prompt: Prompt name
+        response: Model response; responses without usage metadata are ignored
+    """
+    usage = getattr(response, 'usage_metadata', None)
+    if not usage:
+        return
+    cached = (usage.get('input_token_details') or {}).get('cache_read') or 0
+    logger.info(f"LLM call {prompt}: {usage.get('input_tokens', 0)} input tokens "
+                f"({cached} cached), {usage.get('output_tokens', 0)} output tokens")
+    prompt_cache_stats.record(prompt, usage)
+    tokens = {'input': usage.get('input_tokens', 0), 'output': usage.get('output_tokens', 0), 'cached': cached}
+    span = telemetry.current_span()
+    if span is not None:
+        span.set_attributes({'gen_ai.usage.input_tokens': tokens['input'],
+                             'gen_ai.usage.output_tokens': tokens['output'],
+                             'gen_ai.usage.cache_read_input_tokens': tokens['cached']})
+    counter = telemetry.metrics.counter('llm_tokens_total', 'Model tokens by prompt and type')
+    for token_type, count in tokens.items():
+        counter.inc({'prompt': prompt, 'type': token_type}, count)
@@ -1,13 +1,13 @@
 """State definitions for the LangGraph agent."""
 from typing import TypedDict, List, Optional, Dict, Any, Annotated
-import operator
+from agents.memory import bounded_add
 
 
 class AgentState(TypedDict):
     """State for the healthcare agent graph."""
 
-    # User input and conversation
-    messages: Annotated[List[Dict[str, str]], operator.add]
+    # User input and conversation; bounded_add compacts older turns into a summary (agents/memory.py)
+    messages: Annotated[List[Dict[str, str]], bounded_add]
     user_query: str
 
     # Intent and routing
@@ -18,6 +18,7 @@ class AgentState(TypedDict):
     # FHIR data
     fhir_params: Optional[Dict[str, Any]]
     fhir_response: Optional[Dict[str, Any]]
+    prefetch_id: Optional[str]  # requests started speculatively, see agents/prefetch.py
 
     # Agent output
     agent_response: Optional[str]
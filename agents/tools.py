@@ -1,12 +1,324 @@
 """Tools for the healthcare agent to interact with FHIR API."""
-from langchain.tools import tool
-from typing import Dict, Any, Optional
-from utils.fhir_client import FHIRClient
+from langchain_core.tools import tool
+from typing import Dict, Any, List, Optional, Tuple
+from utils.fhir_client import FHIRClient, PATIENT_RECORD_TYPES
+from utils.fhir_cache import FHIRCache
+from utils.async_fhir_client import AsyncFHIRClient, run_sync
+from utils.delta_sync import DeltaSync, DeltaSyncWorker
+from utils.local_store import LocalStore
+from utils.patient_index import PatientIndex
+from utils.tool_output import format_tool_output
+from config import FHIR_CACHE_ENABLED, FHIR_PATIENT_RECORD_STRATEGY, PATIENT_INDEX_ENABLED
+import asyncio
+import atexit
 import json
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
-fhir_client = FHIRClient()
+
+# Clients are created on first use, so importing the tools opens no sessions
+# or files; assign these to point the tools at another server or store
+fhir_cache: Optional[FHIRCache] = None
+fhir_client: Optional[FHIRClient] = None
+async_fhir_client: Optional[AsyncFHIRClient] = None
+local_store: Optional[LocalStore] = None
+patient_index: Optional[PatientIndex] = None
+delta_sync_worker: Optional[DeltaSyncWorker] = None
+_clients_lock = threading.RLock()
+
+
+def get_fhir_cache() -> Optional[FHIRCache]:
+    """Return the response cache shared by both FHIR clients, or None when disabled."""
+    global fhir_cache
+    if fhir_cache is None and FHIR_CACHE_ENABLED:
+        with _clients_lock:
+            if fhir_cache is None:
+                fhir_cache = FHIRCache()
+    return fhir_cache
+
+
+def get_fhir_client() -> FHIRClient:
+    """Return the synchronous FHIR client, creating it on first use."""
+    global fhir_client
+    if fhir_client is None:
+        with _clients_lock:
+            if fhir_client is None:
+                fhir_client = FHIRClient(cache=get_fhir_cache())
+    return fhir_client
+
+
+def get_async_fhir_client() -> AsyncFHIRClient:
+    """Return the async FHIR client, creating it on first use."""
+    global async_fhir_client
+    if async_fhir_client is None:
+        with _clients_lock:
+            if async_fhir_client is None:
+                async_fhir_client = AsyncFHIRClient(cache=get_fhir_cache())
+                atexit.register(async_fhir_client.close_sync)
+    return async_fhir_client
+
+
+def get_local_store() -> LocalStore:
+    """Return the local observation store, creating it on first use."""
+    global local_store
+    if local_store is None:
+        with _clients_lock:
+            if local_store is None:
+                local_store = LocalStore()
+    return local_store
+
+
+def get_patient_index() -> Optional[PatientIndex]:
+    """Return the patient name index, or None when disabled.
+
+    It starts with the Patients of the local store (see ``utils.bulk_export``)
+    and grows with the results of every patient search sent to the server. It
+    is complete, and may answer searches alone, while the store holds every
+    Patient (it has a high-water mark) and delta sync keeps it current.
+    """
+    global patient_index
+    if patient_index is None and PATIENT_INDEX_ENABLED:
+        with _clients_lock:
+            if patient_index is None:
+                index = PatientIndex()
+                store = get_local_store()
+                loaded = index.add(store.get_resources("Patient"))
+                worker = delta_sync_worker
+                index.complete = (worker is not None and 'Patient' in worker.sync.resource_types
+                                  and 'Patient' not in worker.sync.full_pulls
+                                  and store.get_high_water('Patient') is not None)
+                logger.info(f"Patient index loaded {loaded} patients from the local store")
+                patient_index = index
+    return patient_index
+
+
+def _synced(resource_type: str, written: List[Dict[str, Any]], deleted: List[str]) -> None:
+    """Drop what a delta sync changed from the response cache and update the patient index."""
+    changed = [resource['id'] for resource in written] + deleted
+    if fhir_cache is not None:
+        for resource_id in changed:
+            fhir_cache.invalidate(resource_type, resource_id)
+    if resource_type == 'Patient' and patient_index is not None:
+        patient_index.add(written)
+        for resource_id in deleted:
+            patient_index.remove(resource_id)
+        # Once no full pull is under way the store holds every Patient, and the index every Patient of the store
+        patient_index.complete = delta_sync_worker is None or 'Patient' not in delta_sync_worker.sync.full_pulls
+
+
+def start_delta_sync() -> DeltaSyncWorker:
+    """Keep the local store current with delta syncs on a background thread, started once."""
+    global delta_sync_worker
+    with _clients_lock:
+        if delta_sync_worker is None:
+            # A client of its own: a cached delta would hide new changes
+            sync = DeltaSync(FHIRClient(coalesce=False), get_local_store(), listeners=[_synced])
+            # Assigned before the first sync so _synced sees its full pulls
+            delta_sync_worker = DeltaSyncWorker(sync)
+            delta_sync_worker.start()
+    return delta_sync_worker
+
+
+# Fields each tool keeps, pushed down to the server as _elements
+PATIENT_SEARCH_ELEMENTS = ('name', 'gender', 'birthDate')
+PATIENT_SUMMARY_ELEMENTS = ('name', 'gender', 'birthDate', 'address', 'telecom')
+OBSERVATION_ELEMENTS = ('status', 'code', 'valueQuantity', 'valueString', 'component', 'effectiveDateTime')
+CONDITION_ELEMENTS = ('clinicalStatus', 'verificationStatus', 'code', 'recordedDate', 'onsetDateTime')
+ENCOUNTER_ELEMENTS = ('status', 'class', 'type', 'period', 'serviceProvider')
+MEDICATION_ELEMENTS = (
+    'status', 'intent', 'medicationCodeableConcept', 'medicationReference', 'authoredOn', 'dosageInstruction'
+)
+
+
+# Artifact attached to data tool results for the clinical digest (agents/aggregation.py):
+# {"records": {resourceType: [resources]}, "totals": {resourceType: server total}}
+Records = Optional[Dict[str, Any]]
+
+
+def _parse_json(value: Any) -> Any:
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def _records(resource_type: str, entries: List[Dict[str, Any]]) -> Records:
+    return {"records": {resource_type: [entry.get('resource', {}) for entry in entries]}}
+
+
+def _indexed_patients(params: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Answer a patient search from a complete index, or return None to ask the server.
+
+    Only exact and prefix name matches are used: they are what the server
+    would return, while a typo match may hide a patient the server finds.
+    """
+    index = get_patient_index()
+    if index is None or not index.complete:
+        return None
+    matches = index.search(params, limit=10, fuzzy=False)
+    return [{'resource': patient} for patient in matches] if matches else None
+
+
+def _similar_patients(params: Dict[str, Any], entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Return indexed patients with a similar name that the server search did not return.
+
+    Only a complete index is asked: an incomplete one may hold deleted or
+    outdated patients.
+    """
+    index = get_patient_index()
+    if index is None or not index.complete:
+        return []
+    matches = index.search(params, limit=10) or []
+    found = {entry.get('resource', {}).get('id') for entry in entries}
+    return [{'resource': patient} for patient in matches if patient['id'] not in found]
+
+
+def _index_patients(entries: List[Dict[str, Any]]) -> None:
+    index = get_patient_index()
+    if index is not None:
+        index.add(entry.get('resource', {}) for entry in entries)
+
+
+def _patient_changed(patient_id: Optional[str]) -> None:
+    # Searches go back to the server until the changed patient is indexed again by a delta sync
+    index = get_patient_index()
+    if index is not None and patient_id:
+        index.remove(patient_id)
+        index.complete = False
+
+
+# Result formatting shared by the sync tools and their async implementations
+
+def _patients_output(entries: List[Dict[str, Any]], similar: Optional[List[Dict[str, Any]]] = None) -> str:
+    if similar:
+        # Kept apart so that a similar name is never mistaken for a match
+        found = _patients_output(entries) if entries else "No patients found matching the search criteria"
+        return (f"{found}\n\nPOSSIBLE MATCHES (similar name, not matching the search; confirm the patient "
+                f"before using them):\n{_patients_output(similar)}")
+    if not entries:
+        return "No patients found matching the search criteria"
+
+    patients_info = []
+    for entry in entries:
+        resource = entry.get('resource', {})
+        patient_id = resource.get('id')
+        name = resource.get('name', [{}])[0]
+        patients_info.append({
+            'id': patient_id,
+            'name': name,
+            'gender': resource.get('gender'),
+            'birthDate': resource.get('birthDate')
+        })
+
+    return format_tool_output(patients_info)
+
+
+def _observations_output(patient_id: str, observations: List[Dict[str, Any]]) -> str:
+    if not observations:
+        return f"No observations found for patient {patient_id}"
+
+    obs_info = []
+    for entry in observations:
+        resource = entry.get('resource', {})
+        obs_info.append({
+            'id': resource.get('id'),
+            'status': resource.get('status'),
+            'code': resource.get('code'),
+            'value': resource.get('valueQuantity') or resource.get('valueString'),
+            'effectiveDateTime': resource.get('effectiveDateTime')
+        })
+
+    return format_tool_output(obs_info)
+
+
+def _observation_search_output(entries: List[Dict[str, Any]]) -> str:
+    if not entries:
+        return "No observations found matching the search criteria"
+
+    return format_tool_output([entry.get('resource') for entry in entries])
+
+
+def _conditions_output(patient_id: str, entries: List[Dict[str, Any]]) -> str:
+    if not entries:
+        return f"No conditions found for patient {patient_id}. This patient may not have any recorded conditions in the system."
+
+    conditions_info = []
+    for entry in entries:
+        resource = entry.get('resource', {})
+        conditions_info.append({
+            'id': resource.get('id'),
+            'clinicalStatus': resource.get('clinicalStatus'),
+            'verificationStatus': resource.get('verificationStatus'),
+            'code': resource.get('code'),
+            'recordedDate': resource.get('recordedDate'),
+            'onsetDateTime': resource.get('onsetDateTime')
+        })
+
+    return format_tool_output(conditions_info)
+
+
+def _encounters_output(patient_id: str, entries: List[Dict[str, Any]]) -> str:
+    if not entries:
+        return f"No encounters found for patient {patient_id}. This patient may not have any recorded visits in the system."
+
+    encounters_info = []
+    for entry in entries:
+        resource = entry.get('resource', {})
+        encounters_info.append({
+            'id': resource.get('id'),
+            'status': resource.get('status'),
+            'class': resource.get('class'),
+            'type': resource.get('type'),
+            'period': resource.get('period'),
+            'serviceProvider': resource.get('serviceProvider')
+        })
+
+    return format_tool_output(encounters_info)
+
+
+def _medications_output(patient_id: str, entries: List[Dict[str, Any]]) -> str:
+    if not entries:
+        return f"No medication requests found for patient {patient_id}. This patient may not have any recorded medications in the system."
+
+    medications_info = []
+    for entry in entries:
+        resource = entry.get('resource', {})
+        medications_info.append({
+            'id': resource.get('id'),
+            'status': resource.get('status'),
+            'intent': resource.get('intent'),
+            'medicationCodeableConcept': resource.get('medicationCodeableConcept'),
+            'medicationReference': resource.get('medicationReference'),
+            'authoredOn': resource.get('authoredOn'),
+            'dosageInstruction': resource.get('dosageInstruction')
+        })
+
+    return format_tool_output(medications_info)
+
+
+def _complete_output(record: Dict[str, List[Dict[str, Any]]], totals: Dict[str, int]) -> str:
+    patient_data = record["Patient"][0]
+
+    complete_data = {
+        "patient": {
+            "id": patient_data.get('id'),
+            "name": patient_data.get('name'),
+            "gender": patient_data.get('gender'),
+            "birthDate": patient_data.get('birthDate'),
+            "address": patient_data.get('address'),
+            "telecom": patient_data.get('telecom')
+        },
+        "observations": record["Observation"],
+        "conditions": record["Condition"],
+        "encounters": record["Encounter"],
+        "medications": record["MedicationRequest"],
+        "summary": {
+            "total_observations": totals["Observation"],
+            "total_conditions": totals["Condition"],
+            "total_encounters": totals["Encounter"],
+            "total_medications": totals["MedicationRequest"]
+        }
+    }
+
+    return format_tool_output(complete_data)
 
 
 @tool
@@ -20,8 +332,8 @@ def create_patient(patient_data: str) -> str:
         Success message with patient ID or error message
     """
     try:
-        data = json.loads(patient_data) if isinstance(patient_data, str) else patient_data
-        result = fhir_client.create_resource("Patient", data)
+        result = get_fhir_client().create_resource("Patient", _parse_json(patient_data))
+        _index_patients([{'resource': result}])
         patient_id = result.get('id', 'Unknown')
         return f"Successfully created patient with ID: {patient_id}"
     except Exception as e:
@@ -37,11 +349,11 @@ def get_patient(patient_id: str) -> str:
         patient_id: The FHIR patient ID
 
     Returns:
-        Patient information as JSON string or error message
+        Patient information as compact text or error message
     """
     try:
-        result = fhir_client.read_resource("Patient", patient_id)
-        return json.dumps(result, indent=2)
+        result = get_fhir_client().read_resource("Patient", patient_id)
+        return format_tool_output(result)
     except Exception as e:
         logger.error(f"Error retrieving patient: {e}")
         return f"Error retrieving patient: {str(e)}"
@@ -58,25 +370,14 @@ def search_patients(search_params: str) -> str:
         List of matching patients or error message
     """
     try:
-        params = json.loads(search_params) if isinstance(search_params, str) else search_params
-        result = fhir_client.search_resources("Patient", params)
-        entries = result.get('entry', [])
-        if not entries:
-            return "No patients found matching the search criteria"
-
-        patients_info = []
-        for entry in entries[:10]:  # Limit to 10 results
-            resource = entry.get('resource', {})
-            patient_id = resource.get('id')
-            name = resource.get('name', [{}])[0]
-            patients_info.append({
-                'id': patient_id,
-                'name': name,
-                'gender': resource.get('gender'),
-                'birthDate': resource.get('birthDate')
-            })
-
-        return json.dumps(patients_info, indent=2)
+        params = _parse_json(search_params)
+        indexed = _indexed_patients(params)
+        if indexed:
+            return _patients_output(indexed)
+        entries = list(get_fhir_client().iter_resources(  # Limit to 10 results
+            "Patient", params, limit=10, elements=PATIENT_SEARCH_ELEMENTS))
+        _index_patients(entries)
+        return _patients_output(entries, _similar_patients(params, entries))
     except Exception as e:
         logger.error(f"Error searching patients: {e}")
         return f"Error searching patients: {str(e)}"
@@ -94,8 +395,8 @@ def update_patient(patient_id: str, patient_data: str) -> str:
         Success message or error message
     """
     try:
-        data = json.loads(patient_data) if isinstance(patient_data, str) else patient_data
-        result = fhir_client.update_resource("Patient", patient_id, data)
+        get_fhir_client().update_resource("Patient", patient_id, _parse_json(patient_data))
+        _patient_changed(patient_id)
         return f"Successfully updated patient {patient_id}"
     except Exception as e:
         logger.error(f"Error updating patient: {e}")
@@ -113,8 +414,7 @@ def create_observation(observation_data: str) -> str:
         Success message with observation ID or error message
     """
     try:
-        data = json.loads(observation_data) if isinstance(observation_data, str) else observation_data
-        result = fhir_client.create_resource("Observation", data)
+        result = get_fhir_client().create_resource("Observation", _parse_json(observation_data))
         obs_id = result.get('id', 'Unknown')
         return f"Successfully created observation with ID: {obs_id}"
     except Exception as e:
@@ -122,40 +422,28 @@ def create_observation(observation_data: str) -> str:
         return f"Error creating observation: {str(e)}"
 
 
-@tool
-def get_patient_observations(patient_id: str) -> str:
+@tool(response_format="content_and_artifact")
+def get_patient_observations(patient_id: str) -> Tuple[str, Records]:
     """Retrieve all observations for a specific patient.
 
     Args:
         patient_id: The FHIR patient ID
 
     Returns:
-        List of observations as JSON string or error message
+        List of observations as compact text or error message
     """
     try:
-        observations = fhir_client.get_patient_observations(patient_id)
-        if not observations:
-            return f"No observations found for patient {patient_id}"
-
-        obs_info = []
-        for entry in observations[:20]:  # Limit to 20 results
-            resource = entry.get('resource', {})
-            obs_info.append({
-                'id': resource.get('id'),
-                'status': resource.get('status'),
-                'code': resource.get('code'),
-                'value': resource.get('valueQuantity') or resource.get('valueString'),
-                'effectiveDateTime': resource.get('effectiveDateTime')
-            })
-
-        return json.dumps(obs_info, indent=2)
+        observations = get_fhir_client().get_patient_observations(
+            patient_id, limit=20, elements=OBSERVATION_ELEMENTS
+        )  # Limit to 20 results
+        return _observations_output(patient_id, observations), _records("Observation", observations)
     except Exception as e:
         logger.error(f"Error retrieving observations: {e}")
-        return f"Error retrieving observations: {str(e)}"
+        return f"Error retrieving observations: {str(e)}", None
 
 
-@tool
-def search_observations(search_params: str) -> str:
+@tool(response_format="content_and_artifact")
+def search_observations(search_params: str) -> Tuple[str, Records]:
     """Search for observations using various criteria.
 
     Args:
@@ -165,50 +453,32 @@ def search_observations(search_params: str) -> str:
         List of matching observations or error message
     """
     try:
-        params = json.loads(search_params) if isinstance(search_params, str) else search_params
-        result = fhir_client.search_resources("Observation", params)
-        entries = result.get('entry', [])
-        if not entries:
-            return "No observations found matching the search criteria"
-
-        return json.dumps([entry.get('resource') for entry in entries[:10]], indent=2)
+        params = _parse_json(search_params)
+        entries = list(get_fhir_client().iter_resources("Observation", params, limit=10))
+        return _observation_search_output(entries), _records("Observation", entries)
     except Exception as e:
         logger.error(f"Error searching observations: {e}")
-        return f"Error searching observations: {str(e)}"
+        return f"Error searching observations: {str(e)}", None
 
 
-@tool
-def get_patient_conditions(patient_id: str) -> str:
+@tool(response_format="content_and_artifact")
+def get_patient_conditions(patient_id: str) -> Tuple[str, Records]:
     """Retrieve all conditions/diagnoses for a specific patient.
 
     Args:
         patient_id: The FHIR patient ID
 
     Returns:
-        List of conditions as JSON string or error message, or message if no data found
+        List of conditions as compact text or error message, or message if no data found
     """
     try:
-        result = fhir_client.search_resources("Condition", {"patient": patient_id})
-        entries = result.get('entry', [])
-        if not entries:
-            return f"No conditions found for patient {patient_id}. This patient may not have any recorded conditions in the system."
-
-        conditions_info = []
-        for entry in entries[:20]:
-            resource = entry.get('resource', {})
-            conditions_info.append({
-                'id': resource.get('id'),
-                'clinicalStatus': resource.get('clinicalStatus'),
-                'verificationStatus': resource.get('verificationStatus'),
-                'code': resource.get('code'),
-                'recordedDate': resource.get('recordedDate'),
-                'onsetDateTime': resource.get('onsetDateTime')
-            })
-
-        return json.dumps(conditions_info, indent=2)
+        entries = list(get_fhir_client().iter_resources(
+            "Condition", {"patient": patient_id}, limit=20, elements=CONDITION_ELEMENTS
+        ))
+        return _conditions_output(patient_id, entries), _records("Condition", entries)
     except Exception as e:
         logger.error(f"Error retrieving conditions: {e}")
-        return f"Error retrieving conditions for patient {patient_id}: {str(e)}"
+        return f"Error retrieving conditions for patient {patient_id}: {str(e)}", None
 
 
 @tool
@@ -219,112 +489,245 @@ def get_patient_encounters(patient_id: str) -> str:
         patient_id: The FHIR patient ID
 
     Returns:
-        List of encounters as JSON string or error message, or message if no data found
+        List of encounters as compact text or error message, or message if no data found
     """
     try:
-        result = fhir_client.search_resources("Encounter", {"patient": patient_id})
-        entries = result.get('entry', [])
-        if not entries:
-            return f"No encounters found for patient {patient_id}. This patient may not have any recorded visits in the system."
-
-        encounters_info = []
-        for entry in entries[:20]:
-            resource = entry.get('resource', {})
-            encounters_info.append({
-                'id': resource.get('id'),
-                'status': resource.get('status'),
-                'class': resource.get('class'),
-                'type': resource.get('type'),
-                'period': resource.get('period'),
-                'serviceProvider': resource.get('serviceProvider')
-            })
-
-        return json.dumps(encounters_info, indent=2)
+        entries = list(get_fhir_client().iter_resources(
+            "Encounter", {"patient": patient_id}, limit=20, elements=ENCOUNTER_ELEMENTS
+        ))
+        return _encounters_output(patient_id, entries)
     except Exception as e:
         logger.error(f"Error retrieving encounters: {e}")
         return f"Error retrieving encounters for patient {patient_id}: {str(e)}"
 
 
-@tool
-def get_patient_medications(patient_id: str) -> str:
+@tool(response_format="content_and_artifact")
+def get_patient_medications(patient_id: str) -> Tuple[str, Records]:
     """Retrieve all medication requests for a specific patient.
 
     Args:
         patient_id: The FHIR patient ID
 
     Returns:
-        List of medication requests as JSON string or error message, or message if no data found
+        List of medication requests as compact text or error message, or message if no data found
     """
     try:
-        result = fhir_client.search_resources("MedicationRequest", {"patient": patient_id})
-        entries = result.get('entry', [])
-        if not entries:
-            return f"No medication requests found for patient {patient_id}. This patient may not have any recorded medications in the system."
-
-        medications_info = []
-        for entry in entries[:20]:
-            resource = entry.get('resource', {})
-            medications_info.append({
-                'id': resource.get('id'),
-                'status': resource.get('status'),
-                'intent': resource.get('intent'),
-                'medicationCodeableConcept': resource.get('medicationCodeableConcept'),
-                'medicationReference': resource.get('medicationReference'),
-                'authoredOn': resource.get('authoredOn'),
-                'dosageInstruction': resource.get('dosageInstruction')
-            })
-
-        return json.dumps(medications_info, indent=2)
+        entries = list(get_fhir_client().iter_resources(
+            "MedicationRequest", {"patient": patient_id}, limit=20, elements=MEDICATION_ELEMENTS
+        ))
+        return _medications_output(patient_id, entries), _records("MedicationRequest", entries)
     except Exception as e:
         logger.error(f"Error retrieving medications: {e}")
-        return f"Error retrieving medication requests for patient {patient_id}: {str(e)}"
+        return f"Error retrieving medication requests for patient {patient_id}: {str(e)}", None
 
 
-@tool
-def get_complete_patient_data(patient_id: str) -> str:
+async def _fetch_complete_patient_data(patient_id: str):
+    """Fetch a patient and their related resources in one concurrent fan-out.
+
+    Args:
+        patient_id: The FHIR patient ID
+
+    Returns:
+        Tuple of (resources by type including 'Patient', total count by type)
+    """
+    # Only the first few entries are kept, but ask for an accurate total
+    params = {"patient": patient_id, "_total": "accurate"}
+    client = get_async_fhir_client()
+    patient_data, *results = await asyncio.gather(
+        client.read_resource("Patient", patient_id, elements=PATIENT_SUMMARY_ELEMENTS),
+        *[
+            client.collect_resources(resource_type, params, limit=10)
+            for resource_type in PATIENT_RECORD_TYPES
+        ],
+    )
+    record = {"Patient": [patient_data]}
+    totals = {"Patient": 1}
+    for resource_type, (entries, total) in zip(PATIENT_RECORD_TYPES, results):
+        record[resource_type] = [entry.get('resource') for entry in entries]
+        totals[resource_type] = total if total is not None else len(entries)
+    return record, totals
+
+
+@tool(response_format="content_and_artifact")
+def get_complete_patient_data(patient_id: str) -> Tuple[str, Records]:
     """Retrieve comprehensive patient data including demographics, observations, conditions, encounters, and medications.
 
     Args:
         patient_id: The FHIR patient ID
 
     Returns:
-        Complete patient data as JSON string or error message
+        Complete patient data as compact text or error message
     """
     try:
-        # Get patient demographics
-        patient_data = fhir_client.read_resource("Patient", patient_id)
-
-        # Get all related data
-        observations = fhir_client.search_resources("Observation", {"patient": patient_id}).get('entry', [])
-        conditions = fhir_client.search_resources("Condition", {"patient": patient_id}).get('entry', [])
-        encounters = fhir_client.search_resources("Encounter", {"patient": patient_id}).get('entry', [])
-        medications = fhir_client.search_resources("MedicationRequest", {"patient": patient_id}).get('entry', [])
-
-        complete_data = {
-            "patient": {
-                "id": patient_data.get('id'),
-                "name": patient_data.get('name'),
-                "gender": patient_data.get('gender'),
-                "birthDate": patient_data.get('birthDate'),
-                "address": patient_data.get('address'),
-                "telecom": patient_data.get('telecom')
-            },
-            "observations": [entry.get('resource') for entry in observations[:10]],
-            "conditions": [entry.get('resource') for entry in conditions[:10]],
-            "encounters": [entry.get('resource') for entry in encounters[:10]],
-            "medications": [entry.get('resource') for entry in medications[:10]],
-            "summary": {
-                "total_observations": len(observations),
-                "total_conditions": len(conditions),
-                "total_encounters": len(encounters),
-                "total_medications": len(medications)
-            }
-        }
+        if FHIR_PATIENT_RECORD_STRATEGY == "single":
+            # One $everything or batch request
+            record, totals = get_fhir_client().get_patient_record(patient_id, limit=10)
+        else:
+            # Fetch demographics and all related data concurrently
+            record, totals = run_sync(_fetch_complete_patient_data(patient_id))
+        return _complete_output(record, totals), {"records": record, "totals": totals}
+    except Exception as e:
+        logger.error(f"Error retrieving complete patient data: {e}")
+        return f"Error retrieving complete data for patient {patient_id}: {str(e)}", None
+
+
+@tool
+def get_population_observation_stats(code: str) -> str:
+    """Summarize one observation type across the whole patient population.
+
+    Uses the local store loaded by a FHIR bulk export rather than the live server.
+
+    Args:
+        code: Observation code, e.g. the LOINC code '8480-6' for systolic blood pressure
+
+    Returns:
+        Count, number of patients, min/max/average value and date range, or error message
+    """
+    try:
+        stats = get_local_store().observation_stats(code)
+        if not stats['count']:
+            return (f"No observations with code {code} in the local store. "
+                    f"Population data is only available after a bulk export has been loaded.")
+        return format_tool_output(stats)
+    except Exception as e:
+        logger.error(f"Error reading population observations: {e}")
+        return f"Error reading population observations for code {code}: {str(e)}"
+
+
+# Async implementations used by ainvoke. They await the AsyncFHIRClient on the
+# caller's event loop instead of blocking a thread, and return the same text as
+# the sync tools. Tools without one (the local store) run in a worker thread.
+
+async def _acreate_patient(patient_data: str) -> str:
+    try:
+        result = await get_async_fhir_client().create_resource("Patient", _parse_json(patient_data))
+        _index_patients([{'resource': result}])
+        return f"Successfully created patient with ID: {result.get('id', 'Unknown')}"
+    except Exception as e:
+        logger.error(f"Error creating patient: {e}")
+        return f"Error creating patient: {str(e)}"
+
+
+async def _aget_patient(patient_id: str) -> str:
+    try:
+        return format_tool_output(await get_async_fhir_client().read_resource("Patient", patient_id))
+    except Exception as e:
+        logger.error(f"Error retrieving patient: {e}")
+        return f"Error retrieving patient: {str(e)}"
+
 
-        return json.dumps(complete_data, indent=2)
+async def _asearch_patients(search_params: str) -> str:
+    try:
+        params = _parse_json(search_params)
+        indexed = _indexed_patients(params)
+        if indexed:
+            return _patients_output(indexed)
+        entries, _ = await get_async_fhir_client().collect_resources(
+            "Patient", params, limit=10, elements=PATIENT_SEARCH_ELEMENTS
+        )
+        _index_patients(entries)
+        return _patients_output(entries, _similar_patients(params, entries))
+    except Exception as e:
+        logger.error(f"Error searching patients: {e}")
+        return f"Error searching patients: {str(e)}"
+
+
+async def _aupdate_patient(patient_id: str, patient_data: str) -> str:
+    try:
+        await get_async_fhir_client().update_resource("Patient", patient_id, _parse_json(patient_data))
+        _patient_changed(patient_id)
+        return f"Successfully updated patient {patient_id}"
+    except Exception as e:
+        logger.error(f"Error updating patient: {e}")
+        return f"Error updating patient: {str(e)}"
+
+
+async def _acreate_observation(observation_data: str) -> str:
+    try:
+        result = await get_async_fhir_client().create_resource("Observation", _parse_json(observation_data))
+        return f"Successfully created observation with ID: {result.get('id', 'Unknown')}"
+    except Exception as e:
+        logger.error(f"Error creating observation: {e}")
+        return f"Error creating observation: {str(e)}"
+
+
+async def _aget_patient_observations(patient_id: str) -> Tuple[str, Records]:
+    try:
+        observations, _ = await get_async_fhir_client().collect_resources(
+            "Observation", {"patient": patient_id}, limit=20, elements=OBSERVATION_ELEMENTS
+        )
+        return _observations_output(patient_id, observations), _records("Observation", observations)
+    except Exception as e:
+        logger.error(f"Error retrieving observations: {e}")
+        return f"Error retrieving observations: {str(e)}", None
+
+
+async def _asearch_observations(search_params: str) -> Tuple[str, Records]:
+    try:
+        entries, _ = await get_async_fhir_client().collect_resources(
+            "Observation", _parse_json(search_params), limit=10)
+        return _observation_search_output(entries), _records("Observation", entries)
+    except Exception as e:
+        logger.error(f"Error searching observations: {e}")
+        return f"Error searching observations: {str(e)}", None
+
+
+async def _aget_patient_conditions(patient_id: str) -> Tuple[str, Records]:
+    try:
+        entries, _ = await get_async_fhir_client().collect_resources(
+            "Condition", {"patient": patient_id}, limit=20, elements=CONDITION_ELEMENTS
+        )
+        return _conditions_output(patient_id, entries), _records("Condition", entries)
+    except Exception as e:
+        logger.error(f"Error retrieving conditions: {e}")
+        return f"Error retrieving conditions for patient {patient_id}: {str(e)}", None
+
+
+async def _aget_patient_encounters(patient_id: str) -> str:
+    try:
+        entries, _ = await get_async_fhir_client().collect_resources(
+            "Encounter", {"patient": patient_id}, limit=20, elements=ENCOUNTER_ELEMENTS
+        )
+        return _encounters_output(patient_id, entries)
+    except Exception as e:
+        logger.error(f"Error retrieving encounters: {e}")
+        return f"Error retrieving encounters for patient {patient_id}: {str(e)}"
+
+
+async def _aget_patient_medications(patient_id: str) -> Tuple[str, Records]:
+    try:
+        entries, _ = await get_async_fhir_client().collect_resources(
+            "MedicationRequest", {"patient": patient_id}, limit=20, elements=MEDICATION_ELEMENTS
+        )
+        return _medications_output(patient_id, entries), _records("MedicationRequest", entries)
+    except Exception as e:
+        logger.error(f"Error retrieving medications: {e}")
+        return f"Error retrieving medication requests for patient {patient_id}: {str(e)}", None
+
+
+async def _aget_complete_patient_data(patient_id: str) -> Tuple[str, Records]:
+    try:
+        if FHIR_PATIENT_RECORD_STRATEGY == "single":
+            record, totals = await asyncio.to_thread(get_fhir_client().get_patient_record, patient_id, 10)
+        else:
+            record, totals = await _fetch_complete_patient_data(patient_id)
+        return _complete_output(record, totals), {"records": record, "totals": totals}
     except Exception as e:
         logger.error(f"Error retrieving complete patient data: {e}")
-        return f"Error retrieving complete data for patient {patient_id}: {str(e)}"
+        return f"Error retrieving complete data for patient {patient_id}: {str(e)}", None
+
+
+create_patient.coroutine = _acreate_patient
+get_patient.coroutine = _aget_patient
+search_patients.coroutine = _asearch_patients
+update_patient.coroutine = _aupdate_patient
+create_observation.coroutine = _acreate_observation
+get_patient_observations.coroutine = _aget_patient_observations
+search_observations.coroutine = _asearch_observations
+get_patient_conditions.coroutine = _aget_patient_conditions
+get_patient_encounters.coroutine = _aget_patient_encounters
+get_patient_medications.coroutine = _aget_patient_medications
+get_complete_patient_data.coroutine = _aget_complete_patient_data
 
 
 # Export all tools
@@ -337,8 +740,14 @@ healthcare_tools = [
     get_complete_patient_data,
     search_patients,
     search_observations,
+    get_population_observation_stats,
     create_patient,
     update_patient,
     create_observation,
 ]
 
+# Tool lookup by the name the model uses in tool calls
+TOOLS_BY_NAME = {tool.name: tool for tool in healthcare_tools}
+
+# Tools that change data on the FHIR server
+WRITE_TOOLS = frozenset({create_patient.name, update_patient.name, create_observation.name})
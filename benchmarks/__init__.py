@@ -0,0 +1 @@
+"""Offline benchmarks for the FHIR clients, tools, graph and UI handler."""
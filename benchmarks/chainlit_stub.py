@@ -0,0 +1,115 @@
+"""Minimal in-process replacement for the parts of Chainlit used by ``ui.app``."""
+import contextvars
+import sys
+import time
+import types
+import uuid
+from typing import Any, Dict, Optional
+
+
+class Message:
+    """Records sent and updated content instead of talking to a browser."""
+
+    sent = 0
+    # perf_counter() of the first streamed token since the last reset, for time-to-first-token
+    first_token_at: Optional[float] = None
+
+    def __init__(self, content: str = "", **kwargs: Any):
+        self.content = content
+        self.is_sent = False
+
+    async def send(self) -> "Message":
+        if not self.is_sent:
+            Message.sent += 1
+            self.is_sent = True
+        return self
+
+    async def update(self) -> "Message":
+        return self
+
+    async def stream_token(self, token: str) -> None:
+        if Message.first_token_at is None:
+            Message.first_token_at = time.perf_counter()
+        if not self.is_sent:
+            await self.send()
+        self.content += token
+
+
+class Step:
+    """Collects step input and output; usable as an async context manager."""
+
+    completed = 0
+
+    def __init__(self, name: str = "", type: str = "undefined", **kwargs: Any):
+        self.name = name
+        self.type = type
+        self.input: Any = None
+        self.output: Any = None
+
+    async def __aenter__(self) -> "Step":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        Step.completed += 1
+
+
+class UserSession:
+    """Per-process stand-in for ``cl.user_session``."""
+
+    def __init__(self):
+        self.data: Dict[str, Any] = {}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        self.data[key] = value
+
+
+class Context:
+    """Stand-in for ``cl.context`` whose session is per asyncio task."""
+
+    _session: contextvars.ContextVar = contextvars.ContextVar("session")
+
+    @property
+    def session(self) -> types.SimpleNamespace:
+        return self._session.get(None) or new_session()
+
+
+def new_session(thread_id: Optional[str] = None) -> types.SimpleNamespace:
+    """Start a chat session in the current context, as a browser tab connecting would.
+
+    Args:
+        thread_id: Thread to resume, or None for a new one
+
+    Returns:
+        Session with ``id`` and ``thread_id``
+    """
+    session = types.SimpleNamespace(id=str(uuid.uuid4()), thread_id=thread_id or str(uuid.uuid4()))
+    Context._session.set(session)
+    return session
+
+
+def _passthrough(func):
+    return func
+
+
+def install() -> types.ModuleType:
+    """Register the stub as ``chainlit`` so ``ui.app`` imports without a server.
+
+    Returns:
+        The stub module
+    """
+    module = types.ModuleType("chainlit")
+    module.Message = Message
+    module.Step = Step
+    module.user_session = UserSession()
+    module.context = Context()
+    module.on_chat_start = module.on_message = module.on_chat_end = module.on_app_shutdown = _passthrough
+    # ui.app adds its /metrics route to the server's routes
+    server = types.ModuleType("chainlit.server")
+    server.app = types.SimpleNamespace(router=types.SimpleNamespace(routes=[]))
+    module.server = server
+    sys.modules["chainlit"] = module
+    sys.modules["chainlit.server"] = server
+    return module
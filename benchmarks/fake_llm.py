@@ -0,0 +1,180 @@
+"""Deterministic stand-in for the OpenAI chat model used by the agent."""
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+# Provider prompt caches match prefixes in blocks of this many tokens
+PROMPT_CACHE_BLOCK_TOKENS = 128
+PROMPT_CACHE_SIZE = 64
+
+PATIENT_ID = re.compile(r"patient\s+(?:id\s+)?([A-Za-z0-9\-.]+)", re.I)
+PATIENT_IDS = re.compile(r"patients\s+((?:\d+(?:\s*,\s*|\s+and\s+)?)+)", re.I)
+FAMILY_NAME = re.compile(r"(?:named|family name)\s+(\w+)", re.I)
+
+# First matching pattern picks the tool for a patient query
+TOOL_ROUTES = [
+    (re.compile(r"all data|everything|complete", re.I), "get_complete_patient_data"),
+    (re.compile(r"observation|vital", re.I), "get_patient_observations"),
+    (re.compile(r"condition", re.I), "get_patient_conditions"),
+    (re.compile(r"encounter|visit", re.I), "get_patient_encounters"),
+    (re.compile(r"medication|\bmeds?\b", re.I), "get_patient_medications"),
+]
+
+
+def route_tool_calls(query: str) -> List[Dict[str, Any]]:
+    """Choose the tool calls the real model would make for a query.
+
+    "Show conditions and meds for patients 1 and 2" yields one call per
+    resource type and patient, four in total.
+
+    Args:
+        query: User query
+
+    Returns:
+        Tool call dicts, empty if no tool applies
+    """
+    family = FAMILY_NAME.search(query)
+    if family:
+        return [{'name': 'search_patients', 'args': {'search_params': json.dumps({'family': family.group(1)})}}]
+    several = PATIENT_IDS.search(query)
+    single = PATIENT_ID.search(query)
+    patient_ids = re.findall(r"\d+", several.group(1)) if several else [single.group(1)] if single else []
+    names = [tool for pattern, tool in TOOL_ROUTES if pattern.search(query)]
+    if 'get_complete_patient_data' in names:
+        names = ['get_complete_patient_data']
+    return [{'name': name, 'args': {'patient_id': patient_id}}
+            for name in names or ['get_patient'] for patient_id in patient_ids]
+
+
+def route_query(query: str) -> Optional[Dict[str, Any]]:
+    """Return the first tool call for a query, or None if no tool applies."""
+    calls = route_tool_calls(query)
+    return calls[0] if calls else None
+
+
+def classify(query: str) -> Dict[str, Any]:
+    """Return the classification JSON the intent prompt asks for."""
+    call = route_query(query)
+    if call is None:
+        return {'intent': 'general_question', 'resource_type': None, 'operation': None}
+    if call['name'] == 'search_patients':
+        return {'intent': 'search_query', 'resource_type': 'Patient', 'operation': 'search'}
+    resource_type = {'get_complete_patient_data': 'All', 'get_patient': 'Patient'}.get(
+        call['name'], call['name'].replace('get_patient_', '').rstrip('s').title())
+    return {'intent': 'patient_data_query', 'resource_type': resource_type, 'operation': 'read'}
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that answers from rules instead of an API.
+
+    It classifies intents, emits tool calls for patient queries when tools are
+    bound, and otherwise summarizes its input. ``latency`` stands in for the
+    time to first token and ``token_latency`` for the time between streamed
+    tokens. Usage metadata reports input tokens as served from a simulated
+    provider prompt cache when the prompt shares a prefix with a recent one.
+    """
+
+    latency: float = 0.0
+    token_latency: float = 0.0
+    calls: int = 0
+    _recent_prompts: List[str] = PrivateAttr(default_factory=list)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        """Bind tools so ``_generate`` knows tool calls are allowed."""
+        return self.bind(tools=[getattr(t, 'name', str(t)) for t in tools], **kwargs)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        message = self._respond(messages, **kwargs)
+        if self.token_latency:
+            time.sleep(self.token_latency * len(str(message.content).split()))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        message = self._respond(messages, **kwargs)
+        if self.token_latency:
+            await asyncio.sleep(self.token_latency * len(str(message.content).split()))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        if self.latency:
+            time.sleep(self.latency)
+        for i, chunk in enumerate(self._chunks(self._respond(messages, **kwargs))):
+            if i and self.token_latency and chunk.text:
+                time.sleep(self.token_latency)
+            if run_manager and chunk.text:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for i, chunk in enumerate(self._chunks(self._respond(messages, **kwargs))):
+            if i and self.token_latency and chunk.text:
+                await asyncio.sleep(self.token_latency)
+            if run_manager and chunk.text:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    @staticmethod
+    def _chunks(message: AIMessage) -> Iterator[ChatGenerationChunk]:
+        """Split a response into one tool-call chunk or one chunk per word."""
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content='', usage_metadata=message.usage_metadata,
+                tool_call_chunks=[{'name': c['name'], 'args': json.dumps(c['args']), 'id': c['id'], 'index': i}
+                                  for i, c in enumerate(message.tool_calls)],
+            ))
+            return
+        words = str(message.content).split(' ')
+        for i, word in enumerate(words):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else f" {word}"))
+        yield ChatGenerationChunk(message=AIMessageChunk(content='', usage_metadata=message.usage_metadata))
+
+    def _respond(self, messages: List[BaseMessage], **kwargs: Any) -> AIMessage:
+        """Build the complete response; callers add the latency."""
+        self.calls += 1
+        query = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), '')
+        prompt = ' '.join(str(m.content) for m in messages)
+        calls = [c for c in route_tool_calls(query) if c['name'] in kwargs.get('tools', ())]
+        if 'intent classifier' in prompt:
+            message = AIMessage(content=json.dumps(classify(query)))
+        elif calls:
+            message = AIMessage(content='', tool_calls=[
+                {**call, 'id': f"call_{self.calls}_{i}"} for i, call in enumerate(calls)
+            ])
+        else:
+            message = AIMessage(content=f"Answer based on {len(prompt)} characters of context.")
+        input_tokens = len(prompt) // 4
+        output_tokens = len(str(message.content)) // 4 + 1
+        cached_tokens = min(input_tokens, self._cached_tokens(messages, **kwargs))
+        message.usage_metadata = {'input_tokens': input_tokens, 'output_tokens': output_tokens,
+                                  'total_tokens': input_tokens + output_tokens,
+                                  'input_token_details': {'cache_read': cached_tokens}}
+        return message
+
+    def _cached_tokens(self, messages: List[BaseMessage], **kwargs: Any) -> int:
+        """Tokens of the longest prefix shared with a recent prompt, in whole cache blocks."""
+        serialized = '\x00'.join([','.join(kwargs.get('tools', ())), *(f"{m.type}:{m.content}" for m in messages)])
+        shared = max((len(os.path.commonprefix([serialized, seen])) for seen in self._recent_prompts), default=0)
+        self._recent_prompts = [serialized, *self._recent_prompts[:PROMPT_CACHE_SIZE - 1]]
+        return shared // 4 // PROMPT_CACHE_BLOCK_TOKENS * PROMPT_CACHE_BLOCK_TOKENS
@@ -0,0 +1,85 @@
+"""Timing, allocation and memory measurement for benchmark scenarios."""
+import math
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Return a percentile of the samples using linear interpolation.
+
+    Args:
+        samples: Measurements
+        pct: Percentile between 0 and 100
+
+    Returns:
+        Interpolated value, or 0.0 for no samples
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = (len(ordered) - 1) * pct / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def peak_rss_bytes() -> int:
+    """Return the peak resident set size of this process."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_scenario(name: str, func: Callable[[], Any], iterations: int = 20, warmup: int = 2) -> Dict[str, Any]:
+    """Time a scenario and measure what one call allocates.
+
+    Timing runs without tracemalloc, which would otherwise dominate the
+    latencies; allocations are taken from one extra traced call.
+
+    Args:
+        name: Scenario name
+        func: Zero-argument callable running one operation
+        iterations: Timed calls
+        warmup: Untimed calls made first to fill pools and caches
+
+    Returns:
+        Latency percentiles in milliseconds, throughput, allocations and peak RSS
+    """
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - call_started) * 1000)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        func()
+        after = tracemalloc.take_snapshot()
+        _, traced_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename') if stat.size_diff > 0)
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+
+    return {
+        'name': name,
+        'iterations': iterations,
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'throughput_per_s': round(iterations / elapsed, 2) if elapsed else None,
+        'retained_bytes': allocated,
+        'retained_blocks': blocks,
+        'traced_peak_bytes': traced_peak,
+        'peak_rss_bytes': peak_rss_bytes(),
+    }
@@ -0,0 +1,332 @@
+"""Run the benchmark scenarios: ``python -m benchmarks.run --output results.json``.
+
+Everything runs in-process against ``MockFHIRServer`` and ``FakeChatModel``,
+so no network access or API key is needed and results are comparable
+between commits.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks import chainlit_stub
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.harness import percentile, run_scenario
+from utils.mock_fhir_server import MockFHIRServer
+from utils.synthetic_data import generate_dataset
+
+logger = logging.getLogger(__name__)
+
+# Patient "1" carries the large observation history, the others a typical one
+LARGE_PATIENT = "1"
+SMALL_PATIENT = "2"
+# Chats handled at once by the concurrent UI scenario
+CONCURRENT_SESSIONS = 20
+# Clinicians opening the same patient at once in the burst scenario
+BURST_READERS = 10
+
+# Time to first streamed token per UI scenario, in milliseconds
+first_token_ms: Dict[str, List[float]] = {}
+
+# Code run in a fresh interpreter per startup scenario, as when a worker
+# restarts or a new pod comes up
+STARTUP_SCENARIOS = [
+    ("startup.import.agents.tools", "import agents.tools"),
+    ("startup.import.agents.graph", "import agents.graph"),
+    ("startup.import.ui.app", "import ui.app"),
+    # What the first turn pays on top of the imports
+    ("startup.graph_ready",
+     "from agents import graph, nodes, tools; graph.get_healthcare_graph(); nodes.get_llm(); tools.get_fhir_client()"),
+]
+
+
+def cold_start(code: str) -> Callable[[], Any]:
+    """Return a callable running ``code`` in a new Python process from the repository root."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return lambda: subprocess.run([sys.executable, "-c", code], cwd=root, check=True,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def build_scenarios(server: MockFHIRServer, llm_latency: float,
+                    token_latency: float = 0.0) -> List[Tuple[str, Callable[[], Any]]]:
+    """Wire the agent to the mock server and fake model and list the scenarios.
+
+    Must run before anything imports ``config``, which reads the environment
+    at import time.
+
+    Args:
+        server: Running mock FHIR server
+        llm_latency: Seconds before each fake model call responds
+        token_latency: Seconds between streamed tokens
+
+    Returns:
+        List of (name, zero-argument callable)
+    """
+    os.environ["FHIR_BASE_URL"] = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("LOCAL_STORE_PATH", ":memory:")
+    os.environ.setdefault("CHECKPOINT_PATH", ":memory:")
+    chainlit_stub.install()
+
+    from agents import nodes, tools
+    from agents.graph import get_healthcare_graph
+    from agents.prefetch import prefetcher
+    from ui import app
+    from utils.delta_sync import DeltaSync
+    from utils.fhir_cache import FHIRCache
+    from utils.fhir_client import FHIRClient
+    from utils.local_store import LocalStore
+    from utils.llm_cache import MemoryLLMCache
+    from utils.patient_index import PatientIndex
+
+    fake_llm = FakeChatModel(latency=llm_latency, token_latency=token_latency)
+    nodes.llm = fake_llm
+
+    def graph_turn(query: str) -> Callable[[], Any]:
+        return lambda: get_healthcare_graph().invoke({"messages": [], "user_query": query, "iteration_count": 0})
+
+    response_cache = MemoryLLMCache()
+
+    def cached_graph_turn(query: str) -> Callable[[], Any]:
+        # Repeats of one query after warmup are answered from the LLM cache
+        def handle() -> Any:
+            previous, nodes.llm_cache = nodes.llm_cache, response_cache
+            try:
+                return graph_turn(query)()
+            finally:
+                nodes.llm_cache = previous
+        return handle
+
+    def prefetched_graph_turn(query: str) -> Callable[[], Any]:
+        # Only the prefetch fills the cache; it is emptied before every turn
+        fhir_cache = FHIRCache()
+
+        def handle() -> Any:
+            fhir_cache.clear()
+            clients = (tools.get_fhir_client(), tools.get_async_fhir_client())
+            previous = [client.cache for client in clients]
+            for client in clients:
+                client.cache = fhir_cache
+            prefetcher.enabled = True
+            try:
+                return graph_turn(query)()
+            finally:
+                prefetcher.enabled = False
+                for client, cache in zip(clients, previous):
+                    client.cache = cache
+        return handle
+
+    patient_index = PatientIndex()
+    patient_index.add(server.store["Patient"].values())
+    # As if seeded by a bulk export and kept current by delta sync
+    patient_index.complete = True
+
+    def indexed_tool(tool: Any, args: Dict[str, Any]) -> Callable[[], Any]:
+        # Patient searches answered by the index loaded with every server patient
+        def handle() -> Any:
+            previous, tools.patient_index = tools.patient_index, patient_index
+            try:
+                return tool.invoke(args)
+            finally:
+                tools.patient_index = previous
+        return handle
+
+    loop = asyncio.new_event_loop()
+
+    def ui_turn(name: str, query: str, fresh_session: bool = True) -> Callable[[], Any]:
+        long_session = chainlit_stub.new_session().thread_id
+
+        async def turn() -> None:
+            chainlit_stub.new_session(None if fresh_session else long_session)
+            await app.on_message(chainlit_stub.Message(content=query))
+
+        def handle() -> None:
+            chainlit_stub.Message.first_token_at = None
+            started = time.perf_counter()
+            loop.run_until_complete(turn())
+            if chainlit_stub.Message.first_token_at is not None:
+                first_token_ms.setdefault(name, []).append((chainlit_stub.Message.first_token_at - started) * 1000)
+        return name, handle
+
+    def concurrent_ui_turns(query: str, sessions: int) -> Callable[[], Any]:
+        async def turn() -> None:
+            chainlit_stub.new_session()
+            await app.on_message(chainlit_stub.Message(content=query))
+
+        async def handle_all() -> None:
+            await asyncio.gather(*[turn() for _ in range(sessions)])
+        return lambda: loop.run_until_complete(handle_all())
+
+    def burst_reads(readers: int) -> Callable[[], Any]:
+        # Identical requests from parallel sessions, as when a care team opens one patient
+        pool = ThreadPoolExecutor(readers)
+
+        def read(_: int) -> Any:
+            return tools.get_fhir_client().read_resource("Patient", SMALL_PATIENT)
+        return lambda: list(pool.map(read, range(readers)))
+
+    def observation_sync(delta: bool) -> Callable[[], Any]:
+        # A full rescan of every Observation, or a delta carrying the one observation changed since the last
+        client = FHIRClient(server.base_url, coalesce=False)
+        if not delta:
+            return lambda: DeltaSync(client, LocalStore(":memory:"), ["Observation"], mode="search").sync(
+                "Observation")
+        sync = DeltaSync(client, LocalStore(":memory:"), ["Observation"], overlap=0)
+        sync.sync("Observation")
+        changed = next(iter(server.store["Observation"].values()))
+
+        def handle() -> Any:
+            server.put(changed)
+            return sync.sync("Observation")
+        return handle
+
+    family = server.store["Patient"][SMALL_PATIENT]["name"][0]["family"]
+    # One transposed letter, which the server's prefix search would not match
+    typo = family[0] + family[2] + family[1] + family[3:]
+    return [
+        ("tool.get_patient", lambda: tools.get_patient.invoke({"patient_id": SMALL_PATIENT})),
+        ("tool.search_patients",
+         lambda: tools.search_patients.invoke({"search_params": json.dumps({"family": family})})),
+        ("tool.search_patients.index",
+         indexed_tool(tools.search_patients, {"search_params": json.dumps({"family": family})})),
+        ("tool.search_patients.index.typo",
+         indexed_tool(tools.search_patients, {"search_params": json.dumps({"family": typo})})),
+        ("tool.get_patient_observations",
+         lambda: tools.get_patient_observations.invoke({"patient_id": SMALL_PATIENT})),
+        ("tool.get_patient_observations.large_history",
+         lambda: tools.get_patient_observations.invoke({"patient_id": LARGE_PATIENT})),
+        ("tool.get_patient_conditions", lambda: tools.get_patient_conditions.invoke({"patient_id": SMALL_PATIENT})),
+        ("tool.get_patient_encounters", lambda: tools.get_patient_encounters.invoke({"patient_id": SMALL_PATIENT})),
+        ("tool.get_patient_medications",
+         lambda: tools.get_patient_medications.invoke({"patient_id": SMALL_PATIENT})),
+        ("tool.get_complete_patient_data",
+         lambda: tools.get_complete_patient_data.invoke({"patient_id": SMALL_PATIENT})),
+        ("tool.get_complete_patient_data.large_history",
+         lambda: tools.get_complete_patient_data.invoke({"patient_id": LARGE_PATIENT})),
+        (f"fhir.burst_read.{BURST_READERS}", burst_reads(BURST_READERS)),
+        ("sync.observations.full", observation_sync(delta=False)),
+        ("sync.observations.delta", observation_sync(delta=True)),
+        ("graph.patient_read", graph_turn(f"Get patient {SMALL_PATIENT}")),
+        ("graph.complete_patient_data", graph_turn(f"Get all data for patient {SMALL_PATIENT}")),
+        ("graph.large_observation_history", graph_turn(f"Show observations for patient {LARGE_PATIENT}")),
+        ("graph.multi_tool", graph_turn("Show conditions and meds for patients 2 and 3")),
+        ("graph.complete_patient_data.llm_cache", cached_graph_turn(f"Get all data for patient {SMALL_PATIENT}")),
+        # Hides FHIR latency behind the model call when run with --server-latency and --llm-latency
+        ("graph.complete_patient_data.prefetch", prefetched_graph_turn(f"Get all data for patient {SMALL_PATIENT}")),
+        ui_turn("ui.on_message.complete_patient_data", f"Get all data for patient {SMALL_PATIENT}"),
+        # Memory carries over between iterations, as in a chat left open all day
+        ui_turn("ui.on_message.long_session", f"Show observations for patient {SMALL_PATIENT}", fresh_session=False),
+        # All sessions share one event loop, as in a single Chainlit worker
+        (f"ui.on_message.concurrent_sessions.{CONCURRENT_SESSIONS}",
+         concurrent_ui_turns(f"Get all data for patient {SMALL_PATIENT}", CONCURRENT_SESSIONS)),
+    ] + [(name, cold_start(code)) for name, code in STARTUP_SCENARIOS]
+
+
+def git_revision() -> Optional[str]:
+    """Return the current commit hash, if run from a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print the p50 and p95 change of each scenario against a baseline run."""
+    previous = {scenario['name']: scenario for scenario in baseline['scenarios']}
+    for scenario in results['scenarios']:
+        before = previous.get(scenario['name'])
+        if not before:
+            continue
+        changes = [f"{key} {(scenario[key] / before[key] - 1) * 100:+.1f}%"
+                   for key in ('p50_ms', 'p95_ms') if before[key]]
+        print(f"{scenario['name']:50} {', '.join(changes)}")
+
+
+def main() -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark tools, graph and UI handler offline")
+    parser.add_argument('--iterations', type=int, default=20, help="Timed calls per scenario")
+    parser.add_argument('--warmup', type=int, default=2, help="Untimed calls per scenario")
+    parser.add_argument('--startup-iterations', type=int, default=5,
+                        help="Timed interpreter starts per startup scenario")
+    parser.add_argument('--patients', type=int, default=20, help="Synthetic patients to serve")
+    parser.add_argument('--observations', type=int, default=20, help="Observations per typical patient")
+    parser.add_argument('--large-history', type=int, default=5000, help="Observations of the large patient")
+    parser.add_argument('--server-latency', type=float, default=0.0, help="Seconds added to each FHIR request")
+    parser.add_argument('--llm-latency', type=float, default=0.0, help="Seconds added to each model call")
+    parser.add_argument('--token-latency', type=float, default=0.0, help="Seconds between streamed tokens")
+    parser.add_argument('--scenario', action='append', help="Only run scenarios starting with this prefix")
+    parser.add_argument('--output', help="Write results to this JSON file")
+    parser.add_argument('--compare', help="Baseline JSON file to compare against")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    server = MockFHIRServer(generate_dataset(args.patients, observations=args.observations),
+                            latency=args.server_latency)
+    server.load(generate_dataset(1, observations=args.large_history))
+
+    with server:
+        scenarios = build_scenarios(server, args.llm_latency, args.token_latency)
+        selected = [(name, func) for name, func in scenarios
+                    if not args.scenario or any(name.startswith(prefix) for prefix in args.scenario)]
+        measured = []
+        for name, func in selected:
+            first_token_ms.pop(name, None)
+            if name.startswith('startup.'):
+                result = run_scenario(name, func, args.startup_iterations, warmup=1)
+            else:
+                result = run_scenario(name, func, args.iterations, args.warmup)
+            if name in first_token_ms:
+                result['first_token_p50_ms'] = round(percentile(first_token_ms[name], 50), 3)
+                result['first_token_p95_ms'] = round(percentile(first_token_ms[name], 95), 3)
+            measured.append(result)
+            print(f"{name:50} p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  "
+                  f"p99 {result['p99_ms']:9.2f} ms  {result['throughput_per_s']:8.1f}/s"
+                  + (f"  first token {result['first_token_p50_ms']:.2f} ms" if 'first_token_p50_ms' in result else ""))
+
+        from ui import app
+        asyncio.run(app.on_app_shutdown())
+
+    from agents import tools
+    from agents.intent_rules import intent_stats
+    from agents.prefetch import prefetcher
+    from agents.prompts import prompt_cache_stats
+
+    results = {
+        'revision': git_revision(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'settings': vars(args),
+        'scenarios': measured,
+        'intent_classification': intent_stats.stats(),
+        'prompt_cache': prompt_cache_stats.stats(),
+        'prefetch': prefetcher.stats.stats(),
+        'coalescing': tools.get_fhir_client().single_flight.stats() if tools.get_fhir_client().single_flight else None,
+    }
+    for prompt, totals in results['prompt_cache'].items():
+        print(f"prompt {prompt:43} {totals['calls']:6} calls  {totals['cached_ratio']:6.1%} of input tokens cached")
+    if results['prefetch']['total']:
+        print(f"prefetch {'':41} {results['prefetch']['total']:6} requests  "
+              f"{results['prefetch']['used_ratio']:6.1%} used by a tool")
+    if results['coalescing'] and results['coalescing']['calls']:
+        print(f"coalescing {'':39} {results['coalescing']['calls']:6} GETs      "
+              f"{results['coalescing']['coalescing_ratio']:6.1%} shared another caller's request")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
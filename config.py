@@ -10,8 +10,112 @@ OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
 
 # FHIR API Configuration
 FHIR_BASE_URL = os.getenv("FHIR_BASE_URL", "https://hapi.fhir.org/baseR4")
+FHIR_PAGE_SIZE = int(os.getenv("FHIR_PAGE_SIZE", "50"))
+# "parallel" fans out one request per resource type, "single" uses $everything or a batch Bundle
+FHIR_PATIENT_RECORD_STRATEGY = os.getenv("FHIR_PATIENT_RECORD_STRATEGY", "parallel")
+
+# FHIR Response Cache Configuration
+FHIR_CACHE_ENABLED = os.getenv("FHIR_CACHE_ENABLED", "false").lower() == "true"
+FHIR_CACHE_MAX_ENTRIES = int(os.getenv("FHIR_CACHE_MAX_ENTRIES", "1024"))
+FHIR_CACHE_TTL = float(os.getenv("FHIR_CACHE_TTL", "60"))
+FHIR_CACHE_TTLS = os.getenv("FHIR_CACHE_TTLS", "Patient=300")
+# Start the requests of the tools a query points at as soon as it names a
+# patient, while the model is still deciding; fills the cache above
+FHIR_PREFETCH_ENABLED = os.getenv("FHIR_PREFETCH_ENABLED", "false").lower() == "true"
+
+# FHIR Connection Pool Configuration
+FHIR_POOL_SIZE = int(os.getenv("FHIR_POOL_SIZE", "10"))
+FHIR_KEEPALIVE_TIMEOUT = float(os.getenv("FHIR_KEEPALIVE_TIMEOUT", "30"))
+FHIR_CONNECT_TIMEOUT = float(os.getenv("FHIR_CONNECT_TIMEOUT", "5"))
+FHIR_READ_TIMEOUT = float(os.getenv("FHIR_READ_TIMEOUT", "30"))
+FHIR_WRITE_TIMEOUT = float(os.getenv("FHIR_WRITE_TIMEOUT", "60"))
+FHIR_BULK_TIMEOUT = float(os.getenv("FHIR_BULK_TIMEOUT", "120"))
+
+# FHIR Resilience Configuration
+FHIR_RETRY_ATTEMPTS = int(os.getenv("FHIR_RETRY_ATTEMPTS", "3"))
+FHIR_RETRY_BACKOFF = float(os.getenv("FHIR_RETRY_BACKOFF", "0.2"))
+FHIR_RETRY_BACKOFF_MAX = float(os.getenv("FHIR_RETRY_BACKOFF_MAX", "5"))
+FHIR_BREAKER_THRESHOLD = int(os.getenv("FHIR_BREAKER_THRESHOLD", "5"))
+FHIR_BREAKER_RESET = float(os.getenv("FHIR_BREAKER_RESET", "30"))
+FHIR_HEDGE_PERCENTILE = float(os.getenv("FHIR_HEDGE_PERCENTILE", "0"))
+# Concurrent identical reads and searches share one request and its result
+FHIR_COALESCE_ENABLED = os.getenv("FHIR_COALESCE_ENABLED", "true").lower() == "true"
+
+# Local Store Configuration
+LOCAL_STORE_PATH = os.getenv("LOCAL_STORE_PATH", "fhir_local.db")
+FHIR_EXPORT_POLL_INTERVAL = float(os.getenv("FHIR_EXPORT_POLL_INTERVAL", "5"))
+FHIR_EXPORT_TIMEOUT = float(os.getenv("FHIR_EXPORT_TIMEOUT", "3600"))
+
+# Delta Sync Configuration
+# Keep the local store current by pulling only what changed since the last sync
+FHIR_SYNC_ENABLED = os.getenv("FHIR_SYNC_ENABLED", "false").lower() == "true"
+FHIR_SYNC_INTERVAL = float(os.getenv("FHIR_SYNC_INTERVAL", "300"))
+# "history" (type-level _history, also sees deletes) or "search" (_lastUpdated=gt...)
+FHIR_SYNC_MODE = os.getenv("FHIR_SYNC_MODE", "history")
+FHIR_SYNC_TYPES = os.getenv("FHIR_SYNC_TYPES", "Patient,Observation,Condition,Encounter,MedicationRequest")
+# Seconds each delta reaches back before the high-water mark, for changes committed out of order
+FHIR_SYNC_OVERLAP = float(os.getenv("FHIR_SYNC_OVERLAP", "1"))
+FHIR_SYNC_PAGE_SIZE = int(os.getenv("FHIR_SYNC_PAGE_SIZE", "200"))
+
+# Patient Index Configuration
+# Answer patient searches from an in-memory name index, loaded from the local
+# store and filled by server searches; misses still go to the server
+PATIENT_INDEX_ENABLED = os.getenv("PATIENT_INDEX_ENABLED", "false").lower() == "true"
+# 0-1; lower tolerates more typos in name searches
+PATIENT_INDEX_MIN_SIMILARITY = float(os.getenv("PATIENT_INDEX_MIN_SIMILARITY", "0.7"))
+
+# Intent Classification Configuration
+# Rule matches at or above the threshold skip the LLM classification call
+INTENT_RULES_ENABLED = os.getenv("INTENT_RULES_ENABLED", "true").lower() == "true"
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.8"))
+
+# Conversation Memory Configuration
+# Recent turns are kept verbatim within the budget; older ones are folded into a summary
+CONVERSATION_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "2000"))
+CONVERSATION_SUMMARY_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "300"))
+CONVERSATION_MAX_MESSAGES = int(os.getenv("CONVERSATION_MAX_MESSAGES", "40"))
+
+# Conversation Checkpoint Configuration
+# SQLite file holding each chat's graph state, so sessions survive restarts
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "checkpoints.db")
+# "exit" writes one checkpoint per turn, "async"/"sync" one per graph step
+CHECKPOINT_DURABILITY = os.getenv("CHECKPOINT_DURABILITY", "exit")
+
+# LLM Response Cache Configuration
+# Reuses classification and summary responses for identical prompts; never used for writes
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() == "true"
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory")  # or "sqlite"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "300"))
+
+# Tool Output Configuration
+# "compact" renders record lists as tables, "json" keeps indented JSON
+TOOL_OUTPUT_FORMAT = os.getenv("TOOL_OUTPUT_FORMAT", "compact")
+TOOL_OUTPUT_MAX_CHARS = int(os.getenv("TOOL_OUTPUT_MAX_CHARS", "12000"))
+# Observation, condition and medication results of at least this many records
+# reach the answer prompt as a per-code digest instead of every resource
+CLINICAL_DIGEST_ENABLED = os.getenv("CLINICAL_DIGEST_ENABLED", "true").lower() == "true"
+CLINICAL_DIGEST_MIN_RECORDS = int(os.getenv("CLINICAL_DIGEST_MIN_RECORDS", "10"))
+
+# Tool Execution Configuration
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "8"))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "30"))
+# Per-tool overrides in seconds, e.g. "get_complete_patient_data=60"
+TOOL_TIMEOUTS = os.getenv("TOOL_TIMEOUTS", "get_complete_patient_data=60")
+
+# Tracing Configuration
+# Spans of graph nodes, tools, FHIR requests and model calls, exported as OTLP/JSON:
+# "file" appends to TRACE_FILE, "otlp" posts to the collector, "none" only keeps metrics
+OTEL_TRACES_EXPORTER = os.getenv("OTEL_TRACES_EXPORTER", "none")
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "healthcare-agent")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", "5"))
+TRACE_EXPORT_BATCH_SIZE = int(os.getenv("TRACE_EXPORT_BATCH_SIZE", "512"))
+# Serve Prometheus metrics at /metrics on the Chainlit server
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
 
 # Chainlit Configuration
 CHAINLIT_HOST = os.getenv("CHAINLIT_HOST", "0.0.0.0")
 CHAINLIT_PORT = int(os.getenv("CHAINLIT_PORT", "8000"))
-
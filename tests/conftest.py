@@ -0,0 +1,12 @@
+"""Shared pytest fixtures."""
+import pytest
+
+from utils.mock_fhir_server import MockFHIRServer
+from utils.synthetic_data import generate_dataset
+
+
+@pytest.fixture
+def mock_fhir_server():
+    """Local FHIR server preloaded with three synthetic patients."""
+    with MockFHIRServer(generate_dataset(3, observations=25)) as server:
+        yield server
@@ -0,0 +1,106 @@
+"""Tests for the clinical digest of tool results."""
+from agents import nodes, tools
+from agents.aggregation import clinical_digest, summarize_conditions, summarize_medications, summarize_observations, trend
+from utils.async_fhir_client import AsyncFHIRClient
+from utils.fhir_client import FHIRClient
+
+LOINC = "http://loinc.org"
+
+
+def quantity(code, display, value, unit="mmHg"):
+    return {"code": {"coding": [{"system": LOINC, "code": code, "display": display}]},
+            "valueQuantity": {"value": value, "unit": unit}}
+
+
+def blood_pressure(when, systolic, diastolic):
+    return {
+        "resourceType": "Observation",
+        "effectiveDateTime": when,
+        "code": {"coding": [{"system": LOINC, "code": "85354-9", "display": "Blood pressure panel"}]},
+        "component": [quantity("8480-6", "Systolic", systolic), quantity("8462-4", "Diastolic", diastolic)],
+    }
+
+
+def test_trend_uses_the_slope_across_the_series():
+    """Test rising, falling and stable series and the minimum length."""
+    assert trend([(None, 1.0), (None, 2.0), (None, 3.0)]) == "rising"
+    assert trend([(0.0, 150.0), (10.0, 140.0), (20.0, 120.0)]) == "falling"
+    assert trend([(None, 100.0), (None, 101.0), (None, 100.0)]) == "stable"
+    assert trend([(None, 1.0), (None, 9.0)]) == ""
+
+
+def test_trend_ignores_undated_points_in_a_dated_series():
+    """Test that undated points do not mix list positions with epoch seconds."""
+    day = 86400.0
+    # As positions 0 and 1 next to epochs of 1.7e9, the two undated highs would read as a steep fall
+    points = [(None, 200.0), (None, 190.0), (1.7e9, 100.0), (1.7e9 + day, 110.0), (1.7e9 + 2 * day, 120.0)]
+    assert trend(points) == "rising"
+    assert trend([(None, 200.0), (1.7e9, 100.0), (1.7e9 + day, 110.0)]) == ""
+
+
+def test_observations_are_grouped_per_component():
+    """Test that blood pressure splits into systolic and diastolic series."""
+    observations = [
+        blood_pressure("2024-01-01T00:00:00Z", 120, 80),
+        blood_pressure("2024-03-01T00:00:00Z", 140, 85),
+        blood_pressure("2024-02-01T00:00:00Z", 130, 82),
+        {"resourceType": "Observation", "effectiveDateTime": "2024-02-15", **quantity("8867-4", "Heart rate", 70, "/min")},
+    ]
+    rows = {row["code"]: row for row in summarize_observations(observations)}
+    assert set(rows) == {"8480-6", "8462-4", "8867-4"}
+    systolic = rows["8480-6"]
+    assert (systolic["count"], systolic["min"], systolic["max"]) == (3, 120, 140)
+    assert systolic["latest_date"] == "2024-03-01T00:00:00Z"
+    assert systolic["trend"] == "rising"
+    assert rows["8867-4"]["trend"] == ""
+
+
+def test_conditions_and_medications_are_collapsed():
+    """Test that repeated records become one row with the latest status."""
+    diabetes = {"coding": [{"code": "44054006", "display": "Diabetes"}]}
+    conditions = [
+        {"code": diabetes, "onsetDateTime": "2020-05-01", "clinicalStatus": {"text": "active"}},
+        {"code": diabetes, "onsetDateTime": "2019-01-01", "clinicalStatus": {"text": "resolved"}},
+    ]
+    assert summarize_conditions(conditions) == [
+        {"code": "44054006", "condition": "Diabetes", "onset": "2019-01-01", "records": 2, "status": "active"},
+    ]
+
+    metformin = {"coding": [{"code": "860975", "display": "Metformin"}]}
+    medications = [
+        {"medicationCodeableConcept": metformin, "status": "stopped", "authoredOn": "2021-01-01"},
+        {"medicationCodeableConcept": metformin, "status": "active", "authoredOn": "2023-01-01",
+         "dosageInstruction": [{"text": "500 mg twice daily"}]},
+    ]
+    [row] = summarize_medications(medications)
+    assert (row["requests"], row["status"], row["dosage"]) == (2, "active", "500 mg twice daily")
+
+
+def test_digest_is_smaller_than_the_raw_tool_output(monkeypatch, mock_fhir_server):
+    """Test that the complete record digest keeps every code in fewer characters."""
+    monkeypatch.setattr(tools, "async_fhir_client", AsyncFHIRClient(base_url=mock_fhir_server.base_url))
+    try:
+        message = tools.get_complete_patient_data.invoke(
+            {"name": "get_complete_patient_data", "args": {"patient_id": "1"}, "id": "c1", "type": "tool_call"})
+    finally:
+        tools.async_fhir_client.close_sync()
+
+    digest = clinical_digest(message.artifact["records"], message.artifact["totals"])
+    assert len(digest) < len(message.content)
+    for row in summarize_observations(message.artifact["records"]["Observation"]):
+        assert row["code"] in digest
+    assert "Observation=10 of 25" in digest
+
+
+def test_executor_sends_the_digest_to_the_prompt(monkeypatch, mock_fhir_server):
+    """Test that large results reach the prompt as a digest while on_result keeps the raw text."""
+    monkeypatch.setattr(tools, "fhir_client", FHIRClient(base_url=mock_fhir_server.base_url))
+    calls = [{"name": "get_patient_observations", "args": {"patient_id": "2"}, "id": "c1"}]
+    reported = []
+
+    [result] = nodes.execute_tool_calls(calls, on_result=lambda event: reported.append(event["result"]))
+    assert "observations by code" in result
+    assert reported == [tools.get_patient_observations.invoke({"patient_id": "2"})]
+
+    monkeypatch.setattr(nodes, "CLINICAL_DIGEST_ENABLED", False)
+    assert nodes.execute_tool_calls(calls) == [f"Tool: get_patient_observations\nResult: {reported[0]}"]
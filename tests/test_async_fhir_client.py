@@ -0,0 +1,71 @@
+"""Tests for the async FHIR client."""
+import asyncio
+import gc
+import pytest
+from utils.async_fhir_client import AsyncFHIRClient, run_sync
+
+
+def test_async_fhir_client_initialization():
+    """Test async FHIR client initialization."""
+    client = AsyncFHIRClient(pool_size=4)
+    assert client.base_url == "https://hapi.fhir.org/baseR4"
+    assert client.pool_size == 4
+
+
+def test_run_sync_inside_running_loop():
+    """Test that run_sync works when called from an event loop thread."""
+    async def double(value):
+        return value * 2
+
+    async def caller():
+        return run_sync(double(21))
+
+    assert asyncio.run(caller()) == 42
+
+
+def test_concurrent_searches():
+    """Test issuing searches concurrently over the pooled session."""
+    async def search():
+        async with AsyncFHIRClient() as client:
+            return await asyncio.gather(
+                client.search_resources("Patient", {"_count": "1"}),
+                client.search_resources("Observation", {"_count": "1"}),
+            )
+
+    try:
+        patients, observations = asyncio.run(search())
+        assert patients["resourceType"] == "Bundle"
+        assert observations["resourceType"] == "Bundle"
+    except Exception as e:
+        pytest.skip(f"FHIR server unavailable: {e}")
+
+
+def test_close_sync_closes_session_on_its_own_loop(mock_fhir_server):
+    """Test closing from synchronous code after the owning loop has stopped."""
+    client = AsyncFHIRClient(base_url=mock_fhir_server.base_url)
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(client.read_resource("Patient", "1"))
+        session = client._session
+        client.close_sync()
+        assert session.closed
+        assert client._session is None
+    finally:
+        loop.close()
+
+
+def test_sync_and_async_callers_share_one_session(mock_fhir_server, caplog, recwarn):
+    """Test that calls from the background loop and from other loops leave no session open."""
+    client = AsyncFHIRClient(base_url=mock_fhir_server.base_url)
+    run_sync(client.read_resource("Patient", "1"))
+    session = client._session
+    for _ in range(2):
+        asyncio.run(client.search_resources("Observation", {"patient": "1"}))
+    assert client._session is session
+
+    client.close_sync()
+    del session
+    gc.collect()
+    assert client._session is None
+    assert not [record for record in caplog.records if "Unclosed" in record.getMessage()]
+    assert not [warning for warning in recwarn if "Unclosed" in str(warning.message)]
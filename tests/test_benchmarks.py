@@ -0,0 +1,35 @@
+"""Tests for the benchmark helpers."""
+from benchmarks.fake_llm import FakeChatModel, classify, route_query, route_tool_calls
+from benchmarks.harness import percentile, run_scenario
+
+
+def test_percentile_interpolates():
+    """Test linear interpolation between ranked samples."""
+    samples = [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert percentile(samples, 50) == 3.0
+    assert percentile(samples, 95) == 4.8
+    assert percentile([], 99) == 0.0
+
+
+def test_fake_llm_routes_queries():
+    """Test that the fake model picks the tool the agent prompt implies."""
+    assert route_query("Get all data for patient 592598")["name"] == "get_complete_patient_data"
+    assert route_query("Show observations for patient 12") == {
+        "name": "get_patient_observations", "args": {"patient_id": "12"}}
+    assert route_query("Search for patients with family name Smith")["name"] == "search_patients"
+    assert route_query("Hello") is None
+    assert len(route_tool_calls("Show conditions and meds for patients 1 and 2")) == 4
+    assert classify("What conditions does patient 456 have?")["resource_type"] == "Condition"
+
+    model = FakeChatModel().bind_tools([type("T", (), {"name": "get_patient"})()])
+    response = model.invoke("Get patient 7")
+    assert response.tool_calls[0]["args"] == {"patient_id": "7"}
+    assert response.usage_metadata["total_tokens"] > 0
+
+
+def test_run_scenario_reports_metrics():
+    """Test that a scenario reports latency, throughput and memory."""
+    result = run_scenario("noop", lambda: [0] * 1000, iterations=5, warmup=0)
+    assert result["iterations"] == 5
+    assert 0 <= result["p50_ms"] <= result["p99_ms"]
+    assert result["peak_rss_bytes"] > 0
@@ -0,0 +1,135 @@
+"""Tests for incremental delta sync of the local store."""
+import time
+
+import pytest
+
+from utils.bulk_export import run_bulk_export
+from utils.delta_sync import DeltaSync, DeltaSyncWorker, apply_changes, history_changes
+from utils.fhir_client import FHIRClient
+from utils.local_store import LocalStore
+
+
+def patient(patient_id, family, last_updated):
+    return {"resourceType": "Patient", "id": patient_id, "name": [{"family": family}],
+            "meta": {"lastUpdated": last_updated}}
+
+
+def history_entry(method, resource_type, resource_id, last_modified, resource=None):
+    entry = {"request": {"method": method, "url": f"{resource_type}/{resource_id}"},
+             "response": {"lastModified": last_modified}}
+    if resource is not None:
+        entry["resource"] = resource
+    return entry
+
+
+def test_changes_reduce_to_the_newest_and_apply_once():
+    """Test that replayed, stale and repeated changes leave the store unchanged."""
+    store = LocalStore(":memory:")
+    store.upsert_resources([patient("1", "Old", "2024-01-01T00:00:00Z"),
+                            patient("2", "Kept", "2024-03-01T00:00:00Z"),
+                            patient("3", "Gone", "2024-01-01T00:00:00Z")])
+    changes = history_changes([
+        history_entry("PUT", "Patient", "1", "2024-02-01T00:00:00Z", patient("1", "New", "2024-02-01T00:00:00Z")),
+        history_entry("POST", "Patient", "1", "2024-01-01T00:00:00Z", patient("1", "Old", "2024-01-01T00:00:00Z")),
+        history_entry("PUT", "Patient", "2", "2024-02-01T00:00:00+00:00", patient("2", "Stale", "2024-02-01")),
+        history_entry("DELETE", "Patient", "3", "2024-02-01T00:00:00Z"),
+        history_entry("DELETE", "Patient", "4", "2024-02-01T00:00:00Z"),
+    ])
+    assert changes["1"][1]["name"] == [{"family": "New"}] and changes["3"] == ("2024-02-01T00:00:00Z", None)
+
+    written, deleted = apply_changes(store, "Patient", changes)
+    assert [resource["id"] for resource in written] == ["1"] and deleted == ["3"]
+    assert store.get_resource("Patient", "1")["name"] == [{"family": "New"}]
+    assert store.get_resource("Patient", "2")["name"] == [{"family": "Kept"}]
+    assert store.get_resource("Patient", "3") is None
+    assert apply_changes(store, "Patient", changes) == ([], [])
+
+
+def test_history_delta_after_a_bulk_export(mock_fhir_server):
+    """Test that a delta carries only the changes made since the export, deletes included."""
+    store = LocalStore(":memory:")
+    client = FHIRClient(mock_fhir_server.base_url, coalesce=False)
+    run_bulk_export(client, store, ["Patient", "Observation"], poll_interval=0)
+    exported = store.get_high_water("Patient")
+    assert exported is not None and store.get_high_water("Observation") == exported
+
+    renamed = {**mock_fhir_server.store["Patient"]["1"], "name": [{"family": "Renamed", "given": ["Emma"]}]}
+    mock_fhir_server.put(renamed)
+    removed = next(iter(mock_fhir_server.store["Observation"]))
+    mock_fhir_server.remove("Observation", removed)
+    synced = []
+    sync = DeltaSync(client, store, ["Patient", "Observation"], mode="history", overlap=0,
+                     listeners=[lambda *change: synced.append(change)])
+    requests = len(mock_fhir_server.requests)
+
+    assert sync.sync_all() == {"Patient": {"received": 1, "written": 1, "deleted": 0},
+                               "Observation": {"received": 1, "written": 0, "deleted": 1}}
+    assert [request.split("?")[0] for request in mock_fhir_server.requests[requests:]] == [
+        "GET /Patient/_history", "GET /Observation/_history"]
+    assert store.get_resource("Patient", "1")["name"][0]["family"] == "Renamed"
+    assert store.get_resource("Observation", removed) is None
+    assert store.count("Observation") == 74
+    assert store.get_high_water("Patient") > exported
+    assert synced[0] == ("Patient", [store.get_resource("Patient", "1")], [])
+
+    # _since is inclusive, so the newest change is read again but is not newer than the store
+    assert sync.sync("Patient") == {"received": 1, "written": 0, "deleted": 0}
+
+
+def test_search_delta_uses_last_updated(mock_fhir_server):
+    """Test the _lastUpdated mode, which sees new versions but not deletes."""
+    store = LocalStore(":memory:")
+    sync = DeltaSync(FHIRClient(mock_fhir_server.base_url, coalesce=False), store, ["Patient"], mode="search",
+                     overlap=0)
+    assert sync.sync("Patient")["written"] == 3
+
+    mock_fhir_server.put({**mock_fhir_server.store["Patient"]["2"], "gender": "other"})
+    mock_fhir_server.remove("Patient", "3")
+    requests = len(mock_fhir_server.requests)
+    assert sync.sync("Patient") == {"received": 1, "written": 1, "deleted": 0}
+    assert "_lastUpdated=gt" in mock_fhir_server.requests[requests]
+    assert store.get_resource("Patient", "2")["gender"] == "other"
+    assert store.count("Patient") == 3
+
+    with pytest.raises(ValueError):
+        DeltaSync(sync.client, store, mode="everything")
+
+
+def test_full_pull_applies_each_page_and_resumes_after_a_failure(mock_fhir_server):
+    """Test that a first sync moves the mark page by page, so a failed pull is not restarted."""
+    store = LocalStore(":memory:")
+    pages = []
+
+    def fail_after_two_pages(resource_type, written, deleted):
+        pages.append(len(written))
+        if len(pages) == 2:
+            raise RuntimeError("connection lost")
+
+    sync = DeltaSync(FHIRClient(mock_fhir_server.base_url, coalesce=False), store, ["Observation"],
+                     mode="history", page_size=10, listeners=[fail_after_two_pages])
+    with pytest.raises(RuntimeError):
+        sync.sync("Observation")
+    assert pages == [10, 10] and store.count("Observation") == 20
+    newest = max(store.get_resources("Observation"), key=lambda r: r["meta"]["lastUpdated"])
+    assert store.get_high_water("Observation") == newest["meta"]["lastUpdated"]
+    assert sync.full_pulls == {"Observation"}
+
+    requests = len(mock_fhir_server.requests)
+    sync.sync("Observation")
+    assert "_lastUpdated=gt" in mock_fhir_server.requests[requests]
+    assert store.count("Observation") == 75 and sync.full_pulls == set()
+    assert all(size <= 10 for size in pages)
+
+
+def test_worker_syncs_in_the_background_and_survives_failures(mock_fhir_server):
+    """Test that a failing type is skipped and the others keep syncing."""
+    store = LocalStore(":memory:")
+    sync = DeltaSync(FHIRClient(mock_fhir_server.base_url, coalesce=False), store, ["Unknown", "Condition"])
+    worker = DeltaSyncWorker(sync, interval=60).start()
+    deadline = time.monotonic() + 5
+    while worker.runs == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    worker.stop(timeout=5)
+    assert worker.runs == 1
+    assert store.count("Condition") == len(mock_fhir_server.store["Condition"])
+    assert store.get_high_water("Unknown") is None
@@ -0,0 +1,102 @@
+"""Tests for the FHIR response cache."""
+from utils.fhir_cache import FHIRCache, parse_ttls
+from utils.fhir_client import FHIRClient
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Response:
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.payload = payload
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+    def close(self):
+        pass
+
+
+class _ETagSession:
+    """Answers 304 whenever the request carries the current ETag."""
+
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        self.calls.append(headers or {})
+        if (headers or {}).get('If-None-Match') == 'W/"1"':
+            return _Response(304)
+        return _Response(200, {"resourceType": "Patient", "id": "1"}, {"ETag": 'W/"1"'})
+
+
+def test_parse_ttls():
+    """Test parsing per-resource-type TTLs."""
+    assert parse_ttls("Patient=300, Observation=30") == {"Patient": 300.0, "Observation": 30.0}
+
+
+def test_search_key_ignores_param_order():
+    """Test that search keys are normalized."""
+    assert FHIRCache.search_key("Observation", {"patient": "1", "_count": 10}) == \
+        FHIRCache.search_key("Observation", {"_count": "10", "patient": "1"})
+
+
+def test_lru_eviction_and_ttl():
+    """Test size bound, LRU order and expiry."""
+    clock = _Clock()
+    cache = FHIRCache(max_entries=2, default_ttl=10, ttls={"Patient": 100}, clock=clock)
+    cache.store(("read", "Observation", "a"), 1)
+    cache.store(("read", "Observation", "b"), 2)
+    cache.lookup(("read", "Observation", "a"))
+    cache.store(("read", "Patient", "c"), 3)
+
+    assert cache.lookup(("read", "Observation", "b")) == (None, False)
+    assert cache.lookup(("read", "Observation", "a"))[1] is True
+
+    clock.now = 50
+    assert cache.lookup(("read", "Observation", "a")) == (None, False)
+    assert cache.lookup(("read", "Patient", "c"))[1] is True
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_on_write():
+    """Test that a write drops the resource and searches over its type."""
+    cache = FHIRCache()
+    cache.store(FHIRCache.read_key("Patient", "1"), {})
+    cache.store(FHIRCache.read_key("Patient", "2"), {})
+    cache.store(FHIRCache.search_key("Patient", {"family": "Smith"}), {})
+    cache.store(FHIRCache.search_key("Observation", {"patient": "1"}), {})
+
+    cache.invalidate("Patient", "1")
+
+    assert cache.lookup(FHIRCache.read_key("Patient", "1"))[0] is None
+    assert cache.lookup(FHIRCache.search_key("Patient", {"family": "Smith"}))[0] is None
+    assert cache.lookup(FHIRCache.read_key("Patient", "2"))[1] is True
+    assert cache.lookup(FHIRCache.search_key("Observation", {"patient": "1"}))[1] is True
+
+
+def test_client_revalidates_with_etag():
+    """Test that a stale entry is revalidated with If-None-Match."""
+    clock = _Clock()
+    client = FHIRClient(base_url="http://fhir.test", cache=FHIRCache(default_ttl=10, ttls={}, clock=clock))
+    client.session = _ETagSession()
+
+    assert client.read_resource("Patient", "1")["id"] == "1"
+    assert client.read_resource("Patient", "1")["id"] == "1"
+    assert len(client.session.calls) == 1
+
+    clock.now = 20
+    assert client.read_resource("Patient", "1")["id"] == "1"
+    assert client.session.calls[-1] == {'If-None-Match': 'W/"1"'}
+    assert client.cache.stats()["revalidations"] == 1
@@ -1,24 +1,164 @@
 """Tests for the FHIR client."""
 import pytest
-from utils.fhir_client import FHIRClient
+from utils.fhir_client import (
+    FHIRClient,
+    get_next_link,
+    project_resource,
+    split_patient_record,
+    supports_operation,
+)
 from utils.fhir_templates import PATIENT_EXAMPLE
 
 
+class _PagedResponse:
+    status_code = 200
+    ok = True
+    headers = {}
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+    def close(self):
+        pass
+
+
+class _FakeSession:
+    def request(self, method, url, **kwargs):
+        return getattr(self, method.lower())(url, **kwargs)
+
+
+class _PagedSession(_FakeSession):
+    """Serves three pages of two entries, recording each requested URL."""
+
+    def __init__(self):
+        self.requested = []
+
+    def get(self, url, params=None, **kwargs):
+        self.requested.append((url, params))
+        page = len(self.requested)
+        bundle = {
+            "resourceType": "Bundle",
+            "entry": [{"resource": {"id": f"{page}-{i}"}} for i in range(2)],
+            "link": [],
+        }
+        if page < 3:
+            bundle["link"].append({"relation": "next", "url": f"http://fhir/page{page + 1}"})
+        return _PagedResponse(bundle)
+
+
 def test_fhir_client_initialization():
     """Test FHIR client initialization."""
     client = FHIRClient()
     assert client.base_url == "https://hapi.fhir.org/baseR4"
 
 
-def test_search_patients():
+def test_search_patients(mock_fhir_server):
     """Test searching for patients."""
-    client = FHIRClient()
-    try:
-        result = client.search_resources("Patient", {"_count": "1"})
-        assert "resourceType" in result
-        assert result["resourceType"] == "Bundle"
-    except Exception as e:
-        pytest.skip(f"FHIR server unavailable: {e}")
+    client = FHIRClient(base_url=mock_fhir_server.base_url)
+    result = client.search_resources("Patient", {"_count": "1"})
+    assert result["resourceType"] == "Bundle"
+    assert len(result["entry"]) == 1
+    assert result["entry"][0]["resource"]["resourceType"] == "Patient"
+
+
+def test_get_next_link():
+    """Test extracting the next page link from a Bundle."""
+    bundle = {"link": [{"relation": "self", "url": "a"}, {"relation": "next", "url": "b"}]}
+    assert get_next_link(bundle) == "b"
+    assert get_next_link({"link": [{"relation": "self", "url": "a"}]}) is None
+
+
+def test_iter_resources_follows_next_links():
+    """Test lazy iteration across pages with early termination."""
+    client = FHIRClient(base_url="http://fhir.test")
+    client.session = _PagedSession()
+
+    entries = list(client.iter_resources("Observation", {"patient": "1"}, page_size=2))
+    assert [e["resource"]["id"] for e in entries] == ["1-0", "1-1", "2-0", "2-1", "3-0", "3-1"]
+
+    client.session = _PagedSession()
+    entries = list(client.iter_resources("Observation", {"patient": "1"}, page_size=2, limit=3))
+    assert len(entries) == 3
+    assert len(client.session.requested) == 2
+    assert client.session.requested[0][1] == {"patient": "1", "_count": "2"}
+
+
+class _BatchSession(_FakeSession):
+    """Server without $everything that answers batch Bundles."""
+
+    def __init__(self):
+        self.posted = []
+
+    def get(self, url, params=None, **kwargs):
+        return _PagedResponse({"resourceType": "CapabilityStatement", "rest": [
+            {"resource": [{"type": "Patient", "operation": [{"name": "validate"}]}]}
+        ]})
+
+    def post(self, url, json=None, **kwargs):
+        self.posted.append(json)
+        entries = [{"response": {"status": "200 OK"}, "resource": {"resourceType": "Patient", "id": "1"}}]
+        for request in json["entry"][1:]:
+            resource_type = request["request"]["url"].split("?")[0]
+            entries.append({"response": {"status": "200 OK"}, "resource": {
+                "resourceType": "Bundle", "total": 42,
+                "entry": [{"resource": {"resourceType": resource_type, "id": "a"}}],
+            }})
+        return _PagedResponse({"resourceType": "Bundle", "type": "batch-response", "entry": entries})
+
+
+def test_supports_operation():
+    """Test reading operations from a CapabilityStatement."""
+    capability = {"rest": [{"resource": [{"type": "Patient", "operation": [{"name": "everything"}]}]}]}
+    assert supports_operation(capability, "Patient", "everything")
+    assert not supports_operation(capability, "Observation", "everything")
+
+
+def test_split_patient_record():
+    """Test splitting $everything entries by resource type."""
+    entries = [{"resource": {"resourceType": t, "id": str(i)}}
+               for i, t in enumerate(["Patient", "Observation", "Observation", "Condition", "Device"])]
+    record, totals = split_patient_record(entries, limit=1)
+    assert [r["id"] for r in record["Observation"]] == ["1"]
+    assert totals["Observation"] == 2
+    assert "Device" not in record
+
+
+def test_get_patient_record_falls_back_to_batch():
+    """Test that one batch Bundle is posted when $everything is not offered."""
+    client = FHIRClient(base_url="http://fhir.test")
+    client.session = _BatchSession()
+
+    record, totals = client.get_patient_record("1", limit=10)
+    assert len(client.session.posted) == 1
+    assert record["Patient"][0]["id"] == "1"
+    assert record["MedicationRequest"][0]["resourceType"] == "MedicationRequest"
+    assert totals["Observation"] == 42
+
+
+def test_project_resource_trims_once():
+    """Test local trimming when the server ignores _elements."""
+    resource = {"resourceType": "Patient", "id": "1", "gender": "male", "address": [{}], "name": []}
+    trimmed = project_resource(resource, ["gender"])
+    assert set(trimmed) == {"resourceType", "id", "gender", "meta"}
+    assert trimmed["meta"]["tag"][0]["code"] == "SUBSETTED"
+    assert project_resource(trimmed, ["name"]) is trimmed
+    assert "address" in resource
+
+
+def test_search_pushes_down_elements():
+    """Test that _elements is sent and ignored projections are trimmed locally."""
+    client = FHIRClient(base_url="http://fhir.test")
+    client.session = _PagedSession()
+
+    entries = list(client.iter_resources("Patient", {"family": "Smith"}, limit=1, elements=["gender"]))
+    assert client.session.requested[0][1]["_elements"] == "gender"
+    assert set(entries[0]["resource"]) == {"id", "meta"}
 
 
 if __name__ == "__main__":
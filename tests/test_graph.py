@@ -0,0 +1,51 @@
+"""Tests for the compiled agent graph."""
+import os
+import subprocess
+import sys
+
+from agents import nodes, tools
+from agents.graph import create_healthcare_graph, sqlite_checkpointer, turn_input
+from benchmarks.fake_llm import FakeChatModel
+from utils.fhir_client import FHIRClient
+
+
+def test_checkpointed_conversation_survives_restart(monkeypatch, mock_fhir_server, tmp_path):
+    """Test that a new graph on the same database continues the thread from its checkpoint."""
+    model = FakeChatModel()
+    monkeypatch.setattr(nodes, "llm", model)
+    monkeypatch.setattr(tools, "fhir_client", FHIRClient(base_url=mock_fhir_server.base_url))
+    path = str(tmp_path / "checkpoints.db")
+    config = {"configurable": {"thread_id": "chat-1"}}
+
+    checkpointer = sqlite_checkpointer(path)
+    create_healthcare_graph(checkpointer).invoke(turn_input("Get patient 1"), config, durability="exit")
+    checkpointer.conn.close()
+
+    checkpointer = sqlite_checkpointer(path)
+    graph = create_healthcare_graph(checkpointer)
+    result = graph.invoke(turn_input("Show conditions for patient 1"), config, durability="exit")
+    assert result["intent"] == "patient_data_query"
+    assert [(m["role"], m["content"][:12]) for m in result["messages"]] == [
+        ("user", "Get patient "), ("assistant", result["messages"][1]["content"][:12]),
+        ("user", "Show conditi"), ("assistant", result["agent_response"][:12]),
+    ]
+    # One checkpoint per turn with durability="exit"
+    assert len(list(checkpointer.list(config))) == 2
+    assert graph.get_state({"configurable": {"thread_id": "chat-2"}}).values == {}
+    checkpointer.conn.close()
+
+
+def test_importing_the_agent_does_no_setup():
+    """Test that imports create no model, clients or graph and leave the OpenAI package unloaded."""
+    code = ("import sys; from agents import graph, nodes, tools; "
+            "assert 'langchain_openai' not in sys.modules; "
+            "assert nodes.llm is None and tools.fhir_client is None and graph.healthcare_graph is None")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", code], cwd=root, check=True)
+
+
+def test_tool_binding_follows_the_injected_model(monkeypatch):
+    """Test that replacing the model is enough for the agent's tool-calling model to use it."""
+    for model in (FakeChatModel(), FakeChatModel()):
+        monkeypatch.setattr(nodes, "llm", model)
+        assert nodes.get_llm_with_tools().bound is model
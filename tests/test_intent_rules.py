@@ -0,0 +1,38 @@
+"""Tests for the rule-based intent classifier."""
+import pytest
+
+from agents.intent_rules import IntentStats, classify_by_rules
+
+
+@pytest.mark.parametrize("query, intent, resource_type, operation", [
+    ("Hello!", "greeting", None, None),
+    ("thanks a lot", "greeting", None, None),
+    ("Get all data for patient 592598", "patient_data_query", "All", "read"),
+    ("Show observations for patient 123", "patient_data_query", "Observation", "read"),
+    ("What conditions does patient 456 have?", "patient_data_query", "Condition", "read"),
+    ("Show conditions and meds for patients 1 and 2", "patient_data_query", "All", "read"),
+    ("Hello, get patient 592598", "patient_data_query", "Patient", "read"),
+    ("Get patient 592598", "patient_data_query", "Patient", "read"),
+    ("Search for patients named Smith", "search_query", "Patient", "search"),
+    ("Create a new patient with name John Doe", "patient_data_query", "Patient", "create"),
+])
+def test_confident_rules(query, intent, resource_type, operation):
+    """Test that common queries are classified with high confidence."""
+    result = classify_by_rules(query)
+    assert (result["intent"], result["resource_type"], result["operation"]) == (intent, resource_type, operation)
+    assert result["confidence"] >= 0.8
+
+
+def test_unclear_queries_escalate():
+    """Test that vague or unrelated queries are left to the LLM."""
+    assert classify_by_rules("Tell me about a patient")["confidence"] < 0.8
+    assert classify_by_rules("Update the address")["confidence"] < 0.8
+    assert classify_by_rules("What is FHIR?") is None
+
+
+def test_intent_stats_hit_rates():
+    """Test per-path counts and hit rates."""
+    stats = IntentStats()
+    for path in ("rules", "rules", "rules", "llm"):
+        stats.record(path)
+    assert stats.stats()["hit_rates"] == {"rules": 0.75, "llm": 0.25}
@@ -0,0 +1,93 @@
+"""Tests for the LLM response cache."""
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from agents import nodes, tools
+from benchmarks.fake_llm import FakeChatModel
+from utils.fhir_client import FHIRClient
+from utils.llm_cache import MemoryLLMCache, SQLiteLLMCache, cache_key, dump_message, load_message, model_fingerprint
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_key_normalizes_whitespace_and_includes_tool_results():
+    """Test that formatting noise shares a key while model and tool data do not."""
+    messages = [SystemMessage(content="rules"), HumanMessage(content="Get  patient 5\n")]
+    same = [SystemMessage(content="rules"), HumanMessage(content="Get patient 5")]
+    assert cache_key("gpt-4", messages) == cache_key("gpt-4", same)
+    assert cache_key("gpt-4", messages) != cache_key("gpt-4o", messages)
+    assert cache_key("gpt-4", messages, ["a"]) != cache_key("gpt-4", messages, ["b"])
+
+
+def test_model_fingerprint_includes_bound_tools():
+    """Test that a tool binding is keyed apart from the bare model."""
+    model = FakeChatModel()
+    assert model_fingerprint(model) == "FakeChatModel"
+    assert model_fingerprint(model.bind_tools(tools.healthcare_tools[:2])) == \
+        "FakeChatModel[get_patient,get_patient_observations]"
+
+
+def test_messages_round_trip_with_tool_calls():
+    """Test that stored responses keep their tool calls."""
+    message = AIMessage(content="", tool_calls=[{"name": "get_patient", "args": {"patient_id": "1"}, "id": "c1"}])
+    assert load_message(dump_message(message)).tool_calls == message.tool_calls
+
+
+def test_memory_cache_ttl_and_lru():
+    """Test expiry and least-recently-used eviction."""
+    clock = FakeClock()
+    cache = MemoryLLMCache(max_entries=2, ttl=10, clock=clock)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    clock.now += 11
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_sqlite_cache_persists_and_evicts(tmp_path):
+    """Test that entries survive reopening and honour TTL and size."""
+    clock = FakeClock()
+    path = str(tmp_path / "llm.db")
+    cache = SQLiteLLMCache(path, max_entries=2, ttl=10, clock=clock)
+    cache.set("a", "1")
+    clock.now += 1
+    cache.set("b", "2")
+    cache.close()
+
+    cache = SQLiteLLMCache(path, max_entries=2, ttl=10, clock=clock)
+    clock.now += 1
+    assert cache.get("a") == "1"
+    clock.now += 1
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    clock.now += 20
+    assert cache.get("c") is None
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_agent_node_reuses_cached_responses(monkeypatch, mock_fhir_server):
+    """Test that a repeated read costs no model calls but writes always reach the model."""
+    model = FakeChatModel()
+    monkeypatch.setattr(nodes, "llm", model)
+    monkeypatch.setattr(nodes, "llm_cache", MemoryLLMCache())
+    monkeypatch.setattr(tools, "fhir_client", FHIRClient(base_url=mock_fhir_server.base_url))
+    state = {"messages": [], "user_query": "Get patient 1", "operation": "read", "iteration_count": 0}
+
+    first = nodes.agent_node(state)
+    assert model.calls == 2
+    assert nodes.agent_node(state)["agent_response"] == first["agent_response"]
+    assert model.calls == 2
+
+    write = {**state, "user_query": "Update patient 1", "operation": "update"}
+    nodes.agent_node(write)
+    nodes.agent_node(write)
+    assert model.calls == 6
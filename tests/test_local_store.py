@@ -0,0 +1,72 @@
+"""Tests for the local store and bulk export ingestion."""
+from utils.bulk_export import ingest_resources, run_bulk_export
+from utils.local_store import LocalStore
+
+
+def _observation(obs_id, patient_id, value, code="8480-6"):
+    return {
+        "resourceType": "Observation",
+        "id": obs_id,
+        "subject": {"reference": f"Patient/{patient_id}"},
+        "code": {"coding": [{"system": "http://loinc.org", "code": code, "display": "Systolic blood pressure"}]},
+        "valueQuantity": {"value": value, "unit": "mmHg"},
+        "effectiveDateTime": f"2024-01-{int(obs_id) % 28 + 1:02d}",
+    }
+
+
+class _ExportClient:
+    """Completes the export on the second poll."""
+
+    def __init__(self, files):
+        self.files = files
+        self.polls = 0
+
+    def start_bulk_export(self, resource_types, since):
+        return "http://fhir.test/status/1"
+
+    def poll_bulk_export(self, status_url):
+        self.polls += 1
+        if self.polls < 2:
+            return None, 0
+        return {"output": [{"type": t, "url": url} for url, (t, _) in self.files.items()]}, None
+
+    def iter_ndjson(self, url):
+        yield from self.files[url][1]
+
+
+def test_upsert_and_observation_stats():
+    """Test idempotent upserts and aggregation over the columnar table."""
+    store = LocalStore(":memory:")
+    store.upsert_resources([_observation(str(i), i % 3, 100 + i) for i in range(10)])
+    store.upsert_resources([_observation("0", 0, 100)])
+
+    stats = store.observation_stats("8480-6")
+    assert stats["count"] == 10
+    assert stats["patients"] == 3
+    assert (stats["min"], stats["max"]) == (100, 109)
+    assert len(store.get_resources("Observation", patient_id="1")) == 3
+
+    store.delete_resource("Observation", "0")
+    assert store.observation_stats("8480-6")["count"] == 9
+    assert store.get_resource("Observation", "0") is None
+
+
+def test_ingest_in_batches():
+    """Test that a long stream is written batch by batch."""
+    store = LocalStore(":memory:")
+    written = ingest_resources((_observation(str(i), 1, i) for i in range(2500)), store, batch_size=1000)
+    assert written == 2500
+    assert store.count("Observation") == 2500
+
+
+def test_run_bulk_export():
+    """Test polling the export and loading every output file."""
+    store = LocalStore(":memory:")
+    client = _ExportClient({
+        "http://fhir.test/out/1.ndjson": ("Patient", [{"resourceType": "Patient", "id": "1"}]),
+        "http://fhir.test/out/2.ndjson": ("Observation", [_observation(str(i), 1, i) for i in range(5)]),
+    })
+    counts = run_bulk_export(client, store, poll_interval=0)
+    assert counts == {"Patient": 1, "Observation": 5}
+    assert client.polls == 2
+    assert store.get_resource("Patient", "1")["id"] == "1"
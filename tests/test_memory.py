@@ -0,0 +1,61 @@
+"""Tests for the bounded conversation history."""
+from agents.memory import SUMMARY_PREFIX, bounded_add, compact_messages, estimate_tokens
+
+
+def test_history_stays_within_budget_over_a_long_session():
+    """Test that prompt size stops growing however many turns are added."""
+    messages = []
+    sizes = []
+    for turn in range(200):
+        messages = compact_messages(messages + [
+            {"role": "user", "content": f"Show observations for patient {turn}"},
+            {"role": "assistant", "content": f"Patient {turn} has 3 observations. " + "Details follow. " * 20},
+        ], token_budget=200, summary_tokens=60)
+        sizes.append(sum(estimate_tokens(m["content"]) for m in messages))
+
+    assert max(sizes) <= 200 + 60 + 10
+    assert max(sizes[100:]) <= max(sizes[:100])
+    assert messages[0]["role"] == "system"
+    assert messages[0]["content"].startswith(SUMMARY_PREFIX)
+    assert messages[-1]["content"].startswith("Patient 199")
+
+
+def test_evicted_turns_are_summarized_by_first_sentence():
+    """Test that older turns are kept as one short line each."""
+    messages = compact_messages([
+        {"role": "user", "content": "Get patient 7"},
+        {"role": "assistant", "content": "Patient 7 is Jane Doe. She was born in 1980."},
+        {"role": "user", "content": "And their conditions? " + "x" * 120},
+    ], token_budget=30, summary_tokens=200)
+
+    summary = messages[0]["content"]
+    assert "User: Get patient 7" in summary
+    assert "Assistant: Patient 7 is Jane Doe." in summary
+    assert "born in 1980" not in summary
+    assert messages[1]["content"].startswith("And their conditions?")
+
+
+def test_bounded_add_drops_bookkeeping_and_caps_length(monkeypatch):
+    """Test that the reducer keeps only conversation messages, newest last."""
+    monkeypatch.setattr("agents.memory.CONVERSATION_MAX_MESSAGES", 3)
+    left = [{"role": "user", "content": str(i)} for i in range(3)]
+    right = [{"role": "tool", "content": "raw"}, {"role": "assistant", "content": ""},
+             {"role": "assistant", "content": "answer"}]
+    messages = bounded_add(left, right)
+    assert [m["content"] for m in messages[1:]] == ["1", "2", "answer"]
+    assert messages[0] == {"role": "system", "content": SUMMARY_PREFIX + "User: 0"}
+
+
+def test_turns_past_the_message_cap_survive_in_the_summary(monkeypatch):
+    """Test that a fact from a turn evicted by the message cap is still in the history."""
+    monkeypatch.setattr("agents.memory.CONVERSATION_MAX_MESSAGES", 4)
+    messages = bounded_add([], [{"role": "user", "content": "Show conditions for patient 8a41-c2"},
+                                {"role": "assistant", "content": "Patient 8a41-c2 has asthma."}])
+    for turn in range(3):
+        messages = bounded_add(messages, [{"role": "user", "content": f"And what about {turn}?"},
+                                          {"role": "assistant", "content": "Nothing new."}])
+
+    assert len(messages) == 5
+    assert messages[0]["content"].startswith(SUMMARY_PREFIX)
+    assert "User: Show conditions for patient 8a41-c2" in messages[0]["content"]
+    assert all("8a41-c2" not in m["content"] for m in messages[1:])
@@ -0,0 +1,112 @@
+"""End-to-end tests of both FHIR clients against the local mock server."""
+import asyncio
+
+import pytest
+
+from utils.async_fhir_client import AsyncFHIRClient
+from utils.bulk_export import run_bulk_export
+from utils.fhir_cache import FHIRCache
+from utils.fhir_client import FHIRClient
+from utils.local_store import LocalStore
+from utils.mock_fhir_server import MockFHIRServer
+from utils.resilience import RetryPolicy
+from utils.synthetic_data import generate_dataset
+
+
+def test_generate_dataset_is_reproducible():
+    """Test that the generator is deterministic and links resources to patients."""
+    dataset = generate_dataset(2, observations=3, seed=7)
+    assert dataset == generate_dataset(2, observations=3, seed=7)
+    assert len(dataset) == 2 * (1 + 3 + 3 + 5 + 3)
+    assert all(r["subject"]["reference"] == "Patient/2" for r in dataset if r["id"].startswith("2-"))
+
+
+def test_search_paging_and_filters(mock_fhir_server):
+    """Test searching with filters and following next links across pages."""
+    client = FHIRClient(mock_fhir_server.base_url)
+    entries = list(client.iter_resources("Observation", {"patient": "1"}, page_size=10))
+    assert len(entries) == 25
+    assert len(mock_fhir_server.requests) == 3
+
+    family = client.read_resource("Patient", "2")["name"][0]["family"]
+    bundle = client.search_resources("Patient", {"family": family[:3].lower()})
+    assert "2" in [e["resource"]["id"] for e in bundle["entry"]]
+
+
+def test_elements_projection(mock_fhir_server):
+    """Test that _elements is applied server-side and tagged SUBSETTED."""
+    client = FHIRClient(mock_fhir_server.base_url)
+    patient = client.read_resource("Patient", "1", elements=["gender"])
+    assert set(patient) == {"resourceType", "id", "meta", "gender"}
+    assert patient["meta"]["tag"][0]["code"] == "SUBSETTED"
+
+
+def test_etag_revalidation(mock_fhir_server):
+    """Test that a stale cache entry is revalidated with a 304."""
+    cache = FHIRCache(default_ttl=0, ttls={})
+    client = FHIRClient(mock_fhir_server.base_url, cache=cache)
+    first = client.read_resource("Patient", "1")
+    assert client.read_resource("Patient", "1") == first
+    assert cache.stats()["revalidations"] == 1
+
+
+def test_patient_record_everything_and_batch():
+    """Test one round trip per record with and without $everything."""
+    for supports_everything, expected in ((True, "GET /Patient/1/$everything"), (False, "POST /")):
+        with MockFHIRServer(generate_dataset(2), supports_everything=supports_everything) as server:
+            client = FHIRClient(server.base_url)
+            record, totals = client.get_patient_record("1", limit=10)
+            assert record["Patient"][0]["id"] == "1"
+            assert len(record["Observation"]) == 10
+            assert totals["Observation"] == 20
+            assert server.requests[-1].startswith(expected)
+
+
+def test_capped_everything_stops_paging():
+    """Test that a capped $everything stops at the limit and counts the rest."""
+    # The first 50 entries hold the patient and at least one resource of each type
+    with MockFHIRServer(generate_dataset(1, observations=40)) as server:
+        record, totals = FHIRClient(server.base_url).get_patient_record("1", limit=1)
+        assert [len(resources) for resources in record.values()] == [1, 1, 1, 1, 1]
+        assert totals == {"Patient": 1, "Observation": 40, "Condition": 3, "Encounter": 5, "MedicationRequest": 3}
+        assert [request.split("?")[0] for request in server.requests[1:]] == ["GET /Patient/1/$everything", "POST /"]
+
+
+def test_async_fan_out(mock_fhir_server):
+    """Test concurrent async collection against the mock server."""
+    async def fan_out():
+        async with AsyncFHIRClient(mock_fhir_server.base_url) as client:
+            return await asyncio.gather(*[
+                client.collect_resources(t, {"patient": "1"}, limit=10)
+                for t in ("Observation", "Condition", "Encounter", "MedicationRequest")
+            ])
+
+    results = asyncio.run(fan_out())
+    assert [len(entries) for entries, _ in results] == [10, 3, 5, 3]
+    assert results[0][1] == 25
+
+
+def test_injected_errors_are_retried():
+    """Test that injected 503s are absorbed by the retry policy."""
+    with MockFHIRServer(generate_dataset(1), error_rate=0.3, seed=1) as server:
+        client = FHIRClient(server.base_url, retry_policy=RetryPolicy(max_attempts=10, backoff_base=0))
+        for _ in range(10):
+            assert client.read_resource("Patient", "1")["id"] == "1"
+        assert len(server.requests) > 10
+
+
+def test_injected_errors_surface_when_exhausted():
+    """Test that errors propagate once retries run out."""
+    with MockFHIRServer(generate_dataset(1), error_rate=1.0, error_status=500) as server:
+        client = FHIRClient(server.base_url)
+        with pytest.raises(Exception):
+            client.read_resource("Patient", "1")
+
+
+def test_bulk_export_into_local_store(mock_fhir_server):
+    """Test a full $export round trip into the local store."""
+    store = LocalStore(":memory:")
+    client = FHIRClient(mock_fhir_server.base_url)
+    counts = run_bulk_export(client, store, ["Patient", "Observation"], poll_interval=0)
+    assert counts == {"Patient": 3, "Observation": 75}
+    assert store.observation_stats("8310-5")["count"] > 0
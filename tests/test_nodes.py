@@ -0,0 +1,115 @@
+"""Tests for the agent graph nodes."""
+import asyncio
+import time
+
+from langchain_core.tools import tool
+
+from agents import nodes, tools
+from utils.async_fhir_client import AsyncFHIRClient
+from utils.fhir_client import FHIRClient
+
+
+@tool
+def slow_tool(seconds: float) -> str:
+    """Sleep, then report how long."""
+    time.sleep(seconds)
+    return f"slept {seconds}"
+
+
+@tool
+def broken_tool(reason: str) -> str:
+    """Always fail."""
+    raise ValueError(reason)
+
+
+def test_execute_tool_calls_runs_concurrently_in_order(monkeypatch):
+    """Test that calls overlap, keep their order and report failures inline."""
+    monkeypatch.setattr(nodes, "TOOLS_BY_NAME", {"slow_tool": slow_tool, "broken_tool": broken_tool})
+    calls = [
+        {"name": "slow_tool", "args": {"seconds": 0.3}},
+        {"name": "slow_tool", "args": {"seconds": 0.1}},
+        {"name": "broken_tool", "args": {"reason": "boom"}},
+        {"name": "missing_tool", "args": {}},
+        {"name": "slow_tool", "args": {"seconds": 0.2}},
+    ]
+
+    started = time.monotonic()
+    results = nodes.execute_tool_calls(calls)
+    assert time.monotonic() - started < 0.5
+    assert [r.splitlines()[1] for r in results] == [
+        "Result: slept 0.3", "Result: slept 0.1", "Result: Error: broken_tool failed: boom", "Result: slept 0.2",
+    ]
+
+
+def test_execute_tool_calls_times_out(monkeypatch):
+    """Test that a call exceeding its per-tool timeout is reported, not awaited."""
+    monkeypatch.setattr(nodes, "TOOLS_BY_NAME", {"slow_tool": slow_tool})
+    monkeypatch.setattr(nodes, "tool_timeouts", {"slow_tool": 0.05})
+
+    started = time.monotonic()
+    results = nodes.execute_tool_calls([{"name": "slow_tool", "args": {"seconds": 0.5}}])
+    assert time.monotonic() - started < 0.3
+    assert "did not finish within 0.05 seconds" in results[0]
+
+
+def test_execute_tool_calls_reports_completions_as_they_finish(monkeypatch):
+    """Test that on_result fires in completion order while results keep call order."""
+    monkeypatch.setattr(nodes, "TOOLS_BY_NAME", {"slow_tool": slow_tool})
+    finished = []
+
+    results = nodes.execute_tool_calls(
+        [{"name": "slow_tool", "args": {"seconds": 0.2}}, {"name": "slow_tool", "args": {"seconds": 0.05}}],
+        on_result=lambda event: finished.append(event["args"]["seconds"]),
+    )
+    assert finished == [0.05, 0.2]
+    assert results[0].endswith("slept 0.2")
+
+
+@tool
+async def async_sleep_tool(seconds: float) -> str:
+    """Sleep without blocking the loop, then report how long."""
+    await asyncio.sleep(seconds)
+    return f"slept {seconds}"
+
+
+def test_aexecute_tool_calls_overlaps_on_the_event_loop(monkeypatch):
+    """Test that async calls overlap, keep their order and honour timeouts."""
+    monkeypatch.setattr(nodes, "TOOLS_BY_NAME", {"async_sleep_tool": async_sleep_tool, "broken_tool": broken_tool})
+    monkeypatch.setattr(nodes, "tool_timeouts", {"async_sleep_tool": 0.25})
+    calls = [
+        {"name": "async_sleep_tool", "args": {"seconds": 0.2}},
+        {"name": "broken_tool", "args": {"reason": "boom"}},
+        {"name": "async_sleep_tool", "args": {"seconds": 1.0}},
+        {"name": "async_sleep_tool", "args": {"seconds": 0.1}},
+    ]
+    finished = []
+
+    started = time.monotonic()
+    results = asyncio.run(nodes.aexecute_tool_calls(calls, on_result=lambda event: finished.append(event["tool"])))
+    assert time.monotonic() - started < 0.5
+    assert [r.splitlines()[1] for r in results] == [
+        "Result: slept 0.2", "Result: Error: broken_tool failed: boom",
+        "Result: Error: async_sleep_tool did not finish within 0.25 seconds", "Result: slept 0.1",
+    ]
+    assert len(finished) == 4
+
+
+def test_async_tools_match_sync_tools(monkeypatch, mock_fhir_server):
+    """Test that each tool's coroutine returns the same text as its sync path."""
+    monkeypatch.setattr(tools, "fhir_client", FHIRClient(base_url=mock_fhir_server.base_url))
+    monkeypatch.setattr(tools, "async_fhir_client", AsyncFHIRClient(base_url=mock_fhir_server.base_url))
+    reads = [
+        (tools.get_patient, {"patient_id": "1"}),
+        (tools.search_patients, {"search_params": '{"gender": "female"}'}),
+        (tools.get_patient_observations, {"patient_id": "2"}),
+        (tools.get_patient_conditions, {"patient_id": "2"}),
+        (tools.get_complete_patient_data, {"patient_id": "3"}),
+    ]
+
+    async def run_async():
+        try:
+            return [await t.ainvoke(args) for t, args in reads]
+        finally:
+            await tools.async_fhir_client.close()
+
+    assert asyncio.run(run_async()) == [t.invoke(args) for t, args in reads]
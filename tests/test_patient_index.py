@@ -0,0 +1,147 @@
+"""Tests for the in-memory patient name index."""
+import json
+
+from agents import tools
+from utils.fhir_client import FHIRClient
+from utils.local_store import LocalStore
+from utils.patient_index import PatientIndex, edit_similarity
+
+
+def patient(patient_id, family, given, gender="female", birth_date="1980-01-01", mrn=None):
+    resource = {"resourceType": "Patient", "id": patient_id, "name": [{"family": family, "given": given}],
+                "gender": gender, "birthDate": birth_date}
+    if mrn:
+        resource["identifier"] = [{"system": "urn:mrn", "value": mrn}]
+    return resource
+
+
+def ids(results):
+    return [result["id"] for result in results]
+
+
+def build_index():
+    index = PatientIndex(min_similarity=0.7)
+    index.add([
+        patient("1", "Smith", ["John", "Paul"], "male", "1970-05-02", mrn="MRN1"),
+        patient("2", "Smyth", ["Joan"], birth_date="1985-11-30"),
+        patient("3", "Müller", ["Zoë"], birth_date="1970-07-14"),
+        patient("4", "Jones", ["Alice"]),
+        {"resourceType": "Observation", "id": "9"},
+    ])
+    return index
+
+
+def test_edit_similarity_counts_transpositions_once():
+    """Test that swapped letters cost one edit."""
+    assert edit_similarity("smith", "smtih") == 0.8
+    assert edit_similarity("jon", "john") == 0.75
+    assert edit_similarity("smith", "jones") < 0.5
+
+
+def test_name_search_tolerates_typos_prefixes_and_accents():
+    """Test fuzzy matching, ranking and multi-part names."""
+    index = build_index()
+    assert len(index) == 4
+    assert ids(index.search({"family": "Smith"})) == ["1", "2"]
+    assert ids(index.search({"family": "Smtih"})) == ["1"]
+    assert ids(index.search({"family": "smy"})) == ["2"]
+    assert ids(index.search({"family": "muller"})) == ["3"]
+    assert ids(index.search({"given": "zoe"})) == ["3"]
+    assert ids(index.search({"name": "paul smith"})) == ["1"]
+    assert ids(index.search({"family": "Smith", "given": "Jon"})) == ["1", "2"]
+    assert ids(index.search({"given": "j"})) == ["1", "2"]
+    assert index.search({"family": "Garcia"}) == []
+
+
+def test_exact_filters_and_unsupported_parameters():
+    """Test demographic filters and the searches left to the server."""
+    index = build_index()
+    assert ids(index.search({"family": "Smith", "gender": "female"})) == ["2"]
+    assert ids(index.search({"birthdate": "1970"})) == ["1", "3"]
+    assert ids(index.search({"birthdate": "eq1970-05-02"})) == ["1"]
+    assert ids(index.search({"identifier": "urn:mrn|MRN1"})) == ids(index.search({"identifier": "MRN1"})) == ["1"]
+    assert ids(index.search({"_id": "4", "_count": "5"})) == ["4"]
+    assert index.search({"family:exact": "Smith"}) is None
+    assert index.search({"address-city": "Seattle"}) is None
+    assert index.search({"birthdate": "gt1970"}) is None
+    assert index.search({}) is None
+    assert index.stats()["unsupported"] == 4
+
+
+def test_replacing_and_removing_patients_updates_the_postings():
+    """Test that a changed name stops matching its old spelling."""
+    index = build_index()
+    index.add([patient("4", "Brown", ["Alice"])])
+    assert index.search({"family": "Jones"}) == []
+    assert ids(index.search({"family": "Brown"})) == ["4"]
+    index.remove("1")
+    assert ids(index.search({"identifier": "MRN1"})) == []
+    assert ids(index.search({"family": "Smith"})) == ["2"]
+
+
+def test_incomplete_index_leaves_searches_to_the_server(monkeypatch, mock_fhir_server):
+    """Test that an incomplete index neither answers nor adds similar names, but learns from results."""
+    monkeypatch.setattr(tools, "fhir_client", FHIRClient(base_url=mock_fhir_server.base_url))
+    monkeypatch.setattr(tools, "patient_index", PatientIndex())
+
+    first = tools.search_patients.invoke({"search_params": json.dumps({"family": "Smith"})})
+    requests = len(mock_fhir_server.requests)
+    assert requests > 0 and len(tools.patient_index) > 0
+    assert "Smith" in first
+    typo = tools.search_patients.invoke({"search_params": json.dumps({"family": "Smiht"})})
+    assert typo == "No patients found matching the search criteria"
+    assert len(mock_fhir_server.requests) == requests + 1
+
+    tools.update_patient.invoke({"patient_id": "1", "patient_data": json.dumps(patient("1", "Smith", ["Emma"]))})
+    assert tools.patient_index.search({"_id": "1"}) == []
+
+
+def test_partial_index_still_returns_the_server_matches(monkeypatch, mock_fhir_server):
+    """Test that patients the index has not seen are not hidden by the ones it has, which may be stale."""
+    monkeypatch.setattr(tools, "fhir_client", FHIRClient(base_url=mock_fhir_server.base_url))
+    monkeypatch.setattr(tools, "patient_index", PatientIndex())
+    tools.patient_index.add([patient("99", "Smith", ["Ann"])])
+
+    result = tools.search_patients.invoke({"search_params": json.dumps({"family": "Smith"})})
+    assert mock_fhir_server.requests[-1].startswith("GET /Patient?")
+    assert [row.split("|")[0] for row in result.splitlines() if "|" in row] == ["id", "1"]
+
+
+def test_complete_index_answers_exact_searches_alone(monkeypatch, mock_fhir_server):
+    """Test that a synced index skips the server for exact matches only."""
+    monkeypatch.setattr(tools, "fhir_client", FHIRClient(base_url=mock_fhir_server.base_url))
+    monkeypatch.setattr(tools, "patient_index", PatientIndex())
+    tools._synced("Patient", list(mock_fhir_server.store["Patient"].values()), [])
+    assert tools.patient_index.complete
+
+    requests = len(mock_fhir_server.requests)
+    assert "Smith" in tools.search_patients.invoke({"search_params": json.dumps({"family": "smi"})})
+    assert len(mock_fhir_server.requests) == requests
+    typo = tools.search_patients.invoke({"search_params": json.dumps({"family": "Smiht"})})
+    assert len(mock_fhir_server.requests) == requests + 1
+    found, similar = typo.split("\n\nPOSSIBLE MATCHES (similar name", 1)
+    assert found == "No patients found matching the search criteria"
+    assert "Smith" in similar
+
+    # A patient created since the last delta: server matches come first, similar names apart from them
+    tools.patient_index.remove("1")
+    tools.patient_index.add([patient("98", "Smyth", ["Ann"])])
+    result = tools.search_patients.invoke({"search_params": json.dumps({"family": "Smith"})})
+    assert len(mock_fhir_server.requests) == requests + 2
+    found, similar = result.split("POSSIBLE MATCHES", 1)
+    assert "Emma Smith" in found and "Smyth" not in found
+    assert "Smyth" in similar and "Emma Smith" not in similar
+
+    # An update leaves the index behind the server until the next delta sync
+    tools.update_patient.invoke({"patient_id": "2", "patient_data": json.dumps(patient("2", "Nguyen", ["Emma"]))})
+    assert not tools.patient_index.complete
+
+
+def test_index_starts_with_the_local_store(monkeypatch):
+    """Test that patients loaded by a bulk export are searchable without the server."""
+    store = LocalStore(":memory:")
+    store.upsert_resources([patient("7", "Okafor", ["Chidi"])])
+    monkeypatch.setattr(tools, "local_store", store)
+    monkeypatch.setattr(tools, "patient_index", None)
+    monkeypatch.setattr(tools, "PATIENT_INDEX_ENABLED", True)
+    assert ids(tools.get_patient_index().search({"family": "okafr"})) == ["7"]
@@ -0,0 +1,90 @@
+"""Tests for the speculative patient prefetch."""
+import asyncio
+
+import pytest
+
+from agents import tools
+from agents.prefetch import TOOL_FETCHES, Prefetcher, fetch, predict_tools
+from utils.async_fhir_client import AsyncFHIRClient, run_sync
+from utils.fhir_cache import FHIRCache
+from utils.fhir_client import FHIRClient
+
+
+@pytest.fixture
+def cached_clients(monkeypatch, mock_fhir_server):
+    """Both FHIR clients of the tools pointed at the mock server and sharing one cache."""
+    cache = FHIRCache()
+    monkeypatch.setattr(tools, "fhir_client", FHIRClient(base_url=mock_fhir_server.base_url, cache=cache))
+    monkeypatch.setattr(tools, "async_fhir_client", AsyncFHIRClient(base_url=mock_fhir_server.base_url, cache=cache))
+    yield cache
+    tools.async_fhir_client.close_sync()
+
+
+def tool_call(name, patient_id):
+    return {"name": name, "args": {"patient_id": patient_id}, "id": "c1"}
+
+
+def test_predict_tools_follows_the_query():
+    """Test which tools a query is expected to lead to."""
+    assert predict_tools("Get all data for patient 2") == ("2", ["get_complete_patient_data"])
+    assert predict_tools("Show conditions and meds for patient 3") == (
+        "3", ["get_patient_conditions", "get_patient_medications"])
+    assert predict_tools("Get patient 1") == ("1", ["get_patient"])
+    assert predict_tools("Update patient 1 with a new phone number") == (None, [])
+    assert predict_tools("Hello") == (None, [])
+
+
+@pytest.mark.parametrize("tool_name", sorted(TOOL_FETCHES))
+def test_prefetched_requests_are_the_tools_requests(cached_clients, mock_fhir_server, tool_name):
+    """Test that after a prefetch each tool is answered without reaching the server."""
+    async def prefetch():
+        await asyncio.gather(*[fetch(tools.async_fhir_client, "2", request) for request in TOOL_FETCHES[tool_name]])
+
+    run_sync(prefetch())
+    requests = len(mock_fhir_server.requests)
+    tools.TOOLS_BY_NAME[tool_name].invoke({"patient_id": "2"})
+    assert len(mock_fhir_server.requests) == requests
+
+
+def test_settle_uses_needed_requests_and_cancels_the_rest(cached_clients, mock_fhir_server):
+    """Test the outcome of each request once the agent's tool calls are known."""
+    prefetcher = Prefetcher(enabled=True)
+    mock_fhir_server.latency = 0.2
+    prefetch = prefetcher.take(prefetcher.start("Show conditions and meds for patient 2"))
+    prefetch.settle([tool_call("get_patient_conditions", "2"), tool_call("get_patient_conditions", "3")])
+    assert prefetcher.stats.stats()["counts"] == {"awaited": 1, "cancelled": 1}
+
+    mock_fhir_server.latency = 0
+    requests = len(mock_fhir_server.requests)
+    tools.get_patient_conditions.invoke({"patient_id": "2"})
+    assert len(mock_fhir_server.requests) == requests
+
+    prefetch = prefetcher.take(prefetcher.start("Get patient 1"))
+    prefetch.futures[next(iter(prefetch.futures))].result()
+    prefetch.settle([])
+    assert prefetcher.stats.stats()["counts"]["wasted"] == 1
+    assert prefetcher.take("unknown") is None
+
+
+def test_async_prefetch_runs_on_the_event_loop(cached_clients, mock_fhir_server):
+    """Test that an async prefetch is used by the async tool it anticipated."""
+    prefetcher = Prefetcher(enabled=True)
+
+    async def turn():
+        prefetch = prefetcher.take(await prefetcher.astart("Show observations for patient 2"))
+        await asyncio.sleep(0.2)
+        await prefetch.asettle([tool_call("get_patient_observations", "2")])
+        requests = len(mock_fhir_server.requests)
+        await tools.get_patient_observations.ainvoke({"patient_id": "2"})
+        await tools.async_fhir_client.close()
+        return len(mock_fhir_server.requests) - requests
+
+    assert asyncio.run(turn()) == 0
+    assert prefetcher.stats.stats() == {"total": 1, "counts": {"used": 1}, "used_ratio": 1.0}
+
+
+def test_prefetch_needs_a_cache(monkeypatch, mock_fhir_server):
+    """Test that nothing is fetched when responses would have nowhere to go."""
+    monkeypatch.setattr(tools, "async_fhir_client", AsyncFHIRClient(base_url=mock_fhir_server.base_url))
+    assert Prefetcher(enabled=True).start("Get patient 1") is None
+    assert Prefetcher(enabled=False).start("Get patient 1") is None
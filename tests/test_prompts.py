@@ -0,0 +1,36 @@
+"""Tests for prompt layout and prompt-cache accounting."""
+from langchain_core.messages import AIMessage
+
+from agents.prompts import AGENT_PROMPT, AGENT_SYSTEM_PROMPT, ANSWER_PROMPT, CLASSIFICATION_PROMPT, PromptCacheStats
+
+
+def test_prompts_keep_a_fixed_prefix_ahead_of_variable_content():
+    """Test that the first message is byte-identical whatever the turn carries."""
+    first = AGENT_PROMPT.format_messages(history=[], query="Get patient 1")
+    later = AGENT_PROMPT.format_messages(
+        history=[{"role": "system", "content": "Summary of earlier conversation:\nUser: hi"},
+                 {"role": "user", "content": "Get patient 1"}, {"role": "assistant", "content": "Found."}],
+        query="Show {braces} for patient 2",
+    )
+    assert first[0].content == later[0].content == AGENT_SYSTEM_PROMPT
+    assert later[-1].content == "Show {braces} for patient 2"
+    assert [m.type for m in later] == ["system", "system", "human", "ai", "human"]
+
+    answer = ANSWER_PROMPT.format_messages(tool_results="Tool: get_patient\nResult: x", query="q")
+    assert answer[0].content.startswith(AGENT_SYSTEM_PROMPT)
+    assert "Result: x" not in answer[0].content
+
+    classification = CLASSIFICATION_PROMPT.format_messages(query="a")
+    assert classification[0].content == CLASSIFICATION_PROMPT.format_messages(query="b")[0].content
+
+
+def test_prompt_cache_stats_report_cached_share():
+    """Test that cache-read tokens from usage metadata are totalled per prompt."""
+    stats = PromptCacheStats()
+    response = AIMessage(content="", usage_metadata={
+        "input_tokens": 1000, "output_tokens": 10, "total_tokens": 1010,
+        "input_token_details": {"cache_read": 768},
+    })
+    stats.record("agent", response.usage_metadata)
+    stats.record("agent", {"input_tokens": 1000, "output_tokens": 5, "total_tokens": 1005})
+    assert stats.stats()["agent"] == {"calls": 2, "input_tokens": 2000, "cached_tokens": 768, "cached_ratio": 0.384}
@@ -0,0 +1,230 @@
+"""Tests for FHIR client resilience policies."""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from utils.async_fhir_client import AsyncFHIRClient
+from utils.fhir_client import FHIRClient
+from utils.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyTracker,
+    RetryPolicy,
+    SingleFlight,
+    parse_retry_after,
+)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"resourceType": "Patient", "id": "1"}
+
+    def close(self):
+        pass
+
+
+class _FlakySession:
+    """Returns the scripted statuses in order, then 200."""
+
+    def __init__(self, statuses, delays=()):
+        self.statuses = list(statuses)
+        self.delays = list(delays)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        return self.get(url, **kwargs)
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        if self.delays:
+            time.sleep(self.delays.pop(0))
+        status = self.statuses.pop(0) if self.statuses else 200
+        return _Response(status, {"Retry-After": "0"} if status == 503 else {})
+
+
+def test_parse_retry_after():
+    """Test seconds and HTTP-date forms of Retry-After."""
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after("Thu, 01 Jan 1970 00:00:10 GMT", now=4) == 6.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_retry_policy_only_retries_idempotent_methods():
+    """Test retry eligibility and backoff bounds."""
+    policy = RetryPolicy(max_attempts=3, backoff_base=0.1, backoff_max=1)
+    assert policy.can_retry("GET", 0)
+    assert policy.can_retry("PUT", 1)
+    assert not policy.can_retry("GET", 2)
+    assert not policy.can_retry("POST", 0)
+    assert 0 <= policy.backoff(3) <= 0.8
+    assert policy.backoff(0, retry_after=30) == 1
+
+
+def test_circuit_breaker_opens_and_recovers():
+    """Test open, half-open trial and close transitions."""
+    clock = _Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    clock.now = 10
+    breaker.before_request()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_unexpected_error_releases_the_half_open_trial():
+    """Test that a trial ending in a non-connection error does not wedge the circuit."""
+    class _BrokenSession(_FlakySession):
+        def get(self, url, **kwargs):
+            self.calls += 1
+            raise requests.exceptions.ChunkedEncodingError("connection broken mid-body")
+
+    clock = _Clock()
+    client = FHIRClient(base_url="http://trial.test")
+    client.circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    client.circuit_breaker.record_failure()
+    clock.now = 10
+    client.session = _BrokenSession([])
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client._send("POST", "http://trial.test/Patient", "write")
+    assert client.circuit_breaker.state == "half_open"
+
+    client.session = _FlakySession([])
+    assert client._send("POST", "http://trial.test/Patient", "write").status_code == 200
+    assert client.circuit_breaker.state == "closed"
+
+
+def test_client_retries_transient_errors():
+    """Test that a 503 is retried and POSTs are not."""
+    client = FHIRClient(base_url="http://retry.test", retry_policy=RetryPolicy(max_attempts=3, backoff_base=0))
+    client.session = _FlakySession([503, 503])
+    assert client.read_resource("Patient", "1")["id"] == "1"
+    assert client.session.calls == 3
+
+    client.session = _FlakySession([503])
+    assert client._send("POST", "http://retry.test/Patient", "write").status_code == 503
+    assert client.session.calls == 1
+
+
+def test_hedged_read_returns_faster_duplicate():
+    """Test that a slow GET is hedged once the latency percentile passes."""
+    tracker = LatencyTracker(percentile=50, min_samples=1)
+    tracker.record(0.01)
+    client = FHIRClient(base_url="http://hedge.test", latency_tracker=tracker)
+    client.session = _FlakySession([], delays=[1.0, 0.0])
+
+    started = time.monotonic()
+    assert client.read_resource("Patient", "1")["id"] == "1"
+    assert time.monotonic() - started < 0.5
+    assert tracker.hedged == 1
+
+
+def test_single_flight_shares_result_and_error():
+    """Test that callers arriving during a call share its outcome and later callers run again."""
+    single_flight = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def slow(outcome):
+        runs.append(outcome)
+        release.wait(1)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    for outcome in ("result", ValueError("boom")):
+        release.clear()
+        with ThreadPoolExecutor(4) as pool:
+            futures = [pool.submit(single_flight.do, "key", lambda: slow(outcome)) for _ in range(4)]
+            time.sleep(0.1)
+            release.set()
+        for future in futures:
+            if isinstance(outcome, Exception):
+                assert future.exception() is outcome
+            else:
+                assert future.result() == outcome
+    assert runs == ["result", runs[1]]
+    assert single_flight.stats() == {"calls": 8, "shared": 6, "coalescing_ratio": 0.75}
+
+
+def test_async_single_flight_outlives_a_cancelled_caller():
+    """Test that cancelling one caller leaves the request running for the others."""
+    single_flight = SingleFlight()
+    runs = []
+
+    async def slow():
+        runs.append(1)
+        await asyncio.sleep(0.1)
+        return "result"
+
+    async def main():
+        first = asyncio.ensure_future(single_flight.ado("key", slow))
+        second = asyncio.ensure_future(single_flight.ado("key", slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "result"
+        assert first.cancelled()
+
+        only = asyncio.ensure_future(single_flight.ado("key", slow))
+        await asyncio.sleep(0.01)
+        only.cancel()
+        await asyncio.sleep(0.15)
+        return len(single_flight._async_flights)
+
+    assert asyncio.run(main()) == 0
+    assert runs == [1, 1]
+
+
+def test_concurrent_identical_reads_send_one_request(mock_fhir_server):
+    """Test that both clients coalesce a burst of identical reads but not different ones."""
+    mock_fhir_server.latency = 0.2
+    client = FHIRClient(base_url=mock_fhir_server.base_url)
+    with ThreadPoolExecutor(5) as pool:
+        patients = list(pool.map(lambda _: client.read_resource("Patient", "1"), range(5)))
+    assert [patient["id"] for patient in patients] == ["1"] * 5
+    assert mock_fhir_server.requests == ["GET /Patient/1"]
+
+    async_client = AsyncFHIRClient(base_url=mock_fhir_server.base_url)
+
+    async def burst():
+        searches = [async_client.search_resources("Condition", {"patient": "1", "_count": "5"}) for _ in range(3)]
+        searches.append(async_client.search_resources("Condition", {"_count": "5", "patient": "1"}))
+        searches.append(async_client.search_resources("Condition", {"patient": "2"}))
+        try:
+            return await asyncio.gather(*searches)
+        finally:
+            await async_client.close()
+
+    bundles = asyncio.run(burst())
+    assert bundles[0] is bundles[3] and bundles[4] is not bundles[0]
+    assert len(mock_fhir_server.requests) == 3
+    assert async_client.single_flight.stats()["shared"] == 3
+    assert FHIRClient(base_url=mock_fhir_server.base_url, coalesce=False).single_flight is None
@@ -0,0 +1,149 @@
+"""Tests for tracing spans and Prometheus metrics."""
+import json
+
+import pytest
+
+from agents import nodes, tools
+from agents.graph import create_healthcare_graph, turn_input
+from benchmarks.fake_llm import FakeChatModel
+from utils import telemetry
+from utils.async_fhir_client import AsyncFHIRClient, run_sync
+from utils.fhir_client import FHIRClient, request_route
+
+
+class SpanCollector:
+    """Exporter keeping finished spans in memory."""
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def named(self, category):
+        return {span.name: span for span in self.spans if span.category == category}
+
+
+@pytest.fixture
+def spans(monkeypatch):
+    collector = SpanCollector()
+    monkeypatch.setattr(telemetry, "exporter", collector)
+    return collector
+
+
+def test_spans_nest_and_encode_as_otlp(spans):
+    """Test parent links, error status and the OTLP/JSON export request."""
+    with telemetry.span("graph_node", "agent") as parent:
+        with pytest.raises(ValueError):
+            with telemetry.span("tool", "get_patient", {"tool.result.size": 10}):
+                raise ValueError("boom")
+    child, _ = spans.spans
+    assert (child.trace_id, child.parent_span_id) == (parent.trace_id, parent.span_id)
+    assert telemetry.current_span() is None
+
+    payload = telemetry.otlp_payload(spans.spans, "test-service")
+    [resource_spans] = payload["resourceSpans"]
+    service = {"key": "service.name", "value": {"stringValue": "test-service"}}
+    assert resource_spans["resource"]["attributes"] == [service]
+    encoded_child, encoded_parent = resource_spans["scopeSpans"][0]["spans"]
+    assert len(encoded_child["traceId"]) == 32 and len(encoded_child["spanId"]) == 16
+    assert encoded_child["parentSpanId"] == encoded_parent["spanId"] and "parentSpanId" not in encoded_parent
+    assert encoded_child["status"] == {"code": telemetry.STATUS_ERROR, "message": "ValueError"}
+    assert {"key": "tool.result.size", "value": {"intValue": "10"}} in encoded_child["attributes"]
+    assert int(encoded_child["endTimeUnixNano"]) >= int(encoded_child["startTimeUnixNano"])
+    assert telemetry.metrics.counter("tool_errors_total").value({"name": "get_patient"}) >= 1
+
+
+def test_file_exporter_writes_one_request_per_batch(tmp_path):
+    """Test that flushed batches are appended as OTLP/JSON lines."""
+    path = tmp_path / "traces.jsonl"
+    exporter = telemetry.FileSpanExporter(str(path), interval=60, batch_size=100)
+    for name in ("a", "b"):
+        span = telemetry.Span("tool", name)
+        span.end()
+        exporter.export(span)
+    exporter.flush()
+    exporter.shutdown()
+    [line] = path.read_text().splitlines()
+    names = [span["name"] for span in json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]]
+    assert names == ["a", "b"]
+    with pytest.raises(TypeError):
+        telemetry.BatchSpanExporter()
+
+
+def test_metrics_render_in_prometheus_text_format():
+    """Test cumulative histogram buckets, sums, counts and escaped labels."""
+    registry = telemetry.MetricsRegistry()
+    histogram = registry.histogram("request_seconds", "Latency", buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, {"name": "GET Patient"})
+    registry.counter("errors_total", "Errors").inc({"name": 'say "hi"'}, 2)
+    assert registry.render().splitlines() == [
+        "# HELP errors_total Errors",
+        "# TYPE errors_total counter",
+        'errors_total{name="say \\"hi\\""} 2',
+        "# HELP request_seconds Latency",
+        "# TYPE request_seconds histogram",
+        'request_seconds_bucket{name="GET Patient",le="0.1"} 1',
+        'request_seconds_bucket{name="GET Patient",le="1"} 2',
+        'request_seconds_bucket{name="GET Patient",le="+Inf"} 3',
+        'request_seconds_sum{name="GET Patient"} 5.55',
+        'request_seconds_count{name="GET Patient"} 3',
+    ]
+
+
+def test_request_routes_hide_resource_ids():
+    """Test the route templates used to name FHIR request spans."""
+    base = "http://fhir.test/baseR4"
+    assert request_route(base, f"{base}/Patient/592598") == "Patient/{id}"
+    assert request_route(base, f"{base}/Patient/592598/$everything?_count=50") == "Patient/{id}/$everything"
+    assert request_route(base, f"{base}/Observation?patient=592598") == "Observation"
+    assert request_route(base, f"{base}/Patient/1/_history/2") == "Patient/{id}/_history/{id}"
+    assert request_route(base, f"{base}/metadata") == "metadata"
+    assert request_route(base, base) == "/"
+
+
+def test_fhir_requests_record_status_size_and_latency(spans, mock_fhir_server):
+    """Test the client spans and metrics of both FHIR clients."""
+    client = FHIRClient(base_url=mock_fhir_server.base_url)
+    client.read_resource("Patient", "1")
+    with pytest.raises(Exception):
+        client.read_resource("Patient", "missing")
+    async_client = AsyncFHIRClient(base_url=mock_fhir_server.base_url)
+    try:
+        run_sync(async_client.search_resources("Observation", {"patient": "1"}))
+    finally:
+        async_client.close_sync()
+
+    read, missing, search = spans.spans
+    assert read.name == missing.name == "GET Patient/{id}"
+    assert read.kind == telemetry.SPAN_KIND_CLIENT
+    assert read.attributes["http.response.status_code"] == 200
+    assert read.attributes["http.response.body.size"] > 0
+    assert read.attributes["fhir.resource_type"] == "Patient"
+    assert "missing" not in json.dumps(missing.to_otlp())
+    assert (missing.status, missing.attributes["http.response.status_code"]) == (telemetry.STATUS_ERROR, 404)
+    assert search.name == "GET Observation" and search.attributes["http.response.body.size"] > 0
+    assert telemetry.metrics.histogram("fhir_request_duration_seconds").count({"name": "GET Observation"}) >= 1
+    assert telemetry.metrics.counter("fhir_request_errors_total").value({"name": "GET Patient/{id}"}) >= 1
+
+
+def test_graph_run_is_one_trace(spans, monkeypatch, mock_fhir_server):
+    """Test that node, model, tool and FHIR spans of a turn nest under each other."""
+    monkeypatch.setattr(nodes, "llm", FakeChatModel())
+    monkeypatch.setattr(tools, "fhir_client", FHIRClient(base_url=mock_fhir_server.base_url))
+    with telemetry.span("graph_run", "turn") as turn:
+        create_healthcare_graph().invoke(turn_input("Show conditions for patient 1"))
+
+    node_spans = spans.named("graph_node")
+    assert set(node_spans) == {"prefetch", "intent_classifier", "agent", "response_formatter"}
+    assert {span.parent_span_id for span in node_spans.values()} == {turn.span_id}
+    assert {span.trace_id for span in spans.spans} == {turn.trace_id}
+    agent = node_spans["agent"]
+    tool = spans.named("tool")["get_patient_conditions"]
+    assert tool.parent_span_id == agent.span_id and tool.attributes["tool.result.size"] > 0
+    assert spans.named("fhir_request")["GET Condition"].parent_span_id == tool.span_id
+    answer = [span for span in spans.spans if span.category == "llm_call" and span.name == "answer"][-1]
+    assert answer.parent_span_id == agent.span_id
+    assert answer.attributes["gen_ai.usage.input_tokens"] > 0
+    assert telemetry.metrics.counter("llm_tokens_total").value({"prompt": "answer", "type": "output"}) > 0
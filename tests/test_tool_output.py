@@ -0,0 +1,47 @@
+"""Tests for compact tool output rendering."""
+import json
+
+from utils.fhir_templates import BLOOD_PRESSURE_EXAMPLE, PATIENT_EXAMPLE, TEMPERATURE_EXAMPLE
+from utils.tool_output import enforce_budget, flatten_value, format_tool_output, to_table
+
+
+def test_flatten_value_datatypes():
+    """Test flattening of common FHIR datatypes."""
+    assert flatten_value(TEMPERATURE_EXAMPLE["code"]) == "Body temperature [8310-5]"
+    assert flatten_value(TEMPERATURE_EXAMPLE["valueQuantity"]) == "98.6 F"
+    assert flatten_value({"reference": "Patient/1"}) == "Patient/1"
+    assert flatten_value({"start": "2024-01-01", "end": "2024-01-02"}) == "2024-01-01..2024-01-02"
+    assert flatten_value(PATIENT_EXAMPLE["name"]) == "John Doe"
+    assert flatten_value(BLOOD_PRESSURE_EXAMPLE["component"][0]).startswith("Systolic blood pressure [8480-6]=")
+
+
+def test_to_table_hoists_constant_columns():
+    """Test that shared values are stated once and empty columns dropped."""
+    table = to_table([
+        {"id": "a", "status": "final", "note": None, "value": "1|2"},
+        {"id": "b", "status": "final", "note": None, "value": "3"},
+    ])
+    assert table.splitlines() == ["every row: status=final", "id|value", "a|1/2", "b|3"]
+
+
+def test_compact_output_is_smaller_than_json():
+    """Test that compact output of a patient record beats indented JSON."""
+    record = {
+        "patient": PATIENT_EXAMPLE,
+        "observations": [dict(TEMPERATURE_EXAMPLE, id=str(i)) for i in range(20)],
+        "summary": {"total_observations": 20},
+    }
+    compact = format_tool_output(record, "compact", 0)
+    assert "observations (20 records):" in compact
+    assert "summary: total_observations=20" in compact
+    assert len(compact) * 3 < len(format_tool_output(record, "json", 0))
+    assert json.loads(format_tool_output(record, "json", 0)) == record
+
+
+def test_enforce_budget_cuts_whole_lines():
+    """Test truncation at a line boundary with a note on what was dropped."""
+    text = "\n".join(f"row {i}" for i in range(100))
+    cut = enforce_budget(text, 50)
+    assert cut.splitlines()[-2] == "row 7"
+    assert "92 more lines omitted" in cut
+    assert enforce_budget(text, 0) == text
@@ -1,7 +1,16 @@
 """Chainlit application for the healthcare agent."""
+import asyncio
 import chainlit as cl
-from agents.graph import healthcare_graph
-from agents.state import AgentState
+from chainlit.server import app as chainlit_app
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from typing import Any, Dict, Optional
+from agents import tools
+from agents.graph import async_sqlite_checkpointer, create_healthcare_graph, turn_input
+from agents.nodes import STREAM_TAG
+from config import CHECKPOINT_DURABILITY, FHIR_SYNC_ENABLED, METRICS_ENABLED
+from utils import telemetry
 import logging
 
 # Configure logging
@@ -11,13 +20,36 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Graph with a SQLite checkpointer, created on first use on Chainlit's event loop
+checkpointed_graph: Optional[Any] = None
+checkpointed_graph_lock = asyncio.Lock()
+
+
+async def get_graph() -> Any:
+    """Return the graph that keeps each chat's state in the checkpoint database."""
+    global checkpointed_graph
+    async with checkpointed_graph_lock:
+        if checkpointed_graph is None:
+            checkpointed_graph = create_healthcare_graph(checkpointer=await async_sqlite_checkpointer())
+    return checkpointed_graph
+
+
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    """Serve latency histograms and error counters in the Prometheus text format."""
+    return PlainTextResponse(telemetry.metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+if METRICS_ENABLED:
+    # Ahead of Chainlit's frontend catch-all route, which would otherwise answer /metrics
+    chainlit_app.router.routes.insert(0, Route("/metrics", metrics_endpoint, methods=["GET"]))
+
+if FHIR_SYNC_ENABLED:
+    tools.start_delta_sync()
+
 
 @cl.on_chat_start
 async def on_chat_start():
     """Initialize the chat session."""
-    # Initialize conversation history in user session
-    cl.user_session.set("conversation_history", [])
-
     # Send welcome message
     welcome_message = """AI assistant for retrieving patient data from FHIR R4 servers.
 
@@ -40,52 +72,49 @@ async def on_message(message: cl.Message):
     """Handle incoming messages."""
     user_query = message.content
 
-    # Get conversation history
-    conversation_history = cl.user_session.get("conversation_history", [])
+    # Conversation history lives in the checkpoint of this Chainlit thread
+    config = {"configurable": {"thread_id": cl.context.session.thread_id}}
 
-    # Add user message to history
-    conversation_history.append({
-        "role": "user",
-        "content": user_query
-    })
-
-    # Show processing message
-    processing_msg = cl.Message(content="Processing...")
-    await processing_msg.send()
+    # The answer streams into this message; it is sent with the first token
+    response_msg = cl.Message(content="")
+    streamed = False
 
     try:
-        # Create initial state
-        initial_state: AgentState = {
-            "messages": conversation_history.copy(),
-            "user_query": user_query,
-            "intent": None,
-            "resource_type": None,
-            "operation": None,
-            "fhir_params": None,
-            "fhir_response": None,
-            "agent_response": None,
-            "error": None,
-            "iteration_count": 0
-        }
-
-        # Run the graph
-        result = healthcare_graph.invoke(initial_state)
+        graph = await get_graph()
+
+        # Run the graph, streaming answer tokens and showing steps as they finish
+        result: Dict[str, Any] = {}
+        # One trace per turn, with a span per node, model call, tool and FHIR request
+        with telemetry.span("graph_run", "turn"):
+            async for mode, payload in graph.astream(
+                turn_input(user_query), config=config, stream_mode=["messages", "updates", "custom"],
+                durability=CHECKPOINT_DURABILITY
+            ):
+                if mode == "messages":
+                    chunk, metadata = payload
+                    if STREAM_TAG in metadata.get("tags", []) and isinstance(chunk.content, str) and chunk.content:
+                        await response_msg.stream_token(chunk.content)
+                        streamed = True
+                elif mode == "custom" and payload.get("type") == "tool_result":
+                    async with cl.Step(name=payload["tool"], type="tool") as step:
+                        step.input = payload["args"]
+                        step.output = payload["result"]
+                elif mode == "updates":
+                    for node, update in payload.items():
+                        result.update(update or {})
+                        if node == "intent_classifier":
+                            async with cl.Step(name="Intent", type="run") as step:
+                                step.output = f"{update.get('intent')} ({update.get('resource_type') or 'n/a'})"
 
         # Extract response
-        agent_response = result.get("agent_response", "I apologize, but I couldn't process your request.")
-
-        # Add assistant message to history
-        conversation_history.append({
-            "role": "assistant",
-            "content": agent_response
-        })
-
-        # Update session
-        cl.user_session.set("conversation_history", conversation_history)
+        agent_response = result.get("agent_response") or "I apologize, but I couldn't process your request."
 
-        # Update the processing message with the actual response
-        processing_msg.content = agent_response
-        await processing_msg.update()
+        # Replace the streamed text with the formatted final response
+        response_msg.content = agent_response
+        if streamed:
+            await response_msg.update()
+        else:
+            await response_msg.send()
 
         # Log intent for debugging
         intent = result.get("intent")
@@ -95,8 +124,20 @@ async def on_message(message: cl.Message):
     except Exception as e:
         logger.error(f"Error processing message: {e}", exc_info=True)
         error_message = f"Error: {str(e)}\n\nPlease try again or rephrase your question."
-        processing_msg.content = error_message
-        await processing_msg.update()
+        response_msg.content = error_message
+        if streamed:
+            await response_msg.update()
+        else:
+            await response_msg.send()
+
+
+@cl.on_app_shutdown
+async def on_app_shutdown():
+    """Close the checkpoint database so its worker thread lets the process exit."""
+    global checkpointed_graph
+    if checkpointed_graph is not None:
+        await checkpointed_graph.checkpointer.conn.close()
+        checkpointed_graph = None
 
 
 @cl.on_chat_end
@@ -0,0 +1,539 @@
+"""Asynchronous FHIR API client built on aiohttp.
+
+aiohttp sessions are bound to the event loop that created them, so every
+request runs on one long-lived background loop, whichever loop awaits it.
+Each client therefore has a single pooled session, which ``close`` and
+``close_sync`` always reach.
+"""
+import asyncio
+import concurrent.futures
+import json
+import logging
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Mapping, Optional, Sequence, Tuple, TypeVar
+
+import aiohttp
+
+from config import (
+    FHIR_BASE_URL,
+    FHIR_POOL_SIZE,
+    FHIR_KEEPALIVE_TIMEOUT,
+    FHIR_CONNECT_TIMEOUT,
+    FHIR_READ_TIMEOUT,
+    FHIR_WRITE_TIMEOUT,
+    FHIR_BULK_TIMEOUT,
+    FHIR_COALESCE_ENABLED,
+)
+from utils import telemetry
+from utils.fhir_cache import CacheKey, FHIRCache
+from utils.resilience import LatencyTracker, RetryPolicy, SingleFlight, circuit_breaker_for, parse_retry_after
+from utils.fhir_client import (
+    get_next_link,
+    page_params,
+    project_bundle,
+    project_resource,
+    projection_params,
+    record_response,
+    request_attributes,
+    request_key,
+    request_route,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AsyncFHIRClient:
+    """Asyncio client for interacting with FHIR API over a pooled connection."""
+
+    def __init__(
+        self,
+        base_url: str = FHIR_BASE_URL,
+        pool_size: int = FHIR_POOL_SIZE,
+        keepalive_timeout: float = FHIR_KEEPALIVE_TIMEOUT,
+        connect_timeout: float = FHIR_CONNECT_TIMEOUT,
+        read_timeout: float = FHIR_READ_TIMEOUT,
+        write_timeout: float = FHIR_WRITE_TIMEOUT,
+        bulk_timeout: float = FHIR_BULK_TIMEOUT,
+        cache: Optional[FHIRCache] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        latency_tracker: Optional[LatencyTracker] = None,
+        coalesce: bool = FHIR_COALESCE_ENABLED,
+    ):
+        """Initialize async FHIR client.
+
+        Args:
+            base_url: Base URL for the FHIR server
+            pool_size: Maximum number of open connections per host
+            keepalive_timeout: Seconds an idle pooled connection is kept open
+            connect_timeout: Seconds allowed to establish a connection
+            read_timeout: Seconds allowed between bytes of a read response
+            write_timeout: Seconds allowed between bytes of a write response
+            bulk_timeout: Seconds allowed between bytes of a batch or $everything response
+            cache: Optional response cache for reads and searches, which may be
+                shared with a synchronous ``FHIRClient``
+            retry_policy: Retry and backoff policy for idempotent requests
+            latency_tracker: GET latency window deciding when to send hedged reads
+            coalesce: Share one request between concurrent identical reads and searches
+                on the same event loop
+        """
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.cache = cache
+        self.keepalive_timeout = keepalive_timeout
+        self.timeouts = {
+            'read': aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+            'write': aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=write_timeout),
+            'bulk': aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=bulk_timeout),
+        }
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.latency_tracker = latency_tracker or LatencyTracker()
+        self.single_flight = SingleFlight() if coalesce else None
+        self.host, self.circuit_breaker = circuit_breaker_for(self.base_url)
+        self.headers = {
+            'Accept': 'application/fhir+json',
+            'Content-Type': 'application/fhir+json'
+        }
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the pooled session, creating it on first use; runs on the background loop."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=self.timeouts['read'],
+            )
+        return self._session
+
+    async def close(self) -> None:
+        """Close the pooled session and its connections."""
+        if not _on_background_loop():
+            await asyncio.wrap_future(submit(self.close()))
+            return
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def close_sync(self, timeout: float = 5.0) -> None:
+        """Close the pooled session from synchronous code, e.g. at interpreter exit.
+
+        Args:
+            timeout: Seconds to wait for the background loop to close it
+        """
+        if self._session is None or self._session.closed:
+            return
+        submit(self.close()).result(timeout)
+
+    async def __aenter__(self) -> "AsyncFHIRClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def _fetch(self, method: str, url: str, final: bool, **kwargs) -> Tuple[int, Mapping[str, str], bytes]:
+        """Send one request and read its whole body.
+
+        Args:
+            method: HTTP method
+            url: Request URL
+            final: Whether this is the last attempt, so retryable statuses are raised too
+            **kwargs: Extra arguments passed to ``aiohttp.ClientSession.request``
+
+        Raises:
+            aiohttp.ClientResponseError: For error statuses that will not be retried
+        """
+        if not _on_background_loop():
+            return await asyncio.wrap_future(submit(self._fetch(method, url, final, **kwargs)))
+        session = await self._get_session()
+        async with session.request(method, url, **kwargs) as response:
+            body = await response.read()
+            if response.status >= 400 and (final or response.status not in self.retry_policy.retry_statuses):
+                response.raise_for_status()
+            return response.status, response.headers, body
+
+    async def _hedged_fetch(self, url: str, final: bool, **kwargs) -> Tuple[int, Mapping[str, str], bytes]:
+        """GET a URL, sending a duplicate if the first is slower than usual."""
+        delay = self.latency_tracker.hedge_delay()
+        if delay is None:
+            return await self._fetch('GET', url, final, **kwargs)
+        pending = {asyncio.ensure_future(self._fetch('GET', url, final, **kwargs))}
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if not done:
+            self.latency_tracker.hedged += 1
+            logger.info(f"Hedging GET {url} after {delay:.3f}s")
+            pending.add(asyncio.ensure_future(self._fetch('GET', url, final, **kwargs)))
+        try:
+            while True:
+                if not done:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = done.pop()
+                if winner.exception() is None or not (done or pending):
+                    return winner.result()
+        finally:
+            for loser in pending:
+                loser.cancel()
+
+    async def _send(self, method: str, url: str, operation: str = 'read',
+                    **kwargs) -> Tuple[int, Mapping[str, str], bytes]:
+        """Send a request with timeouts, retries, circuit breaking and hedging.
+
+        Idempotent requests that fail with a connection error, a timeout or a
+        retryable status are retried with jittered backoff, honouring
+        ``Retry-After``.
+
+        Args:
+            method: HTTP method
+            url: Request URL
+            operation: 'read', 'write' or 'bulk', selecting the timeouts
+            **kwargs: Extra arguments passed to ``aiohttp.ClientSession.request``
+
+        Returns:
+            Tuple of (status, headers, body)
+
+        Raises:
+            aiohttp.ClientResponseError: For error statuses once retries are exhausted
+        """
+        kwargs.setdefault('timeout', self.timeouts[operation])
+        policy = self.retry_policy
+        route = request_route(self.base_url, url)
+        with telemetry.span('fhir_request', f"{method} {route}", request_attributes(method, route, self.host),
+                            kind=telemetry.SPAN_KIND_CLIENT) as span:
+            attempt = 0
+            while True:
+                self.circuit_breaker.before_request(self.host)
+                started = time.monotonic()
+                final = not policy.can_retry(method, attempt)
+                try:
+                    if method == 'GET' and operation == 'read':
+                        status, headers, body = await self._hedged_fetch(url, final, **kwargs)
+                    else:
+                        status, headers, body = await self._fetch(method, url, final, **kwargs)
+                except aiohttp.ClientResponseError as e:
+                    if e.status >= 500:
+                        self.circuit_breaker.record_failure()
+                    else:
+                        self.circuit_breaker.record_success()
+                    record_response(span, e.status, None, attempt)
+                    raise
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    self.circuit_breaker.record_failure()
+                    if final:
+                        raise
+                    delay = policy.backoff(attempt)
+                    logger.warning(f"{method} {url} failed ({e!r}), retrying in {delay:.2f}s")
+                except BaseException:
+                    self.circuit_breaker.release_trial()
+                    raise
+                else:
+                    if status >= 500:
+                        self.circuit_breaker.record_failure()
+                    else:
+                        self.circuit_breaker.record_success()
+                    if status not in policy.retry_statuses:
+                        if method == 'GET' and operation == 'read':
+                            self.latency_tracker.record(time.monotonic() - started)
+                        record_response(span, status, len(body), attempt)
+                        return status, headers, body
+                    delay = policy.backoff(attempt, parse_retry_after(headers.get('Retry-After')))
+                    logger.warning(f"{method} {url} returned {status}, retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _request(self, method: str, url: str, operation: str = 'read', **kwargs) -> Any:
+        """Send a request and return the decoded JSON body.
+
+        Args:
+            method: HTTP method
+            url: Absolute request URL
+            operation: 'read', 'write' or 'bulk', selecting the timeouts
+            **kwargs: Extra arguments passed to ``aiohttp.ClientSession.request``
+
+        Returns:
+            Decoded JSON body, or None for empty responses
+        """
+        status, headers, body = await self._send(method, url, operation, **kwargs)
+        return json.loads(body) if body else None
+
+    async def _get(self, url: str, params: Optional[Dict[str, str]], cache_key: CacheKey) -> Dict[str, Any]:
+        """GET a URL, serving and revalidating through the cache when enabled.
+
+        Concurrent identical GETs are coalesced into one request whose result
+        or error every caller shares (see ``SingleFlight``).
+
+        Args:
+            url: Request URL
+            params: Query parameters
+            cache_key: Key of the response in the cache
+
+        Returns:
+            Decoded response body
+        """
+        if self.single_flight is None:
+            return await self._get_uncoalesced(url, params, cache_key)
+        return await self.single_flight.ado(request_key('GET', url, params),
+                                            lambda: self._get_uncoalesced(url, params, cache_key))
+
+    async def _get_uncoalesced(self, url: str, params: Optional[Dict[str, str]],
+                               cache_key: CacheKey) -> Dict[str, Any]:
+        if self.cache is None:
+            return await self._request('GET', url, params=params)
+
+        entry, fresh = self.cache.lookup(cache_key)
+        if fresh:
+            return entry.value
+        status, headers, body = await self._send(
+            'GET', url, params=params, headers=FHIRCache.conditional_headers(entry)
+        )
+        if status == 304 and entry is not None:
+            refreshed = self.cache.refresh(cache_key)
+            return (refreshed or entry).value
+        result = json.loads(body)
+        self.cache.store(cache_key, result, headers)
+        return result
+
+    async def create_resource(self, resource_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new FHIR resource.
+
+        Args:
+            resource_type: Type of FHIR resource (e.g., 'Patient', 'Observation')
+            data: Resource data as dictionary
+
+        Returns:
+            Created resource with ID
+        """
+        try:
+            url = f"{self.base_url}/{resource_type}"
+            result = await self._request('POST', url, 'write', data=json.dumps(data))
+            if self.cache is not None:
+                self.cache.invalidate(resource_type, result.get('id'))
+            logger.info(f"Created {resource_type} resource successfully")
+            return result
+        except aiohttp.ClientError as e:
+            logger.error(f"Error creating {resource_type}: {e}")
+            raise
+
+    async def read_resource(self, resource_type: str, resource_id: str,
+                            elements: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """Read a FHIR resource by ID.
+
+        Args:
+            resource_type: Type of FHIR resource
+            resource_id: ID of the resource
+            elements: Only return these top-level elements (``_elements``)
+
+        Returns:
+            Resource data
+        """
+        try:
+            url = f"{self.base_url}/{resource_type}/{resource_id}"
+            cache_key = FHIRCache.read_key(resource_type, resource_id, elements)
+            result = await self._get(url, projection_params(None, elements), cache_key)
+            logger.info(f"Retrieved {resource_type}/{resource_id} successfully")
+            return project_resource(result, elements)
+        except aiohttp.ClientError as e:
+            logger.error(f"Error reading {resource_type}/{resource_id}: {e}")
+            raise
+
+    async def update_resource(self, resource_type: str, resource_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Update a FHIR resource.
+
+        Args:
+            resource_type: Type of FHIR resource
+            resource_id: ID of the resource
+            data: Updated resource data
+
+        Returns:
+            Updated resource
+        """
+        try:
+            url = f"{self.base_url}/{resource_type}/{resource_id}"
+            data['id'] = resource_id
+            result = await self._request('PUT', url, 'write', data=json.dumps(data))
+            if self.cache is not None:
+                self.cache.invalidate(resource_type, resource_id)
+            logger.info(f"Updated {resource_type}/{resource_id} successfully")
+            return result
+        except aiohttp.ClientError as e:
+            logger.error(f"Error updating {resource_type}/{resource_id}: {e}")
+            raise
+
+    async def delete_resource(self, resource_type: str, resource_id: str) -> bool:
+        """Delete a FHIR resource.
+
+        Args:
+            resource_type: Type of FHIR resource
+            resource_id: ID of the resource
+
+        Returns:
+            True if deleted successfully
+        """
+        try:
+            url = f"{self.base_url}/{resource_type}/{resource_id}"
+            await self._request('DELETE', url, 'write')
+            if self.cache is not None:
+                self.cache.invalidate(resource_type, resource_id)
+            logger.info(f"Deleted {resource_type}/{resource_id} successfully")
+            return True
+        except aiohttp.ClientError as e:
+            logger.error(f"Error deleting {resource_type}/{resource_id}: {e}")
+            raise
+
+    async def search_resources(self, resource_type: str, params: Optional[Dict[str, str]] = None,
+                               elements: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """Search for FHIR resources.
+
+        Args:
+            resource_type: Type of FHIR resource
+            params: Search parameters
+            elements: Only return these top-level elements of each match (``_elements``)
+
+        Returns:
+            Bundle of matching resources
+        """
+        try:
+            url = f"{self.base_url}/{resource_type}"
+            params = projection_params(params, elements)
+            result = await self._get(url, params, FHIRCache.search_key(resource_type, params))
+            logger.info(f"Searched {resource_type} with params {params}")
+            return project_bundle(result, elements)
+        except aiohttp.ClientError as e:
+            logger.error(f"Error searching {resource_type}: {e}")
+            raise
+
+    async def iter_pages(self, resource_type: str, params: Optional[Dict[str, str]] = None,
+                         page_size: Optional[int] = None, limit: Optional[int] = None,
+                         elements: Optional[Sequence[str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Lazily iterate over the Bundle pages of a search.
+
+        Args:
+            resource_type: Type of FHIR resource
+            params: Search parameters
+            page_size: Entries per page (``_count``)
+            limit: Maximum number of entries the caller will consume
+            elements: Only return these top-level elements of each match
+
+        Yields:
+            Search result Bundles, following ``link[relation=next]``
+        """
+        bundle = await self.search_resources(resource_type, page_params(params, page_size, limit), elements)
+        while True:
+            yield bundle
+            next_url = get_next_link(bundle)
+            if not next_url:
+                return
+            try:
+                bundle = project_bundle(await self._request('GET', next_url), elements)
+                logger.info(f"Fetched next {resource_type} page")
+            except aiohttp.ClientError as e:
+                logger.error(f"Error fetching next {resource_type} page: {e}")
+                raise
+
+    async def iter_resources(self, resource_type: str, params: Optional[Dict[str, str]] = None,
+                             page_size: Optional[int] = None, limit: Optional[int] = None,
+                             elements: Optional[Sequence[str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Lazily iterate over search result entries across all pages.
+
+        Args:
+            resource_type: Type of FHIR resource
+            params: Search parameters
+            page_size: Entries per page (``_count``)
+            limit: Maximum number of entries to yield
+            elements: Only return these top-level elements of each match
+
+        Yields:
+            Bundle entries one at a time
+        """
+        if limit is not None and limit <= 0:
+            return
+        yielded = 0
+        async for bundle in self.iter_pages(resource_type, params, page_size, limit, elements):
+            for entry in bundle.get('entry', []):
+                yield entry
+                yielded += 1
+                if limit is not None and yielded >= limit:
+                    return
+
+    async def collect_resources(self, resource_type: str, params: Optional[Dict[str, str]] = None,
+                                page_size: Optional[int] = None, limit: Optional[int] = None,
+                                elements: Optional[Sequence[str]] = None
+                                ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Collect up to ``limit`` entries along with the server-reported total.
+
+        Args:
+            resource_type: Type of FHIR resource
+            params: Search parameters
+            page_size: Entries per page (``_count``)
+            limit: Maximum number of entries to collect
+            elements: Only return these top-level elements of each match
+
+        Returns:
+            Tuple of (entries, Bundle ``total`` or None if the server omits it)
+        """
+        entries: List[Dict[str, Any]] = []
+        total: Optional[int] = None
+        if limit is not None and limit <= 0:
+            return entries, total
+        async for bundle in self.iter_pages(resource_type, params, page_size, limit, elements):
+            if total is None:
+                total = bundle.get('total')
+            for entry in bundle.get('entry', []):
+                entries.append(entry)
+                if limit is not None and len(entries) >= limit:
+                    return entries, total
+        return entries, total
+
+
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared event loop thread used by synchronous callers."""
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="fhir-async-loop", daemon=True)
+            thread.start()
+            _background_loop = loop
+    return _background_loop
+
+
+def _on_background_loop() -> bool:
+    """Whether the running event loop is the shared background loop."""
+    return asyncio.get_running_loop() is _get_background_loop()
+
+
+def submit(coro: Awaitable[T]) -> "concurrent.futures.Future[T]":
+    """Start a coroutine on the background loop without waiting for it.
+
+    Args:
+        coro: Coroutine to execute
+
+    Returns:
+        Future of the coroutine's result; cancelling it cancels the coroutine
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_background_loop())
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """Run a coroutine from synchronous code and return its result.
+
+    The coroutine runs on a long-lived background loop so that pooled
+    connections of an ``AsyncFHIRClient`` survive between calls. This also
+    works when the caller is itself running inside an event loop thread.
+
+    Args:
+        coro: Coroutine to execute
+
+    Returns:
+        The coroutine's result
+    """
+    return submit(coro).result()
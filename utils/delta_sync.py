@@ -0,0 +1,334 @@
+"""Incremental sync of the local store from a FHIR server.
+
+The store keeps a high-water mark per resource type: the server time of the
+newest change applied. A delta only pulls what changed after it, from the
+type's ``_history`` (which also reports deletes) or with a
+``_lastUpdated=gt...`` search, and applies it idempotently: a change is only
+written if it is newer than the stored version, so repeated or overlapping
+deltas leave the store as it was. A type without a mark is pulled with a
+search sorted by ``_lastUpdated``, one page at a time, moving the mark after
+each page, so memory stays at one page and an interrupted pull resumes where
+it stopped. ``DeltaSyncWorker`` runs deltas on a schedule in a background
+thread.
+"""
+import argparse
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from config import (
+    FHIR_SYNC_INTERVAL, FHIR_SYNC_MODE, FHIR_SYNC_OVERLAP, FHIR_SYNC_PAGE_SIZE, FHIR_SYNC_TYPES,
+)
+from utils import telemetry
+from utils.fhir_client import FHIRClient
+from utils.local_store import LocalStore
+
+logger = logging.getLogger(__name__)
+
+SYNC_MODES = ('history', 'search')
+
+# Newest change to one resource: (lastUpdated, resource, or None once deleted)
+Change = Tuple[str, Optional[Dict[str, Any]]]
+# Called after each applied page of changes with (resource type, written resources, deleted IDs)
+ChangeListener = Callable[[str, List[Dict[str, Any]], List[str]], None]
+
+
+def parse_instant(value: str) -> datetime:
+    """Parse a FHIR instant (or date) into an aware UTC datetime."""
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def format_instant(value: datetime) -> str:
+    """Format a datetime as a FHIR instant in UTC."""
+    return value.astimezone(timezone.utc).isoformat(timespec='microseconds').replace('+00:00', 'Z')
+
+
+def advance_high_water(store: LocalStore, resource_type: str, instant: str) -> bool:
+    """Move a resource type's high-water mark forward; an older instant is ignored.
+
+    Args:
+        store: Store keeping the mark
+        resource_type: Type of FHIR resource
+        instant: Server time up to which the store holds every change
+
+    Returns:
+        True if the mark moved
+    """
+    current = store.get_high_water(resource_type)
+    if current is not None and parse_instant(current) >= parse_instant(instant):
+        return False
+    store.set_high_water(resource_type, instant)
+    return True
+
+
+def history_changes(entries: Iterable[Dict[str, Any]]) -> Dict[str, Change]:
+    """Reduce ``_history`` entries to the newest change of each resource.
+
+    Args:
+        entries: History Bundle entries, in any order
+
+    Returns:
+        Newest change by resource ID
+    """
+    changes: Dict[str, Change] = {}
+    for entry in entries:
+        resource = entry.get('resource')
+        request = entry.get('request') or {}
+        response = entry.get('response') or {}
+        if request.get('method') == 'DELETE' or resource is None:
+            # request.url is "Type/id"
+            parts = request.get('url', '').split('?')[0].split('/')
+            resource_id = parts[1] if len(parts) > 1 else None
+            instant = response.get('lastModified')
+            resource = None
+        else:
+            resource_id = resource.get('id')
+            instant = (resource.get('meta') or {}).get('lastUpdated') or response.get('lastModified')
+        if not resource_id or not instant:
+            continue
+        # Servers list history newest first, so on a tie the change seen first wins
+        previous = changes.get(resource_id)
+        if previous is None or parse_instant(instant) > parse_instant(previous[0]):
+            changes[resource_id] = (instant, resource)
+    return changes
+
+
+def apply_changes(store: LocalStore, resource_type: str,
+                  changes: Dict[str, Change]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Write the changes that are newer than the stored versions.
+
+    Applying the same changes twice writes nothing the second time.
+
+    Args:
+        store: Destination store
+        resource_type: Type of the changed resources
+        changes: Newest change by resource ID
+
+    Returns:
+        Tuple of (resources written, IDs deleted)
+    """
+    stored = store.last_updated(resource_type, changes)
+    written: List[Dict[str, Any]] = []
+    deleted: List[str] = []
+    for resource_id, (instant, resource) in changes.items():
+        current = stored.get(resource_id)
+        if resource is None:
+            if resource_id in stored and (current is None or parse_instant(current) <= parse_instant(instant)):
+                deleted.append(resource_id)
+        elif current is None or parse_instant(current) < parse_instant(instant):
+            written.append(resource)
+    if written:
+        store.upsert_resources(written)
+    for resource_id in deleted:
+        store.delete_resource(resource_type, resource_id)
+    return written, deleted
+
+
+class DeltaSync:
+    """Pulls the changes since each resource type's high-water mark into a local store.
+
+    The client should not cache responses, or a cached delta would hide new
+    changes. The mark only moves after a delta has been applied, so a sync
+    that fails part way is simply repeated by the next one.
+    """
+
+    def __init__(self, client: FHIRClient, store: LocalStore, resource_types: Optional[Sequence[str]] = None,
+                 mode: str = FHIR_SYNC_MODE, overlap: float = FHIR_SYNC_OVERLAP,
+                 page_size: int = FHIR_SYNC_PAGE_SIZE, listeners: Sequence[ChangeListener] = ()):
+        """Initialize the sync.
+
+        Args:
+            client: FHIR client without a response cache
+            store: Local replica to keep current
+            resource_types: Resource types to sync, ``FHIR_SYNC_TYPES`` if None
+            mode: "history" to read ``{type}/_history``, which includes deletes,
+                or "search" for servers without it (deletes are not seen)
+            overlap: Seconds each delta reaches back before the high-water mark,
+                for changes the server committed out of order
+            page_size: Entries per page (``_count``)
+            listeners: Called with the written resources and deleted IDs of each
+                applied page of changes
+        """
+        if mode not in SYNC_MODES:
+            raise ValueError(f"Unknown sync mode {mode!r}, expected one of {SYNC_MODES}")
+        self.client = client
+        self.store = store
+        self.resource_types = list(resource_types or FHIR_SYNC_TYPES.split(','))
+        self.mode = mode
+        self.overlap = overlap
+        self.page_size = page_size
+        self.listeners = list(listeners)
+        # Types whose first, full pull is under way; the store does not hold all of them yet
+        self.full_pulls: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def since(self, resource_type: str) -> Optional[str]:
+        """Return the instant the next delta of a type starts at, or None for a full pull."""
+        high_water = self.store.get_high_water(resource_type)
+        if high_water is None:
+            return None
+        return format_instant(parse_instant(high_water) - timedelta(seconds=self.overlap))
+
+    def iter_changes(self, resource_type: str, since: Optional[str]) -> Iterator[Dict[str, Change]]:
+        """Request the changes to a resource type after an instant, one page at a time.
+
+        Searches are sorted oldest first, so once a page is applied the mark
+        can move to its newest change. ``_history`` lists newest first, so a
+        history delta is reduced as a whole; it is only used once the type
+        has a mark, which keeps it small. A full pull, and the resumption of
+        one that failed, always searches.
+
+        Args:
+            resource_type: Type of FHIR resource
+            since: Start of the delta, None for everything
+
+        Yields:
+            Newest change by resource ID, per page
+        """
+        if self.mode == 'history' and since is not None and resource_type not in self.full_pulls:
+            yield history_changes(self.client.iter_history(resource_type, since, self.page_size))
+            return
+        params = {'_sort': '_lastUpdated'}
+        if since:
+            params['_lastUpdated'] = f"gt{since}"
+        for page in self.client.iter_pages(resource_type, params, self.page_size):
+            changes: Dict[str, Change] = {}
+            for entry in page.get('entry', []):
+                resource = entry.get('resource') or {}
+                instant = (resource.get('meta') or {}).get('lastUpdated')
+                if resource.get('id') and instant:
+                    changes[resource['id']] = (instant, resource)
+            yield changes
+
+    def sync(self, resource_type: str) -> Dict[str, int]:
+        """Pull and apply one delta of a resource type.
+
+        Each page is applied and the mark moved before the next is requested;
+        the overlap covers changes sharing the newest instant of a page.
+
+        Args:
+            resource_type: Type of FHIR resource
+
+        Returns:
+            Number of changes received, resources written and resources deleted
+        """
+        with telemetry.span('fhir_sync', resource_type, {'fhir.sync.mode': self.mode}) as span:
+            since = self.since(resource_type)
+            if since is None:
+                logger.info(f"No high-water mark for {resource_type}, pulling every resource")
+                self.full_pulls.add(resource_type)
+            counts = {'received': 0, 'written': 0, 'deleted': 0}
+            changes_total = telemetry.metrics.counter('fhir_sync_changes_total', 'Changes applied by delta syncs')
+            try:
+                for changes in self.iter_changes(resource_type, since):
+                    written, deleted = apply_changes(self.store, resource_type, changes)
+                    if changes:
+                        newest = max((instant for instant, _ in changes.values()), key=parse_instant)
+                        advance_high_water(self.store, resource_type, newest)
+                    for listener in self.listeners:
+                        listener(resource_type, written, deleted)
+                    counts['received'] += len(changes)
+                    counts['written'] += len(written)
+                    counts['deleted'] += len(deleted)
+                    changes_total.inc({'resource_type': resource_type, 'change': 'written'}, len(written))
+                    changes_total.inc({'resource_type': resource_type, 'change': 'deleted'}, len(deleted))
+            finally:
+                span.set_attributes({f"fhir.sync.{key}": value for key, value in counts.items()})
+            self.full_pulls.discard(resource_type)
+        logger.info(f"Synced {resource_type} since {since}: {counts['written']} written, {counts['deleted']} deleted")
+        return counts
+
+    def sync_all(self) -> Dict[str, Dict[str, int]]:
+        """Run one delta of every resource type.
+
+        A type that fails is logged and retried from the same mark next time.
+
+        Returns:
+            Counts by resource type, for the types that synced
+        """
+        results = {}
+        with self._lock:
+            for resource_type in self.resource_types:
+                try:
+                    results[resource_type] = self.sync(resource_type)
+                except Exception as e:
+                    logger.warning(f"Delta sync of {resource_type} failed: {e}")
+        return results
+
+
+class DeltaSyncWorker:
+    """Runs ``DeltaSync.sync_all`` on a daemon thread every ``interval`` seconds.
+
+    The first run starts immediately; ``stop`` is registered with ``atexit``.
+    """
+
+    def __init__(self, sync: DeltaSync, interval: float = FHIR_SYNC_INTERVAL):
+        """Initialize the worker.
+
+        Args:
+            sync: Sync to run
+            interval: Seconds from the end of one run to the start of the next
+        """
+        self.sync = sync
+        self.interval = interval
+        self.runs = 0
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "DeltaSyncWorker":
+        """Start the background thread, once."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='fhir-delta-sync', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+        return self
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self.sync.sync_all()
+            self.runs += 1
+            self._stopped.wait(self.interval)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the thread, letting a running sync finish.
+
+        Args:
+            timeout: Seconds to wait for the thread, forever if None
+        """
+        self._stopped.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+
+def main() -> None:
+    """Command line entry point: ``python -m utils.delta_sync``."""
+    parser = argparse.ArgumentParser(description="Pull FHIR changes since the last sync into the local store")
+    parser.add_argument('--types', help="Comma separated resource types, e.g. Patient,Observation")
+    parser.add_argument('--mode', choices=SYNC_MODES, default=FHIR_SYNC_MODE)
+    parser.add_argument('--watch', type=float, metavar='SECONDS', help="Keep syncing at this interval")
+    parser.add_argument('--base-url', help="FHIR server base URL")
+    parser.add_argument('--store', help="SQLite database path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    client = FHIRClient(args.base_url, coalesce=False) if args.base_url else FHIRClient(coalesce=False)
+    store = LocalStore(args.store) if args.store else LocalStore()
+    resource_types = args.types.split(',') if args.types else None
+    sync = DeltaSync(client, store, resource_types, args.mode)
+    while True:
+        for resource_type, counts in sorted(sync.sync_all().items()):
+            print(f"{resource_type}: {counts['written']} written, {counts['deleted']} deleted")
+        if not args.watch:
+            return
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
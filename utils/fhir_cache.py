@@ -0,0 +1,213 @@
+"""In-process response cache for FHIR reads and searches."""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence, Tuple
+
+from config import FHIR_CACHE_MAX_ENTRIES, FHIR_CACHE_TTL, FHIR_CACHE_TTLS
+
+CacheKey = Tuple[Hashable, ...]
+
+
+def parse_ttls(spec: str) -> Dict[str, float]:
+    """Parse per-resource-type TTLs from a ``Type=seconds,...`` string.
+
+    Args:
+        spec: Comma separated ``ResourceType=seconds`` pairs
+
+    Returns:
+        Mapping of resource type to TTL in seconds
+    """
+    ttls = {}
+    for item in spec.split(','):
+        if '=' in item:
+            resource_type, seconds = item.split('=', 1)
+            ttls[resource_type.strip()] = float(seconds)
+    return ttls
+
+
+class CacheEntry:
+    """A cached response body with its validators."""
+
+    __slots__ = ('value', 'etag', 'last_modified', 'expires_at')
+
+    def __init__(self, value: Any, etag: Optional[str], last_modified: Optional[str], expires_at: float):
+        self.value = value
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+
+class FHIRCache:
+    """Size-bounded LRU cache with per-resource-type TTLs and revalidation support.
+
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = FHIR_CACHE_MAX_ENTRIES,
+        default_ttl: float = FHIR_CACHE_TTL,
+        ttls: Optional[Dict[str, float]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached responses before LRU eviction
+            default_ttl: Seconds a response stays fresh when no per-type TTL is set
+            ttls: Per-resource-type freshness lifetimes in seconds
+            clock: Monotonic time source
+        """
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttls = parse_ttls(FHIR_CACHE_TTLS) if ttls is None else dict(ttls)
+        self._clock = clock
+        self._entries: "OrderedDict[CacheKey, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def read_key(resource_type: str, resource_id: str, elements: Optional[Sequence[str]] = None) -> CacheKey:
+        """Build the cache key for a read of one resource, optionally projected."""
+        key = ('read', resource_type, str(resource_id))
+        return key + (tuple(elements),) if elements else key
+
+    @staticmethod
+    def search_key(resource_type: str, params: Optional[Dict[str, Any]] = None) -> CacheKey:
+        """Build the cache key for a search, independent of parameter order."""
+        normalized = tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+        return ('search', resource_type, normalized)
+
+    def ttl_for(self, resource_type: str) -> float:
+        """Return the freshness lifetime for a resource type."""
+        return self.ttls.get(resource_type, self.default_ttl)
+
+    def lookup(self, key: CacheKey) -> Tuple[Optional[CacheEntry], bool]:
+        """Look up a cached response.
+
+        A fresh entry counts as a hit. A stale entry is still returned so the
+        caller can revalidate it, and counts as a miss unless revalidation
+        succeeds (see ``refresh``).
+
+        Args:
+            key: Cache key from ``read_key`` or ``search_key``
+
+        Returns:
+            Tuple of (entry or None, whether the entry is fresh)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            self._entries.move_to_end(key)
+            if entry.expires_at > self._clock():
+                self.hits += 1
+                return entry, True
+            if entry.etag is None and entry.last_modified is None:
+                del self._entries[key]
+                self.misses += 1
+                return None, False
+            return entry, False
+
+    def store(self, key: CacheKey, value: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        """Cache a response body together with its ETag and Last-Modified validators.
+
+        Args:
+            key: Cache key
+            value: Decoded response body
+            headers: Response headers
+        """
+        headers = headers or {}
+        entry = CacheEntry(
+            value,
+            headers.get('ETag'),
+            headers.get('Last-Modified'),
+            self._clock() + self.ttl_for(key[1]),
+        )
+        with self._lock:
+            if key in self._entries:
+                # A stale entry was replaced instead of revalidated
+                self.misses += 1
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def refresh(self, key: CacheKey) -> Optional[CacheEntry]:
+        """Mark a stale entry fresh again after a ``304 Not Modified`` response.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The refreshed entry, or None if it was evicted meanwhile
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.expires_at = self._clock() + self.ttl_for(key[1])
+                self.revalidations += 1
+                self.hits += 1
+            return entry
+
+    @staticmethod
+    def conditional_headers(entry: Optional[CacheEntry]) -> Dict[str, str]:
+        """Return ``If-None-Match``/``If-Modified-Since`` headers for a stale entry."""
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def invalidate(self, resource_type: str, resource_id: Optional[str] = None) -> None:
+        """Drop cached responses affected by a write.
+
+        The read of the written resource and every search over its resource
+        type are removed, since any of those searches may include it.
+
+        Args:
+            resource_type: Type of the written resource
+            resource_id: ID of the written resource, if known
+        """
+        with self._lock:
+            stale = [
+                key for key in self._entries
+                if key[1] == resource_type and (
+                    key[0] != 'read' or resource_id is None or key[2] == str(resource_id)
+                )
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self) -> None:
+        """Drop every cached response."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss statistics.
+
+        Returns:
+            Counters, current size and hit ratio
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'size': len(self._entries),
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
@@ -1,28 +1,409 @@
 """FHIR API client for healthcare data operations."""
 import requests
-from typing import Dict, List, Optional, Any
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Any, Sequence, Tuple
+import json
 import logging
-from config import FHIR_BASE_URL
+import time
+from urllib.parse import urlsplit
+from config import (
+    FHIR_BASE_URL,
+    FHIR_PAGE_SIZE,
+    FHIR_CONNECT_TIMEOUT,
+    FHIR_READ_TIMEOUT,
+    FHIR_WRITE_TIMEOUT,
+    FHIR_BULK_TIMEOUT,
+    FHIR_COALESCE_ENABLED,
+)
+from utils import telemetry
+from utils.fhir_cache import CacheKey, FHIRCache
+from utils.resilience import LatencyTracker, RetryPolicy, SingleFlight, circuit_breaker_for, parse_retry_after
 
 logger = logging.getLogger(__name__)
 
+# Resource types that make up a patient's record
+PATIENT_RECORD_TYPES = ('Observation', 'Condition', 'Encounter', 'MedicationRequest')
+
+# Statuses meaning the server does not implement an operation
+UNSUPPORTED_OPERATION_STATUSES = (400, 405, 501)
+
+
+def get_next_link(bundle: Dict[str, Any]) -> Optional[str]:
+    """Return the URL of the next page of a search Bundle, if any.
+
+    Args:
+        bundle: Search result Bundle
+
+    Returns:
+        The ``link[relation=next]`` URL or None on the last page
+    """
+    for link in bundle.get('link', []):
+        if link.get('relation') == 'next':
+            return link.get('url')
+    return None
+
+
+def request_route(base_url: str, url: str) -> str:
+    """Return a request's path below the server base with resource IDs replaced.
+
+    Names spans and metrics without patient identifiers or search values,
+    e.g. "Patient/{id}/$everything" or "Observation".
+
+    Args:
+        base_url: Server base URL
+        url: Request URL
+
+    Returns:
+        Route template, or "/" for the server base (batches and page links)
+    """
+    path = urlsplit(url).path
+    base_path = urlsplit(base_url).path.rstrip('/')
+    if path.startswith(base_path):
+        path = path[len(base_path):]
+    route, expect_id = [], False
+    for segment in filter(None, path.split('/')):
+        if expect_id and not segment.startswith(('$', '_')):
+            route.append('{id}')
+            expect_id = False
+        else:
+            route.append(segment)
+            expect_id = not segment.startswith('$') and segment != 'metadata'
+    return '/'.join(route) or '/'
+
+
+def request_key(method: str, url: str, params: Optional[Dict[str, Any]]) -> Tuple[Any, ...]:
+    """Identify a request by method, URL and parameters in a fixed order, for coalescing."""
+    return method, url, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+
+
+def request_attributes(method: str, route: str, host: str) -> Dict[str, Any]:
+    """Initial span attributes of a FHIR request."""
+    resource_type = route.split('/')[0]
+    return {
+        'http.request.method': method,
+        'server.address': host,
+        'url.template': route,
+        'fhir.resource_type': resource_type if resource_type[:1].isupper() else None,
+    }
+
+
+def record_response(span: telemetry.Span, status: int, size: Any, retries: int) -> None:
+    """Add a FHIR response's status, body size and retry count to its span and metrics.
+
+    Args:
+        span: The request's span
+        status: Final HTTP status
+        size: Body size in bytes, if known
+        retries: Attempts made after the first
+    """
+    size = int(size) if size is not None else None
+    span.set_attributes({'http.response.status_code': status, 'http.response.body.size': size,
+                         'fhir.retries': retries})
+    if status >= 400:
+        span.status = telemetry.STATUS_ERROR
+        span.status_message = f"HTTP {status}"
+    telemetry.metrics.counter('fhir_responses_total', 'FHIR responses by status').inc({'status': status})
+    if size is not None:
+        telemetry.metrics.histogram('fhir_response_bytes', 'FHIR response body size in bytes',
+                                    telemetry.SIZE_BUCKETS).observe(size, {'name': span.name})
+
+
+def page_params(params: Optional[Dict[str, str]], page_size: Optional[int], limit: Optional[int]) -> Dict[str, str]:
+    """Build first-page search parameters with a ``_count`` page size.
+
+    The page size never exceeds ``limit`` so a caller that only wants a few
+    entries does not download a full page.
+
+    Args:
+        params: Search parameters
+        page_size: Requested entries per page
+        limit: Maximum number of entries the caller will consume
+
+    Returns:
+        Copy of params with ``_count`` set
+    """
+    params = dict(params or {})
+    count = page_size or int(params.get('_count', FHIR_PAGE_SIZE))
+    if limit is not None:
+        count = min(count, limit)
+    params['_count'] = str(count)
+    return params
+
+
+# Tag a server (or local trimming) puts on resources reduced by _elements
+SUBSETTED_TAG = {'system': 'http://terminology.hl7.org/CodeSystem/v3-ObservationValue', 'code': 'SUBSETTED'}
+
+
+def projection_params(params: Optional[Dict[str, str]], elements: Optional[Sequence[str]]) -> Optional[Dict[str, str]]:
+    """Add an ``_elements`` parameter so the server only returns the listed fields.
+
+    Args:
+        params: Search or read parameters
+        elements: Top-level element names the caller needs
+
+    Returns:
+        Copy of params with ``_elements`` set, or params unchanged if no projection
+    """
+    if not elements:
+        return params
+    params = dict(params or {})
+    params['_elements'] = ','.join(elements)
+    return params
+
+
+def project_resource(resource: Dict[str, Any], elements: Optional[Sequence[str]]) -> Dict[str, Any]:
+    """Trim a resource to the requested elements when the server did not.
+
+    Resources already carrying the ``SUBSETTED`` tag are returned untouched.
+
+    Args:
+        resource: FHIR resource
+        elements: Top-level element names to keep besides resourceType, id and meta
+
+    Returns:
+        The resource, or a trimmed copy tagged ``SUBSETTED``
+    """
+    if not elements or not isinstance(resource, dict):
+        return resource
+    meta = resource.get('meta') or {}
+    if any(tag.get('code') == 'SUBSETTED' for tag in meta.get('tag', [])):
+        return resource
+    trimmed = {key: resource[key] for key in ('resourceType', 'id', *elements) if key in resource}
+    trimmed['meta'] = {**meta, 'tag': meta.get('tag', []) + [SUBSETTED_TAG]}
+    return trimmed
+
+
+def project_bundle(bundle: Dict[str, Any], elements: Optional[Sequence[str]]) -> Dict[str, Any]:
+    """Trim every entry of a search Bundle to the requested elements.
+
+    Args:
+        bundle: Search result Bundle
+        elements: Top-level element names to keep
+
+    Returns:
+        The Bundle, or a copy whose entry resources are trimmed
+    """
+    if not elements or not bundle.get('entry'):
+        return bundle
+    entries = [{**entry, 'resource': project_resource(entry.get('resource'), elements)} for entry in bundle['entry']]
+    return {**bundle, 'entry': entries}
+
+
+def supports_operation(capability: Dict[str, Any], resource_type: str, operation: str) -> bool:
+    """Check whether a CapabilityStatement declares an operation on a resource type.
+
+    Args:
+        capability: CapabilityStatement from ``/metadata``
+        resource_type: Type of FHIR resource
+        operation: Operation name without the ``$`` prefix
+
+    Returns:
+        True if the server advertises the operation
+    """
+    for rest in capability.get('rest', []):
+        for resource in rest.get('resource', []):
+            if resource.get('type') != resource_type:
+                continue
+            for declared in resource.get('operation', []):
+                if declared.get('name', '').lstrip('$') == operation:
+                    return True
+    return False
+
+
+def split_patient_record(entries: List[Dict[str, Any]], limit: Optional[int] = None,
+                         resource_types: Tuple[str, ...] = PATIENT_RECORD_TYPES
+                         ) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, int]]:
+    """Split mixed Bundle entries into per-resource-type lists.
+
+    Args:
+        entries: Bundle entries of any resource type
+        limit: Maximum resources kept per type
+        resource_types: Resource types to keep besides Patient
+
+    Returns:
+        Tuple of (resources by type, total count by type)
+    """
+    record: Dict[str, List[Dict[str, Any]]] = {t: [] for t in ('Patient',) + tuple(resource_types)}
+    totals = {t: 0 for t in record}
+    for entry in entries:
+        resource = entry.get('resource', {})
+        resource_type = resource.get('resourceType')
+        if resource_type not in record:
+            continue
+        totals[resource_type] += 1
+        if limit is None or len(record[resource_type]) < limit:
+            record[resource_type].append(resource)
+    return record, totals
+
 
 class FHIRClient:
     """Client for interacting with FHIR API."""
 
-    def __init__(self, base_url: str = FHIR_BASE_URL):
+    def __init__(
+        self,
+        base_url: str = FHIR_BASE_URL,
+        cache: Optional[FHIRCache] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        latency_tracker: Optional[LatencyTracker] = None,
+        timeouts: Optional[Dict[str, Tuple[float, float]]] = None,
+        coalesce: bool = FHIR_COALESCE_ENABLED,
+    ):
         """Initialize FHIR client.
 
         Args:
             base_url: Base URL for the FHIR server
+            cache: Optional response cache for reads and searches
+            retry_policy: Retry and backoff policy for idempotent requests
+            latency_tracker: GET latency window deciding when to send hedged reads
+            timeouts: (connect, read) timeouts in seconds for 'read', 'write' and 'bulk'
+                (batch, $everything) operations
+            coalesce: Share one request between concurrent identical reads and searches
         """
         self.base_url = base_url.rstrip('/')
+        self.cache = cache
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.latency_tracker = latency_tracker or LatencyTracker()
+        self.single_flight = SingleFlight() if coalesce else None
+        self.timeouts = timeouts or {
+            'read': (FHIR_CONNECT_TIMEOUT, FHIR_READ_TIMEOUT),
+            'write': (FHIR_CONNECT_TIMEOUT, FHIR_WRITE_TIMEOUT),
+            'bulk': (FHIR_CONNECT_TIMEOUT, FHIR_BULK_TIMEOUT),
+        }
+        self.host, self.circuit_breaker = circuit_breaker_for(self.base_url)
+        self.everything_supported: Optional[bool] = None
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
         self.session = requests.Session()
         self.session.headers.update({
             'Accept': 'application/fhir+json',
             'Content-Type': 'application/fhir+json'
         })
 
+    def _send(self, method: str, url: str, operation: str = 'read', **kwargs) -> requests.Response:
+        """Send a request with timeouts, retries, circuit breaking and hedging.
+
+        Idempotent requests that fail with a connection error, a timeout or a
+        retryable status are retried with jittered backoff, honouring
+        ``Retry-After``. Error statuses are left for the caller to raise.
+
+        Args:
+            method: HTTP method
+            url: Request URL
+            operation: 'read', 'write' or 'bulk', selecting the timeouts
+            **kwargs: Extra arguments passed to ``requests.Session.request``
+
+        Returns:
+            The final response
+        """
+        kwargs.setdefault('timeout', self.timeouts[operation])
+        policy = self.retry_policy
+        route = request_route(self.base_url, url)
+        with telemetry.span('fhir_request', f"{method} {route}", request_attributes(method, route, self.host),
+                            kind=telemetry.SPAN_KIND_CLIENT) as span:
+            attempt = 0
+            while True:
+                self.circuit_breaker.before_request(self.host)
+                started = time.monotonic()
+                try:
+                    if method == 'GET' and operation == 'read':
+                        response = self._hedged_get(url, **kwargs)
+                    else:
+                        response = self.session.request(method, url, **kwargs)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    self.circuit_breaker.record_failure()
+                    if not policy.can_retry(method, attempt):
+                        raise
+                    delay = policy.backoff(attempt)
+                    logger.warning(f"{method} {url} failed ({e}), retrying in {delay:.2f}s")
+                except BaseException:
+                    self.circuit_breaker.release_trial()
+                    raise
+                else:
+                    if response.status_code >= 500:
+                        self.circuit_breaker.record_failure()
+                    else:
+                        self.circuit_breaker.record_success()
+                    if response.status_code not in policy.retry_statuses or not policy.can_retry(method, attempt):
+                        if method == 'GET' and operation == 'read' and response.ok:
+                            self.latency_tracker.record(time.monotonic() - started)
+                        # The body is not read here, so chunked responses have no size
+                        record_response(span, response.status_code, response.headers.get('Content-Length'), attempt)
+                        return response
+                    delay = policy.backoff(attempt, parse_retry_after(response.headers.get('Retry-After')))
+                    logger.warning(f"{method} {url} returned {response.status_code}, retrying in {delay:.2f}s")
+                    response.close()
+                time.sleep(delay)
+                attempt += 1
+
+    def _hedged_get(self, url: str, **kwargs) -> requests.Response:
+        """GET a URL, sending a duplicate if the first is slower than usual.
+
+        Once the tracked latency percentile elapses without a response, a
+        second identical request is sent and whichever finishes first wins.
+
+        Args:
+            url: Request URL
+            **kwargs: Extra arguments passed to ``requests.Session.get``
+
+        Returns:
+            The first successful response
+        """
+        delay = self.latency_tracker.hedge_delay()
+        if delay is None:
+            return self.session.get(url, **kwargs)
+        if self._hedge_executor is None:
+            self._hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="fhir-hedge")
+        pending = {self._hedge_executor.submit(self.session.get, url, **kwargs)}
+        done, pending = wait(pending, timeout=delay)
+        if not done:
+            self.latency_tracker.hedged += 1
+            logger.info(f"Hedging GET {url} after {delay:.3f}s")
+            pending.add(self._hedge_executor.submit(self.session.get, url, **kwargs))
+        while True:
+            if not done:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = done.pop()
+            if winner.exception() is None or not (done or pending):
+                for loser in pending:
+                    loser.add_done_callback(lambda f: f.exception() is None and f.result().close())
+                return winner.result()
+
+    def _get(self, url: str, params: Optional[Dict[str, str]], cache_key: CacheKey) -> Dict[str, Any]:
+        """GET a URL, serving and revalidating through the cache when enabled.
+
+        Concurrent identical GETs are coalesced into one request whose result
+        or error every caller shares (see ``SingleFlight``).
+
+        Args:
+            url: Request URL
+            params: Query parameters
+            cache_key: Key of the response in the cache
+
+        Returns:
+            Decoded response body
+        """
+        if self.single_flight is None:
+            return self._get_uncoalesced(url, params, cache_key)
+        return self.single_flight.do(request_key('GET', url, params),
+                                     lambda: self._get_uncoalesced(url, params, cache_key))
+
+    def _get_uncoalesced(self, url: str, params: Optional[Dict[str, str]], cache_key: CacheKey) -> Dict[str, Any]:
+        if self.cache is None:
+            response = self._send('GET', url, params=params)
+            response.raise_for_status()
+            return response.json()
+
+        entry, fresh = self.cache.lookup(cache_key)
+        if fresh:
+            return entry.value
+        response = self._send('GET', url, params=params, headers=FHIRCache.conditional_headers(entry))
+        if response.status_code == 304 and entry is not None:
+            refreshed = self.cache.refresh(cache_key)
+            return (refreshed or entry).value
+        response.raise_for_status()
+        result = response.json()
+        self.cache.store(cache_key, result, response.headers)
+        return result
+
     def create_resource(self, resource_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new FHIR resource.
 
@@ -35,30 +416,35 @@ class FHIRClient:
         """
         try:
             url = f"{self.base_url}/{resource_type}"
-            response = self.session.post(url, json=data)
+            response = self._send('POST', url, 'write', json=data)
             response.raise_for_status()
             logger.info(f"Created {resource_type} resource successfully")
-            return response.json()
+            result = response.json()
+            if self.cache is not None:
+                self.cache.invalidate(resource_type, result.get('id'))
+            return result
         except requests.exceptions.RequestException as e:
             logger.error(f"Error creating {resource_type}: {e}")
             raise
 
-    def read_resource(self, resource_type: str, resource_id: str) -> Dict[str, Any]:
+    def read_resource(self, resource_type: str, resource_id: str,
+                      elements: Optional[Sequence[str]] = None) -> Dict[str, Any]:
         """Read a FHIR resource by ID.
 
         Args:
             resource_type: Type of FHIR resource
             resource_id: ID of the resource
+            elements: Only return these top-level elements (``_elements``)
 
         Returns:
             Resource data
         """
         try:
             url = f"{self.base_url}/{resource_type}/{resource_id}"
-            response = self.session.get(url)
-            response.raise_for_status()
+            cache_key = FHIRCache.read_key(resource_type, resource_id, elements)
+            result = self._get(url, projection_params(None, elements), cache_key)
             logger.info(f"Retrieved {resource_type}/{resource_id} successfully")
-            return response.json()
+            return project_resource(result, elements)
         except requests.exceptions.RequestException as e:
             logger.error(f"Error reading {resource_type}/{resource_id}: {e}")
             raise
@@ -77,8 +463,10 @@ class FHIRClient:
         try:
             url = f"{self.base_url}/{resource_type}/{resource_id}"
             data['id'] = resource_id
-            response = self.session.put(url, json=data)
+            response = self._send('PUT', url, 'write', json=data)
             response.raise_for_status()
+            if self.cache is not None:
+                self.cache.invalidate(resource_type, resource_id)
             logger.info(f"Updated {resource_type}/{resource_id} successfully")
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -97,34 +485,327 @@ class FHIRClient:
         """
         try:
             url = f"{self.base_url}/{resource_type}/{resource_id}"
-            response = self.session.delete(url)
+            response = self._send('DELETE', url, 'write')
             response.raise_for_status()
+            if self.cache is not None:
+                self.cache.invalidate(resource_type, resource_id)
             logger.info(f"Deleted {resource_type}/{resource_id} successfully")
             return True
         except requests.exceptions.RequestException as e:
             logger.error(f"Error deleting {resource_type}/{resource_id}: {e}")
             raise
 
-    def search_resources(self, resource_type: str, params: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    def search_resources(self, resource_type: str, params: Optional[Dict[str, str]] = None,
+                         elements: Optional[Sequence[str]] = None) -> Dict[str, Any]:
         """Search for FHIR resources.
 
         Args:
             resource_type: Type of FHIR resource
             params: Search parameters
+            elements: Only return these top-level elements of each match (``_elements``)
 
         Returns:
             Bundle of matching resources
         """
         try:
             url = f"{self.base_url}/{resource_type}"
-            response = self.session.get(url, params=params)
-            response.raise_for_status()
+            params = projection_params(params, elements)
+            result = self._get(url, params, FHIRCache.search_key(resource_type, params))
             logger.info(f"Searched {resource_type} with params {params}")
-            return response.json()
+            return project_bundle(result, elements)
         except requests.exceptions.RequestException as e:
             logger.error(f"Error searching {resource_type}: {e}")
             raise
 
+    def iter_pages(self, resource_type: str, params: Optional[Dict[str, str]] = None,
+                   page_size: Optional[int] = None, limit: Optional[int] = None,
+                   elements: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Lazily iterate over the Bundle pages of a search.
+
+        The next page is only requested once the caller asks for it.
+
+        Args:
+            resource_type: Type of FHIR resource
+            params: Search parameters
+            page_size: Entries per page (``_count``)
+            limit: Maximum number of entries the caller will consume
+            elements: Only return these top-level elements of each match
+
+        Yields:
+            Search result Bundles, following ``link[relation=next]``
+        """
+        bundle = self.search_resources(resource_type, page_params(params, page_size, limit), elements)
+        for page in self._follow_pages(bundle, resource_type):
+            yield project_bundle(page, elements)
+
+    def _follow_pages(self, bundle: Dict[str, Any], label: str) -> Iterator[Dict[str, Any]]:
+        """Yield a Bundle and then each page reached through its next links.
+
+        Args:
+            bundle: First page
+            label: Description used in log messages
+
+        Yields:
+            Bundle pages
+        """
+        while True:
+            yield bundle
+            next_url = get_next_link(bundle)
+            if not next_url:
+                return
+            try:
+                response = self._send('GET', next_url)
+                response.raise_for_status()
+                logger.info(f"Fetched next {label} page")
+                bundle = response.json()
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Error fetching next {label} page: {e}")
+                raise
+
+    def iter_resources(self, resource_type: str, params: Optional[Dict[str, str]] = None,
+                       page_size: Optional[int] = None, limit: Optional[int] = None,
+                       elements: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Lazily iterate over search result entries across all pages.
+
+        Fetching stops as soon as ``limit`` entries have been yielded.
+
+        Args:
+            resource_type: Type of FHIR resource
+            params: Search parameters
+            page_size: Entries per page (``_count``)
+            limit: Maximum number of entries to yield
+            elements: Only return these top-level elements of each match
+
+        Yields:
+            Bundle entries one at a time
+        """
+        if limit is not None and limit <= 0:
+            return
+        yielded = 0
+        for bundle in self.iter_pages(resource_type, params, page_size, limit, elements):
+            for entry in bundle.get('entry', []):
+                yield entry
+                yielded += 1
+                if limit is not None and yielded >= limit:
+                    return
+
+    def iter_history(self, resource_type: str, since: Optional[str] = None,
+                     page_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Lazily iterate over the changes to a resource type across all pages.
+
+        History is never served from the cache: it only matters when it is new.
+
+        Args:
+            resource_type: Type of FHIR resource
+            since: Only include versions created at or after this instant (``_since``)
+            page_size: Entries per page (``_count``)
+
+        Yields:
+            History entries with ``request``, ``response`` and, unless it is a
+            delete, ``resource``
+        """
+        params = page_params({'_since': since} if since else None, page_size, None)
+        label = f"{resource_type} history"
+        try:
+            response = self._send('GET', f"{self.base_url}/{resource_type}/_history", params=params)
+            response.raise_for_status()
+            logger.info(f"Fetched {label} since {since}")
+            bundle = response.json()
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error fetching {label}: {e}")
+            raise
+        for page in self._follow_pages(bundle, label):
+            yield from page.get('entry', [])
+
+    def batch(self, request_urls: List[str]) -> List[Dict[str, Any]]:
+        """Run several GET requests in one ``batch`` Bundle round trip.
+
+        Args:
+            request_urls: Request URLs relative to the base URL
+
+        Returns:
+            Response entries in request order, each with ``response`` and ``resource``
+        """
+        bundle = {
+            'resourceType': 'Bundle',
+            'type': 'batch',
+            'entry': [{'request': {'method': 'GET', 'url': url}} for url in request_urls],
+        }
+        try:
+            response = self._send('POST', self.base_url, 'bulk', json=bundle)
+            response.raise_for_status()
+            logger.info(f"Executed batch of {len(request_urls)} requests")
+            return response.json().get('entry', [])
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error executing batch: {e}")
+            raise
+
+    def supports_everything(self) -> bool:
+        """Check once whether the server implements ``Patient/$everything``.
+
+        Returns:
+            True if the CapabilityStatement advertises the operation
+        """
+        if self.everything_supported is None:
+            try:
+                response = self._send('GET', f"{self.base_url}/metadata")
+                response.raise_for_status()
+                self.everything_supported = supports_operation(response.json(), 'Patient', 'everything')
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Could not read server capabilities: {e}")
+                self.everything_supported = False
+        return self.everything_supported
+
+    def get_patient_record(self, patient_id: str, limit: Optional[int] = None,
+                           resource_types: Tuple[str, ...] = PATIENT_RECORD_TYPES
+                           ) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, int]]:
+        """Fetch a patient and their related resources in a single request.
+
+        Uses ``Patient/{id}/$everything`` where the server offers it, otherwise
+        one ``batch`` Bundle holding the Patient read and a search per type.
+        ``$everything`` responses larger than one page follow next links.
+
+        Args:
+            patient_id: Patient ID
+            limit: Maximum resources kept per type
+            resource_types: Related resource types to fetch
+
+        Returns:
+            Tuple of (resources by type including 'Patient', total count by type)
+        """
+        if self.supports_everything():
+            try:
+                return self._get_patient_everything(patient_id, limit, resource_types)
+            except requests.exceptions.HTTPError as e:
+                if e.response is None or e.response.status_code not in UNSUPPORTED_OPERATION_STATUSES:
+                    raise
+                logger.warning(f"$everything rejected, falling back to batch: {e}")
+                self.everything_supported = False
+        return self._get_patient_batch(patient_id, limit, resource_types)
+
+    def _get_patient_everything(self, patient_id: str, limit: Optional[int],
+                                resource_types: Tuple[str, ...]
+                                ) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, int]]:
+        """Fetch a patient record through ``Patient/{id}/$everything``.
+
+        With a limit, paging stops once the Patient and ``limit`` resources of
+        every type have arrived; the totals of the types cut short then come
+        from one batch of ``_summary=count`` searches.
+        """
+        url = f"{self.base_url}/Patient/{patient_id}/$everything"
+        params = {'_type': ','.join(('Patient',) + tuple(resource_types)), '_count': str(FHIR_PAGE_SIZE)}
+        response = self._send('GET', url, 'bulk', params=params)
+        response.raise_for_status()
+        logger.info(f"Retrieved Patient/{patient_id}/$everything")
+        entries: List[Dict[str, Any]] = []
+        capped = False
+        pages = self._follow_pages(response.json(), f"Patient/{patient_id}/$everything")
+        for page in pages:
+            entries.extend(page.get('entry', []))
+            if limit is not None and get_next_link(page):
+                record, _ = split_patient_record(entries, limit, resource_types)
+                capped = bool(record['Patient']) and all(len(record[t]) >= limit for t in resource_types)
+                if capped:
+                    pages.close()
+                    break
+
+        record, totals = split_patient_record(entries, limit, resource_types)
+        if not record['Patient']:
+            raise requests.exceptions.HTTPError(f"Patient/{patient_id} not found in $everything response")
+        if capped:
+            # The totals only cover the pages read, so ask the server for the real ones
+            counts = self.batch([f"{t}?patient={patient_id}&_summary=count" for t in resource_types])
+            for resource_type, entry in zip(resource_types, counts):
+                total = entry.get('resource', {}).get('total')
+                if entry.get('response', {}).get('status', '').startswith('2') and total is not None:
+                    totals[resource_type] = total
+        return record, totals
+
+    def _get_patient_batch(self, patient_id: str, limit: Optional[int],
+                           resource_types: Tuple[str, ...]
+                           ) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, int]]:
+        """Fetch a patient record through one ``batch`` Bundle."""
+        count = f"&_count={limit}" if limit is not None else ""
+        urls = [f"Patient/{patient_id}"] + [
+            f"{resource_type}?patient={patient_id}&_total=accurate{count}" for resource_type in resource_types
+        ]
+        entries = self.batch(urls)
+        record: Dict[str, List[Dict[str, Any]]] = {}
+        totals: Dict[str, int] = {}
+        for url, resource_type, entry in zip(urls, ('Patient',) + tuple(resource_types), entries):
+            status = entry.get('response', {}).get('status', '')
+            if not status.startswith('2'):
+                raise requests.exceptions.HTTPError(f"Batch request {url} failed with status {status}")
+            resource = entry.get('resource', {})
+            if resource_type == 'Patient':
+                record['Patient'] = [resource]
+                totals['Patient'] = 1
+                continue
+            record[resource_type] = [e.get('resource') for e in resource.get('entry', [])]
+            totals[resource_type] = resource.get('total', len(record[resource_type]))
+        return record, totals
+
+    def start_bulk_export(self, resource_types: Optional[Sequence[str]] = None, since: Optional[str] = None) -> str:
+        """Kick off an asynchronous system-level ``$export``.
+
+        Args:
+            resource_types: Resource types to export (``_type``), all if None
+            since: Only export resources updated after this instant (``_since``)
+
+        Returns:
+            URL of the export status endpoint
+        """
+        params = {}
+        if resource_types:
+            params['_type'] = ','.join(resource_types)
+        if since:
+            params['_since'] = since
+        headers = {'Accept': 'application/fhir+json', 'Prefer': 'respond-async'}
+        try:
+            response = self._send('GET', f"{self.base_url}/$export", 'bulk', params=params, headers=headers)
+            response.raise_for_status()
+            status_url = response.headers.get('Content-Location')
+            if not status_url:
+                raise requests.exceptions.HTTPError("$export response has no Content-Location", response=response)
+            logger.info(f"Started bulk export, polling {status_url}")
+            return status_url
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error starting bulk export: {e}")
+            raise
+
+    def poll_bulk_export(self, status_url: str) -> Tuple[Optional[Dict[str, Any]], Optional[float]]:
+        """Check the status of a running ``$export``.
+
+        Args:
+            status_url: URL returned by ``start_bulk_export``
+
+        Returns:
+            Tuple of (completion manifest or None while in progress,
+            server-requested seconds until the next poll)
+        """
+        response = self._send('GET', status_url, 'bulk')
+        if response.status_code == 202:
+            logger.info(f"Bulk export in progress: {response.headers.get('X-Progress', 'unknown')}")
+            return None, parse_retry_after(response.headers.get('Retry-After'))
+        response.raise_for_status()
+        return response.json(), None
+
+    def iter_ndjson(self, url: str) -> Iterator[Dict[str, Any]]:
+        """Stream the resources of an NDJSON bulk data file one line at a time.
+
+        Args:
+            url: Output file URL from an export manifest
+
+        Yields:
+            Parsed resources
+        """
+        response = self._send('GET', url, 'bulk', stream=True, headers={'Accept': 'application/fhir+ndjson'})
+        response.raise_for_status()
+        with response:
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
     def get_patient_by_name(self, family_name: str, given_name: Optional[str] = None) -> List[Dict[str, Any]]:
         """Search for patients by name.
 
@@ -142,16 +823,18 @@ class FHIRClient:
         result = self.search_resources('Patient', params)
         return result.get('entry', [])
 
-    def get_patient_observations(self, patient_id: str) -> List[Dict[str, Any]]:
+    def get_patient_observations(self, patient_id: str, limit: Optional[int] = None,
+                                 elements: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
         """Get all observations for a patient.
 
         Args:
             patient_id: Patient ID
+            limit: Maximum number of observations to fetch (all pages if None)
+            elements: Only return these top-level elements of each observation
 
         Returns:
             List of observation resources
         """
         params = {'patient': patient_id}
-        result = self.search_resources('Observation', params)
-        return result.get('entry', [])
+        return list(self.iter_resources('Observation', params, limit=limit, elements=elements))
 
@@ -127,3 +127,91 @@ TEMPERATURE_EXAMPLE = {
 }
 
 
+# Example Condition Resource (Hypertension)
+CONDITION_EXAMPLE = {
+    "resourceType": "Condition",
+    "clinicalStatus": {
+        "coding": [
+            {
+                "system": "http://terminology.hl7.org/CodeSystem/condition-clinical",
+                "code": "active"
+            }
+        ]
+    },
+    "verificationStatus": {
+        "coding": [
+            {
+                "system": "http://terminology.hl7.org/CodeSystem/condition-ver-status",
+                "code": "confirmed"
+            }
+        ]
+    },
+    "code": {
+        "coding": [
+            {
+                "system": "http://snomed.info/sct",
+                "code": "38341003",
+                "display": "Hypertensive disorder"
+            }
+        ]
+    },
+    "subject": {
+        "reference": "Patient/example-id"
+    },
+    "onsetDateTime": "2023-06-01",
+    "recordedDate": "2023-06-01"
+}
+
+# Example Encounter Resource (Ambulatory Visit)
+ENCOUNTER_EXAMPLE = {
+    "resourceType": "Encounter",
+    "status": "finished",
+    "class": {
+        "system": "http://terminology.hl7.org/CodeSystem/v3-ActCode",
+        "code": "AMB",
+        "display": "ambulatory"
+    },
+    "type": [
+        {
+            "coding": [
+                {
+                    "system": "http://snomed.info/sct",
+                    "code": "185349003",
+                    "display": "Encounter for check up"
+                }
+            ]
+        }
+    ],
+    "subject": {
+        "reference": "Patient/example-id"
+    },
+    "period": {
+        "start": "2024-01-12T10:00:00Z",
+        "end": "2024-01-12T10:45:00Z"
+    }
+}
+
+# Example MedicationRequest Resource
+MEDICATION_REQUEST_EXAMPLE = {
+    "resourceType": "MedicationRequest",
+    "status": "active",
+    "intent": "order",
+    "medicationCodeableConcept": {
+        "coding": [
+            {
+                "system": "http://www.nlm.nih.gov/research/umls/rxnorm",
+                "code": "314076",
+                "display": "lisinopril 10 MG Oral Tablet"
+            }
+        ]
+    },
+    "subject": {
+        "reference": "Patient/example-id"
+    },
+    "authoredOn": "2024-01-12",
+    "dosageInstruction": [
+        {
+            "text": "Take one tablet by mouth daily"
+        }
+    ]
+}
@@ -0,0 +1,238 @@
+"""Response cache for chat model calls, in memory or in SQLite."""
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+from config import (
+    LLM_CACHE_BACKEND,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL,
+)
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE = re.compile(r"\s+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    last_used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used);
+"""
+
+
+def model_fingerprint(model: Any) -> str:
+    """Identify a chat model and the tools bound to it.
+
+    Args:
+        model: Chat model, or a ``bind_tools`` binding of one
+
+    Returns:
+        Model name followed by the sorted names of any bound tools
+    """
+    bound = getattr(model, 'bound', model)
+    name = getattr(bound, 'model_name', None) or getattr(bound, 'model', None) or type(bound).__name__
+    tools = (getattr(model, 'kwargs', None) or {}).get('tools', [])
+    tool_names = sorted(
+        (tool.get('function') or {}).get('name', '') if isinstance(tool, dict) else str(tool) for tool in tools
+    )
+    return f"{name}[{','.join(tool_names)}]" if tool_names else str(name)
+
+
+def normalize_messages(messages: Sequence[BaseMessage]) -> Tuple[Tuple[str, str], ...]:
+    """Reduce messages to (type, content) pairs with whitespace collapsed."""
+    return tuple((message.type, WHITESPACE.sub(' ', str(message.content)).strip()) for message in messages)
+
+
+def cache_key(model: str, messages: Sequence[BaseMessage], tool_results: Iterable[str] = ()) -> str:
+    """Build the cache key for a model call.
+
+    Args:
+        model: Result of ``model_fingerprint``
+        messages: Messages sent to the model
+        tool_results: Tool outputs the answer is grounded on
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    tool_hash = hashlib.sha256('\x00'.join(tool_results).encode()).hexdigest()
+    payload = json.dumps([model, normalize_messages(messages), tool_hash], separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def dump_message(message: BaseMessage) -> str:
+    """Serialize a model response for storage."""
+    return json.dumps(message_to_dict(message), separators=(',', ':'))
+
+
+def load_message(value: str) -> BaseMessage:
+    """Rebuild a model response stored by ``dump_message``."""
+    return messages_from_dict([json.loads(value)])[0]
+
+
+class MemoryLLMCache:
+    """Size-bounded in-process LRU cache with a single TTL."""
+
+    def __init__(
+        self,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        ttl: float = LLM_CACHE_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached responses before LRU eviction
+            ttl: Seconds a response may be reused
+            clock: Monotonic time source
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= self._clock():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value: str) -> None:
+        """Cache a value, evicting the least recently used entries over the bound."""
+        with self._lock:
+            self._entries[key] = (value, self._clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit counts."""
+        with self._lock:
+            return {'backend': 'memory', 'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class SQLiteLLMCache:
+    """LLM cache persisted in SQLite so it survives restarts and is shared by workers.
+
+    Expiry uses wall-clock time, since entries outlive the process.
+    """
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        ttl: float = LLM_CACHE_TTL,
+        clock: Callable[[], float] = time.time,
+    ):
+        """Initialize the cache.
+
+        Args:
+            path: SQLite database file, or ':memory:'
+            max_entries: Maximum number of cached responses before LRU eviction
+            ttl: Seconds a response may be reused
+            clock: Wall-clock time source
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Return the open connection, creating the schema on first use."""
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    conn = sqlite3.connect(self.path, check_same_thread=False)
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                    conn.executescript(SCHEMA)
+                    self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value, or None if missing or expired."""
+        now = self._clock()
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    self.conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        """Cache a value, evicting expired and least recently used entries over the bound."""
+        now = self._clock()
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)",
+                              (key, value, now + self.ttl, now))
+            self.conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+            self.conn.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit counts."""
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            return {'backend': 'sqlite', 'entries': entries, 'hits': self.hits, 'misses': self.misses}
+
+
+def build_llm_cache() -> Optional[Any]:
+    """Create the configured LLM cache, or None when caching is disabled."""
+    if not LLM_CACHE_ENABLED:
+        return None
+    if LLM_CACHE_BACKEND == 'sqlite':
+        return SQLiteLLMCache()
+    if LLM_CACHE_BACKEND != 'memory':
+        logger.warning(f"Unknown LLM_CACHE_BACKEND {LLM_CACHE_BACKEND!r}, using memory")
+    return MemoryLLMCache()
@@ -0,0 +1,247 @@
+"""Local SQLite store for FHIR resources ingested in bulk."""
+import json
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import LOCAL_STORE_PATH
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    resource_type TEXT NOT NULL,
+    id TEXT NOT NULL,
+    patient_id TEXT,
+    last_updated TEXT,
+    body TEXT NOT NULL,
+    PRIMARY KEY (resource_type, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS resources_patient ON resources (patient_id, resource_type);
+
+CREATE TABLE IF NOT EXISTS observations (
+    id TEXT PRIMARY KEY,
+    patient_id TEXT,
+    code TEXT,
+    display TEXT,
+    value REAL,
+    unit TEXT,
+    effective TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS observations_code ON observations (code, effective);
+CREATE INDEX IF NOT EXISTS observations_patient ON observations (patient_id, code);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    resource_type TEXT PRIMARY KEY,
+    high_water TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def reference_id(reference: Optional[Dict[str, Any]], resource_type: str = 'Patient') -> Optional[str]:
+    """Extract the ID from a ``{"reference": "Type/id"}`` reference.
+
+    Args:
+        reference: FHIR Reference
+        resource_type: Expected resource type of the target
+
+    Returns:
+        Target ID, or None if the reference points elsewhere
+    """
+    value = (reference or {}).get('reference', '')
+    prefix = f"{resource_type}/"
+    return value[len(prefix):] if value.startswith(prefix) else None
+
+
+def patient_id_of(resource: Dict[str, Any]) -> Optional[str]:
+    """Return the ID of the patient a resource belongs to."""
+    if resource.get('resourceType') == 'Patient':
+        return resource.get('id')
+    return reference_id(resource.get('subject')) or reference_id(resource.get('patient'))
+
+
+def observation_row(resource: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Flatten an Observation into a row of the ``observations`` table."""
+    coding = ((resource.get('code') or {}).get('coding') or [{}])[0]
+    quantity = resource.get('valueQuantity') or {}
+    effective = resource.get('effectiveDateTime') or (resource.get('effectivePeriod') or {}).get('start')
+    return (
+        resource.get('id'),
+        patient_id_of(resource),
+        coding.get('code'),
+        coding.get('display') or (resource.get('code') or {}).get('text'),
+        quantity.get('value'),
+        quantity.get('unit'),
+        effective,
+    )
+
+
+class LocalStore:
+    """Compact SQLite replica of FHIR resources with a columnar Observation table.
+
+    The database is opened on first use and may be shared between threads.
+    """
+
+    def __init__(self, path: str = LOCAL_STORE_PATH):
+        """Initialize the store.
+
+        Args:
+            path: SQLite database file, or ':memory:'
+        """
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Return the open connection, creating the schema on first use."""
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    conn = sqlite3.connect(self.path, check_same_thread=False)
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                    conn.executescript(SCHEMA)
+                    self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def upsert_resources(self, resources: Iterable[Dict[str, Any]]) -> int:
+        """Insert or replace resources in one transaction.
+
+        Args:
+            resources: FHIR resources of any type
+
+        Returns:
+            Number of resources written
+        """
+        rows = []
+        observations = []
+        for resource in resources:
+            rows.append((
+                resource['resourceType'],
+                resource['id'],
+                patient_id_of(resource),
+                (resource.get('meta') or {}).get('lastUpdated'),
+                json.dumps(resource, separators=(',', ':')),
+            ))
+            if resource['resourceType'] == 'Observation':
+                observations.append(observation_row(resource))
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?)", rows)
+            self.conn.executemany("INSERT OR REPLACE INTO observations VALUES (?, ?, ?, ?, ?, ?, ?)", observations)
+        return len(rows)
+
+    def delete_resource(self, resource_type: str, resource_id: str) -> None:
+        """Remove a resource; deleting a missing resource is a no-op.
+
+        Args:
+            resource_type: Type of FHIR resource
+            resource_id: ID of the resource
+        """
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM resources WHERE resource_type = ? AND id = ?", (resource_type, resource_id))
+            if resource_type == 'Observation':
+                self.conn.execute("DELETE FROM observations WHERE id = ?", (resource_id,))
+
+    def get_resource(self, resource_type: str, resource_id: str) -> Optional[Dict[str, Any]]:
+        """Return a stored resource, or None if it is not in the store."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT body FROM resources WHERE resource_type = ? AND id = ?", (resource_type, resource_id)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_resources(self, resource_type: str, patient_id: Optional[str] = None,
+                      limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return stored resources of a type, optionally for one patient.
+
+        Args:
+            resource_type: Type of FHIR resource
+            patient_id: Only return resources of this patient
+            limit: Maximum number of resources
+
+        Returns:
+            List of resources
+        """
+        query = "SELECT body FROM resources WHERE resource_type = ?"
+        args: List[Any] = [resource_type]
+        if patient_id is not None:
+            query += " AND patient_id = ?"
+            args.append(patient_id)
+        if limit is not None:
+            query += " LIMIT ?"
+            args.append(limit)
+        with self._lock:
+            return [json.loads(body) for (body,) in self.conn.execute(query, args)]
+
+    def last_updated(self, resource_type: str, resource_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Return ``meta.lastUpdated`` of the stored resources among some IDs.
+
+        Args:
+            resource_type: Type of FHIR resource
+            resource_ids: IDs to look up
+
+        Returns:
+            lastUpdated by ID, for the IDs that are stored
+        """
+        ids = list(resource_ids)
+        found: Dict[str, Optional[str]] = {}
+        with self._lock:
+            # Stay below SQLite's limit on bound parameters
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                found.update(self.conn.execute(
+                    f"SELECT id, last_updated FROM resources WHERE resource_type = ? "
+                    f"AND id IN ({','.join('?' * len(chunk))})", [resource_type, *chunk]))
+        return found
+
+    def get_high_water(self, resource_type: str) -> Optional[str]:
+        """Return the instant a resource type was last synced up to, or None if never."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT high_water FROM sync_state WHERE resource_type = ?", (resource_type,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_high_water(self, resource_type: str, instant: str) -> None:
+        """Record that a resource type holds every change up to an instant.
+
+        Args:
+            resource_type: Type of FHIR resource
+            instant: Server time of the newest change applied
+        """
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (resource_type, instant))
+
+    def count(self, resource_type: str) -> int:
+        """Return the number of stored resources of a type."""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM resources WHERE resource_type = ?", (resource_type,)
+            ).fetchone()[0]
+
+    def observation_stats(self, code: str) -> Dict[str, Any]:
+        """Aggregate all stored observations with a code.
+
+        Args:
+            code: Observation code, e.g. a LOINC code
+
+        Returns:
+            Count, distinct patients, min/max/average numeric value and unit
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT patient_id), MIN(value), MAX(value), AVG(value), "
+                "MAX(display), MAX(unit), MIN(effective), MAX(effective) FROM observations WHERE code = ?",
+                (code,),
+            ).fetchone()
+        keys = ('count', 'patients', 'min', 'max', 'average', 'display', 'unit', 'first', 'last')
+        return dict(zip(keys, row))
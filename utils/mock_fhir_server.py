@@ -0,0 +1,485 @@
+"""Local stand-in FHIR R4 server for offline tests and benchmarks.
+
+Serves Patient, Observation, Condition, Encounter and MedicationRequest from
+memory with search parameters, paging links, ETags, ``Patient/$everything``,
+type-level ``_history``, batch Bundles and Bulk Data ``$export``, and can
+inject latency and errors.
+"""
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+logger = logging.getLogger(__name__)
+
+RESOURCE_TYPES = ('Patient', 'Observation', 'Condition', 'Encounter', 'MedicationRequest')
+
+# Search parameters that control the result set rather than filter it
+CONTROL_PARAMS = {'_count', '_offset', '_elements', '_total', '_sort', '_summary', '_format', '_type'}
+
+STATUS_TEXT = {200: 'OK', 201: 'Created', 202: 'Accepted', 304: 'Not Modified', 400: 'Bad Request',
+               404: 'Not Found', 405: 'Method Not Allowed', 410: 'Gone'}
+
+
+def parse_instant(value: str) -> datetime:
+    """Parse a FHIR date or instant into an aware UTC datetime."""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec='microseconds').replace('+00:00', 'Z')
+
+
+def _patient_ref(resource: Dict[str, Any]) -> Optional[str]:
+    if resource.get('resourceType') == 'Patient':
+        return resource.get('id')
+    for key in ('subject', 'patient'):
+        reference = (resource.get(key) or {}).get('reference', '')
+        if reference.startswith('Patient/'):
+            return reference[len('Patient/'):]
+    return None
+
+
+def _codes(resource: Dict[str, Any]) -> Iterable[Tuple[Optional[str], Optional[str]]]:
+    for key in ('code', 'medicationCodeableConcept'):
+        for coding in (resource.get(key) or {}).get('coding', []):
+            yield coding.get('system'), coding.get('code')
+
+
+def _names(resource: Dict[str, Any], part: str) -> Iterable[str]:
+    for name in resource.get('name', []):
+        values = name.get(part, [])
+        for value in [values] if isinstance(values, str) else values:
+            yield value.lower()
+
+
+def _compare(prefix: str, actual: datetime, expected: datetime) -> bool:
+    return {
+        'gt': actual > expected, 'ge': actual >= expected,
+        'lt': actual < expected, 'le': actual <= expected,
+    }.get(prefix, actual == expected)
+
+
+def _matches(resource: Dict[str, Any], name: str, value: str) -> bool:
+    """Check one search parameter against a resource."""
+    if name in ('patient', 'subject'):
+        return _patient_ref(resource) == value.split('/')[-1]
+    if name == '_id':
+        return resource.get('id') in value.split(',')
+    if name in ('family', 'given'):
+        return any(n.startswith(value.lower()) for n in _names(resource, name))
+    if name == 'name':
+        return any(n.startswith(value.lower()) for n in itertools.chain(_names(resource, 'family'),
+                                                                          _names(resource, 'given')))
+    if name == 'gender':
+        return resource.get('gender') == value
+    if name == 'birthdate':
+        return resource.get('birthDate') == value
+    if name == 'code':
+        system, _, code = value.rpartition('|')
+        return any(c == code and (not system or s == system) for s, c in _codes(resource))
+    if name == '_lastUpdated':
+        prefix = value[:2] if value[:2].isalpha() else 'eq'
+        expected = parse_instant(value[2:] if value[:2].isalpha() else value)
+        return _compare(prefix, parse_instant(resource['meta']['lastUpdated']), expected)
+    return True
+
+
+def project(resource: Dict[str, Any], elements: Optional[str]) -> Dict[str, Any]:
+    """Apply ``_elements`` the way a server does, tagging the result SUBSETTED."""
+    if not elements:
+        return resource
+    keep = ('resourceType', 'id', 'meta', *elements.split(','))
+    trimmed = {key: resource[key] for key in keep if key in resource}
+    meta = dict(trimmed.get('meta', {}))
+    meta['tag'] = meta.get('tag', []) + [{'system': 'http://terminology.hl7.org/CodeSystem/v3-ObservationValue',
+                                          'code': 'SUBSETTED'}]
+    trimmed['meta'] = meta
+    return trimmed
+
+
+class MockFHIRServer:
+    """In-memory FHIR R4 server running on a background thread.
+
+    Example:
+        with MockFHIRServer(generate_dataset(10)) as server:
+            client = FHIRClient(server.base_url)
+    """
+
+    def __init__(
+        self,
+        resources: Iterable[Dict[str, Any]] = (),
+        host: str = '127.0.0.1',
+        port: int = 0,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        page_size: int = 20,
+        supports_everything: bool = True,
+        honor_elements: bool = True,
+        seed: Optional[int] = 0,
+    ):
+        """Initialize the server.
+
+        Args:
+            resources: Resources to preload
+            host: Interface to bind
+            port: Port to bind, 0 picks a free one
+            latency: Seconds added to every request
+            error_rate: Fraction of requests answered with ``error_status``
+            error_status: Status used for injected errors
+            page_size: Default search page size
+            supports_everything: Whether ``Patient/$everything`` is offered
+            honor_elements: Whether ``_elements`` is applied or ignored
+            seed: Random seed for error injection
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.page_size = page_size
+        self.supports_everything = supports_everything
+        self.honor_elements = honor_elements
+        self.store: Dict[str, Dict[str, Dict[str, Any]]] = {t: {} for t in RESOURCE_TYPES}
+        self.requests: List[str] = []
+        # Every create, update and delete in order, served by ``{type}/_history``
+        self.history: List[Dict[str, Any]] = []
+        self._rng = random.Random(seed)
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self._exports: Dict[str, Dict[str, Any]] = {}
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self.load(resources)
+
+    @property
+    def base_url(self) -> str:
+        """Base URL of the running server."""
+        return f"http://{self.host}:{self.port}"
+
+    def load(self, resources: Iterable[Dict[str, Any]]) -> None:
+        """Add or replace resources without recording requests."""
+        for resource in resources:
+            self.put(resource)
+
+    def put(self, resource: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a resource, bumping its version and lastUpdated.
+
+        Returns:
+            The stored resource
+        """
+        with self._lock:
+            resource_type = resource['resourceType']
+            resource.setdefault('id', f"gen-{next(self._ids)}")
+            previous = self.store[resource_type].get(resource['id'])
+            version = int(previous['meta']['versionId']) + 1 if previous else 1
+            resource['meta'] = {**resource.get('meta', {}), 'versionId': str(version), 'lastUpdated': _now()}
+            self.store[resource_type][resource['id']] = resource
+            self._record(resource_type, resource['id'], 'PUT' if previous else 'POST', resource)
+            return resource
+
+    def remove(self, resource_type: str, resource_id: str) -> bool:
+        """Delete a resource.
+
+        Returns:
+            True if it existed
+        """
+        with self._lock:
+            existed = self.store[resource_type].pop(resource_id, None) is not None
+            if existed:
+                self._record(resource_type, resource_id, 'DELETE', None)
+            return existed
+
+    def _record(self, resource_type: str, resource_id: str, method: str,
+                resource: Optional[Dict[str, Any]]) -> None:
+        status = {'POST': '201 Created', 'PUT': '200 OK', 'DELETE': '204 No Content'}[method]
+        last_modified = resource['meta']['lastUpdated'] if resource else _now()
+        entry: Dict[str, Any] = {
+            'request': {'method': method, 'url': f"{resource_type}/{resource_id}"},
+            'response': {'status': status, 'lastModified': last_modified},
+        }
+        if resource is not None:
+            entry['resource'] = json.loads(json.dumps(resource))
+        self.history.append(entry)
+
+    def start(self) -> "MockFHIRServer":
+        """Start serving on a background thread."""
+        mock = self
+
+        class Handler(_Handler):
+            server_mock = mock
+
+        self._httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-fhir", daemon=True)
+        self._thread.start()
+        logger.info(f"Mock FHIR server listening on {self.base_url}")
+        return self
+
+    def stop(self) -> None:
+        """Stop the server."""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self) -> "MockFHIRServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    # Request handling, called from handler threads
+
+    def handle(self, method: str, path: str, headers: Dict[str, str],
+               body: Optional[Dict[str, Any]]) -> Tuple[int, Dict[str, str], Any]:
+        """Dispatch one request.
+
+        Returns:
+            Tuple of (status, headers, JSON body or raw bytes or None)
+        """
+        with self._lock:
+            self.requests.append(f"{method} {path}")
+            inject_error = self.error_rate and self._rng.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if inject_error:
+            return self.error_status, {'Retry-After': '0'}, _outcome('Injected error')
+
+        split = urlsplit(path)
+        segments = [s for s in split.path.split('/') if s]
+        params = dict(parse_qsl(split.query, keep_blank_values=True))
+        if method == 'GET':
+            return self._get(segments, params, headers)
+        if method == 'POST' and not segments:
+            return self._batch(body or {})
+        if method == 'POST' and len(segments) == 1 and segments[0] in self.store:
+            resource = self.put({**(body or {}), 'resourceType': segments[0], 'id': f"gen-{next(self._ids)}"})
+            return 201, {'Location': f"{self.base_url}/{segments[0]}/{resource['id']}"}, resource
+        if method == 'PUT' and len(segments) == 2 and segments[0] in self.store:
+            existed = segments[1] in self.store[segments[0]]
+            resource = self.put({**(body or {}), 'resourceType': segments[0], 'id': segments[1]})
+            return (200 if existed else 201), _validators(resource), resource
+        if method == 'DELETE' and len(segments) == 2 and segments[0] in self.store:
+            self.remove(*segments)
+            return 200, {}, _outcome('Deleted', 'information')
+        return 405, {}, _outcome(f"{method} {split.path} is not supported")
+
+    def _get(self, segments: List[str], params: Dict[str, str],
+             headers: Dict[str, str]) -> Tuple[int, Dict[str, str], Any]:
+        if segments == ['metadata']:
+            return 200, {}, self._capability()
+        if segments == ['$export']:
+            return self._start_export(params)
+        if len(segments) == 2 and segments[0] == '$export-status':
+            return self._export_status(segments[1])
+        if len(segments) == 3 and segments[0] == '$export-output':
+            return self._export_output(segments[1], segments[2])
+        if len(segments) == 3 and segments[0] == 'Patient' and segments[2] == '$everything':
+            if not self.supports_everything:
+                return 400, {}, _outcome("Unknown operation $everything")
+            return self._everything(segments[1], params)
+        if segments and segments[0] in self.store:
+            if len(segments) == 1:
+                return 200, {}, self._search(segments[0], params)
+            if segments[1:] == ['_history']:
+                return 200, {}, self._history(segments[0], params)
+            if len(segments) == 2:
+                return self._read(segments[0], segments[1], params, headers)
+        return 404, {}, _outcome(f"Unknown path /{'/'.join(segments)}")
+
+    def _capability(self) -> Dict[str, Any]:
+        resources = []
+        for resource_type in RESOURCE_TYPES:
+            interactions = [{'code': 'read'}, {'code': 'search-type'}, {'code': 'history-type'}]
+            declared = {'type': resource_type, 'interaction': interactions}
+            if resource_type == 'Patient' and self.supports_everything:
+                declared['operation'] = [{'name': 'everything'}]
+            resources.append(declared)
+        return {'resourceType': 'CapabilityStatement', 'fhirVersion': '4.0.1',
+                'rest': [{'mode': 'server', 'resource': resources}]}
+
+    def _read(self, resource_type: str, resource_id: str, params: Dict[str, str],
+              headers: Dict[str, str]) -> Tuple[int, Dict[str, str], Any]:
+        with self._lock:
+            resource = self.store[resource_type].get(resource_id)
+        if resource is None:
+            return 404, {}, _outcome(f"{resource_type}/{resource_id} is not known")
+        validators = _validators(resource)
+        if headers.get('If-None-Match') == validators['ETag']:
+            return 304, validators, None
+        return 200, validators, self._project(resource, params.get('_elements'))
+
+    def _project(self, resource: Dict[str, Any], elements: Optional[str]) -> Dict[str, Any]:
+        return project(resource, elements) if self.honor_elements else resource
+
+    def _page(self, path: str, params: Dict[str, str], matches: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build one searchset page with self and next links."""
+        count = int(params.get('_count', self.page_size))
+        offset = int(params.get('_offset', 0))
+        bundle: Dict[str, Any] = {'resourceType': 'Bundle', 'type': 'searchset', 'total': len(matches)}
+        if params.get('_summary') == 'count':
+            return bundle
+        page = matches[offset:offset + count]
+        links = [{'relation': 'self', 'url': f"{self.base_url}/{path}?{urlencode(params)}"}]
+        if offset + count < len(matches):
+            links.append({'relation': 'next',
+                          'url': f"{self.base_url}/{path}?{urlencode({**params, '_offset': offset + count})}"})
+        bundle['link'] = links
+        bundle['entry'] = [
+            {'fullUrl': f"{self.base_url}/{r['resourceType']}/{r['id']}",
+             'resource': self._project(r, params.get('_elements')),
+             'search': {'mode': 'match'}}
+            for r in page
+        ]
+        return bundle
+
+    def _search(self, resource_type: str, params: Dict[str, str]) -> Dict[str, Any]:
+        filters = [(k, v) for k, v in params.items() if k not in CONTROL_PARAMS]
+        with self._lock:
+            matches = [r for r in self.store[resource_type].values() if all(_matches(r, k, v) for k, v in filters)]
+        if params.get('_sort', '').lstrip('-') == '_lastUpdated':
+            matches.sort(key=lambda r: r['meta']['lastUpdated'], reverse=params['_sort'].startswith('-'))
+        return self._page(resource_type, params, matches)
+
+    def _history(self, resource_type: str, params: Dict[str, str]) -> Dict[str, Any]:
+        """Build one page of a type's history, newest change first."""
+        since = parse_instant(params['_since']) if params.get('_since') else None
+        with self._lock:
+            changes = [e for e in reversed(self.history) if e['request']['url'].startswith(f"{resource_type}/")
+                       and (since is None or parse_instant(e['response']['lastModified']) >= since)]
+        count = int(params.get('_count', self.page_size))
+        offset = int(params.get('_offset', 0))
+        path = f"{resource_type}/_history"
+        links = [{'relation': 'self', 'url': f"{self.base_url}/{path}?{urlencode(params)}"}]
+        if offset + count < len(changes):
+            links.append({'relation': 'next',
+                          'url': f"{self.base_url}/{path}?{urlencode({**params, '_offset': offset + count})}"})
+        entries = [{'fullUrl': f"{self.base_url}/{e['request']['url']}", **e} for e in changes[offset:offset + count]]
+        return {'resourceType': 'Bundle', 'type': 'history', 'total': len(changes), 'link': links, 'entry': entries}
+
+    def _everything(self, patient_id: str, params: Dict[str, str]) -> Tuple[int, Dict[str, str], Any]:
+        with self._lock:
+            if patient_id not in self.store['Patient']:
+                return 404, {}, _outcome(f"Patient/{patient_id} is not known")
+            types = params.get('_type', ','.join(RESOURCE_TYPES)).split(',')
+            matches = [r for t in types if t in self.store
+                       for r in self.store[t].values() if _patient_ref(r) == patient_id]
+        return 200, {}, self._page(f"Patient/{patient_id}/$everything", params, matches)
+
+    def _batch(self, bundle: Dict[str, Any]) -> Tuple[int, Dict[str, str], Any]:
+        if bundle.get('type') not in ('batch', 'transaction'):
+            return 400, {}, _outcome("Only batch Bundles are supported")
+        entries = []
+        for entry in bundle.get('entry', []):
+            request = entry.get('request', {})
+            if request.get('method') != 'GET':
+                entries.append({'response': {'status': '405 Method Not Allowed'}})
+                continue
+            split = urlsplit('/' + request.get('url', '').lstrip('/'))
+            segments = [s for s in split.path.split('/') if s]
+            status, _, body = self._get(segments, dict(parse_qsl(split.query)), {})
+            response_entry: Dict[str, Any] = {'response': {'status': f"{status} {STATUS_TEXT.get(status, '')}"}}
+            if body is not None:
+                response_entry['resource'] = body
+            entries.append(response_entry)
+        return 200, {}, {'resourceType': 'Bundle', 'type': 'batch-response', 'entry': entries}
+
+    def _start_export(self, params: Dict[str, str]) -> Tuple[int, Dict[str, str], Any]:
+        types = params.get('_type', ','.join(RESOURCE_TYPES)).split(',')
+        since = parse_instant(params['_since']) if params.get('_since') else None
+        with self._lock:
+            job = str(next(self._ids))
+            self._exports[job] = {
+                'polls': 0,
+                'transactionTime': _now(),
+                'files': {
+                    t: [r for r in self.store[t].values()
+                        if since is None or parse_instant(r['meta']['lastUpdated']) > since]
+                    for t in types if t in self.store
+                },
+            }
+        return 202, {'Content-Location': f"{self.base_url}/$export-status/{job}"}, None
+
+    def _export_status(self, job: str) -> Tuple[int, Dict[str, str], Any]:
+        with self._lock:
+            export = self._exports.get(job)
+            if export is None:
+                return 404, {}, _outcome(f"Unknown export {job}")
+            export['polls'] += 1
+            if export['polls'] == 1:
+                return 202, {'X-Progress': 'in progress', 'Retry-After': '0'}, None
+        output = [{'type': t, 'url': f"{self.base_url}/$export-output/{job}/{t}", 'count': len(rs)}
+                  for t, rs in export['files'].items() if rs]
+        return 200, {}, {'transactionTime': export['transactionTime'], 'request': f"{self.base_url}/$export",
+                         'requiresAccessToken': False, 'output': output, 'error': []}
+
+    def _export_output(self, job: str, resource_type: str) -> Tuple[int, Dict[str, str], Any]:
+        with self._lock:
+            resources = self._exports.get(job, {}).get('files', {}).get(resource_type)
+        if resources is None:
+            return 404, {}, _outcome(f"Unknown export file {job}/{resource_type}")
+        body = b''.join(json.dumps(r, separators=(',', ':')).encode() + b'\n' for r in resources)
+        return 200, {'Content-Type': 'application/fhir+ndjson'}, body
+
+
+def _outcome(message: str, severity: str = 'error') -> Dict[str, Any]:
+    return {'resourceType': 'OperationOutcome',
+            'issue': [{'severity': severity, 'code': 'processing', 'diagnostics': message}]}
+
+
+def _validators(resource: Dict[str, Any]) -> Dict[str, str]:
+    meta = resource['meta']
+    return {'ETag': f'W/"{meta["versionId"]}"',
+            'Last-Modified': format_datetime(parse_instant(meta['lastUpdated']), usegmt=True)}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """HTTP/1.1 keep-alive handler delegating to ``MockFHIRServer.handle``."""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; don't let Nagle hold the body back
+    disable_nagle_algorithm = True
+    server_mock: MockFHIRServer
+
+    def _dispatch(self, method: str) -> None:
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        body = json.loads(raw) if raw else None
+        status, headers, payload = self.server_mock.handle(method, self.path, dict(self.headers), body)
+        if isinstance(payload, (dict, list)):
+            data = json.dumps(payload).encode()
+            headers.setdefault('Content-Type', 'application/fhir+json')
+        else:
+            data = payload or b''
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        self._dispatch('GET')
+
+    def do_POST(self) -> None:
+        self._dispatch('POST')
+
+    def do_PUT(self) -> None:
+        self._dispatch('PUT')
+
+    def do_DELETE(self) -> None:
+        self._dispatch('DELETE')
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format % args)
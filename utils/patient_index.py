@@ -0,0 +1,257 @@
+"""In-memory patient directory for fast, typo-tolerant name search.
+
+Name parts are indexed by trigram. A search looks up candidate name tokens
+sharing a trigram with each query token and scores them by edit distance,
+so "Smtih" or "Jon" still find Smith and John. Birth date, gender,
+identifier and ``_id`` are matched exactly. The index only knows the
+patients it has been given (from a bulk export or earlier server searches),
+so callers ask the server unless the index is marked ``complete``, and even
+then only skip it for exact and prefix matches, which are what the server
+itself would return.
+"""
+import logging
+import threading
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from config import PATIENT_INDEX_MIN_SIMILARITY
+
+logger = logging.getLogger(__name__)
+
+# Patient elements kept for search results
+INDEXED_ELEMENTS = ('name', 'gender', 'birthDate')
+# Search parameters the index can answer; any other makes the caller ask the server
+NAME_PARAMS = {'family': 'family', 'given': 'given', 'name': 'name'}
+EXACT_PARAMS = ('gender', 'birthdate', 'identifier', '_id')
+IGNORED_PARAMS = ('_count', '_elements')
+# Score of a name token that starts with the query token, as FHIR string search matches
+PREFIX_SCORE = 0.95
+
+
+def normalize(text: str) -> List[str]:
+    """Split text into lowercase tokens without accents or punctuation."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    plain = ''.join(c if c.isalnum() else ' ' for c in decomposed if not unicodedata.combining(c))
+    return plain.casefold().split()
+
+
+def trigrams(token: str) -> Set[str]:
+    """Return the trigrams of a token padded with one space on each side."""
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_similarity(a: str, b: str) -> float:
+    """Return 1 minus the edit distance (with transpositions) over the longer length."""
+    if a == b:
+        return 1.0
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return 1 - previous[-1] / max(len(a), len(b))
+
+
+def name_tokens(patient: Dict[str, Any]) -> Tuple[Set[str], Set[str]]:
+    """Return the family and given name tokens of a Patient across all its names."""
+    family: Set[str] = set()
+    given: Set[str] = set()
+    for name in patient.get('name') or []:
+        family.update(normalize(name.get('family') or ''))
+        for part in name.get('given') or []:
+            given.update(normalize(part))
+        if not name.get('family') and not name.get('given') and name.get('text'):
+            given.update(normalize(name['text']))
+    return family, given
+
+
+class PatientIndex:
+    """Thread-safe trigram index over patient names with exact demographic filters."""
+
+    def __init__(self, min_similarity: float = PATIENT_INDEX_MIN_SIMILARITY):
+        """Initialize an empty index.
+
+        Args:
+            min_similarity: Lowest score, from 0 to 1, at which a name token
+                matches a query token
+        """
+        self.min_similarity = min_similarity
+        # Set by the owner while the index holds every patient on the server
+        self.complete = False
+        self._lock = threading.RLock()
+        self._patients: Dict[str, Dict[str, Any]] = {}
+        # Per patient: family tokens, given tokens, identifier keys
+        self._keys: Dict[str, Tuple[Set[str], Set[str], Set[str]]] = {}
+        self._fields: Dict[str, Dict[str, Set[str]]] = {'family': {}, 'given': {}}
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._identifiers: Dict[str, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.unsupported = 0
+
+    def __len__(self) -> int:
+        return len(self._patients)
+
+    def add(self, resources: Iterable[Dict[str, Any]]) -> int:
+        """Index Patient resources, replacing earlier versions; other types are skipped.
+
+        Args:
+            resources: Resources, e.g. search results or bulk export output
+
+        Returns:
+            Number of patients indexed
+        """
+        added = 0
+        with self._lock:
+            for resource in resources:
+                if resource.get('resourceType', 'Patient') != 'Patient' or not resource.get('id'):
+                    continue
+                patient_id = str(resource['id'])
+                self._remove(patient_id)
+                family, given = name_tokens(resource)
+                identifiers = set()
+                for identifier in resource.get('identifier') or []:
+                    if identifier.get('value'):
+                        identifiers.add(identifier['value'])
+                        identifiers.add(f"{identifier.get('system', '')}|{identifier['value']}")
+                self._patients[patient_id] = {'resourceType': 'Patient', 'id': patient_id,
+                                              **{key: resource[key] for key in INDEXED_ELEMENTS if key in resource}}
+                self._keys[patient_id] = (family, given, identifiers)
+                for field, tokens in (('family', family), ('given', given)):
+                    for token in tokens:
+                        self._fields[field].setdefault(token, set()).add(patient_id)
+                        for trigram in trigrams(token):
+                            self._trigrams.setdefault(trigram, set()).add(token)
+                for key in identifiers:
+                    self._identifiers.setdefault(key, set()).add(patient_id)
+                added += 1
+        return added
+
+    def remove(self, patient_id: str) -> None:
+        """Drop a patient, e.g. after it was updated, so the next search asks the server."""
+        with self._lock:
+            self._remove(str(patient_id))
+
+    def _remove(self, patient_id: str) -> None:
+        if self._patients.pop(patient_id, None) is None:
+            return
+        family, given, identifiers = self._keys.pop(patient_id)
+        for field, tokens in (('family', family), ('given', given)):
+            for token in tokens:
+                ids = self._fields[field][token]
+                ids.discard(patient_id)
+                if not ids:
+                    del self._fields[field][token]
+                    if token not in self._fields['family'] and token not in self._fields['given']:
+                        for trigram in trigrams(token):
+                            self._trigrams[trigram].discard(token)
+        for key in identifiers:
+            self._identifiers[key].discard(patient_id)
+            if not self._identifiers[key]:
+                del self._identifiers[key]
+
+    def _token_scores(self, query: str, fields: Tuple[str, ...], fuzzy: bool = True) -> Dict[str, float]:
+        """Score every indexed token of the fields that matches one query token."""
+        if len(query) < 2:
+            # A single letter shares no trigram with longer tokens, so match it as a prefix
+            candidates = {token for field in fields for token in self._fields[field] if token.startswith(query)}
+        else:
+            candidates = set().union(*(self._trigrams.get(trigram, ()) for trigram in trigrams(query)))
+        scores = {}
+        for token in candidates:
+            if not any(token in self._fields[field] for field in fields):
+                continue
+            if token == query:
+                scores[token] = 1.0
+            elif token.startswith(query):
+                scores[token] = PREFIX_SCORE
+            elif fuzzy:
+                score = edit_similarity(query, token)
+                if score >= self.min_similarity:
+                    scores[token] = score
+        return scores
+
+    def _name_matches(self, value: str, fields: Tuple[str, ...], fuzzy: bool = True) -> Optional[Dict[str, float]]:
+        """Score patients whose names match every token of a search value."""
+        matches: Optional[Dict[str, float]] = None
+        for query in normalize(value):
+            best: Dict[str, float] = {}
+            for token, score in self._token_scores(query, fields, fuzzy).items():
+                for field in fields:
+                    for patient_id in self._fields[field].get(token, ()):
+                        best[patient_id] = max(best.get(patient_id, 0.0), score)
+            if matches is None:
+                matches = best
+            else:
+                matches = {patient_id: matches[patient_id] + score
+                           for patient_id, score in best.items() if patient_id in matches}
+        return matches
+
+    def _exact_match(self, patient_id: str, param: str, value: str) -> bool:
+        patient = self._patients[patient_id]
+        if param == 'gender':
+            return patient.get('gender') == value.lower()
+        if param == 'birthdate':
+            return (patient.get('birthDate') or '').startswith(value[2:] if value.startswith('eq') else value)
+        if param == 'identifier':
+            return patient_id in self._identifiers.get(value, ())
+        return patient_id == value
+
+    def search(self, params: Dict[str, Any], limit: int = 10,
+               fuzzy: bool = True) -> Optional[List[Dict[str, Any]]]:
+        """Find indexed patients matching FHIR Patient search parameters.
+
+        Args:
+            params: Search parameters, e.g. {"family": "Smith", "birthdate": "1970"}
+            limit: Maximum number of patients
+            fuzzy: Match names within ``min_similarity``; if False, only names
+                equal to or starting with the query, as FHIR string search does
+
+        Returns:
+            Matching Patient resources, best name match first; an empty list if
+            none match, or None if the parameters need the server (unknown
+            parameters, modifiers or date comparisons)
+        """
+        params = {str(key): str(value) for key, value in (params or {}).items()}
+        searchable = {key: value for key, value in params.items() if key not in IGNORED_PARAMS}
+        unsupported = [key for key in searchable if key not in NAME_PARAMS and key not in EXACT_PARAMS]
+        birthdate = searchable.get('birthdate', '')
+        if not searchable or unsupported or (birthdate[:2].isalpha() and not birthdate.startswith('eq')):
+            with self._lock:
+                self.unsupported += 1
+            return None
+
+        with self._lock:
+            scores: Optional[Dict[str, float]] = None
+            for param, field in NAME_PARAMS.items():
+                if param in searchable:
+                    fields = ('family', 'given') if field == 'name' else (field,)
+                    matches = self._name_matches(searchable[param], fields, fuzzy) or {}
+                    scores = matches if scores is None else {
+                        patient_id: scores[patient_id] + score
+                        for patient_id, score in matches.items() if patient_id in scores}
+            if scores is None:
+                scores = dict.fromkeys(self._patients, 0.0)
+            ranked = sorted(
+                (patient_id for patient_id in scores
+                 if all(self._exact_match(patient_id, param, searchable[param])
+                        for param in EXACT_PARAMS if param in searchable)),
+                key=lambda patient_id: (-scores[patient_id], patient_id))
+            results = [dict(self._patients[patient_id]) for patient_id in ranked[:limit]]
+            if results:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of indexed patients and how searches were answered."""
+        with self._lock:
+            searches = self.hits + self.misses + self.unsupported
+            return {'patients': len(self._patients), 'hits': self.hits, 'misses': self.misses,
+                    'unsupported': self.unsupported, 'hit_ratio': self.hits / searches if searches else 0.0}
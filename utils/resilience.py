@@ -0,0 +1,342 @@
+"""Retry, circuit breaking, hedging and request coalescing shared by the FHIR clients."""
+import asyncio
+import concurrent.futures
+import logging
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+from urllib.parse import urlsplit
+
+import requests
+
+from config import (
+    FHIR_RETRY_ATTEMPTS,
+    FHIR_RETRY_BACKOFF,
+    FHIR_RETRY_BACKOFF_MAX,
+    FHIR_BREAKER_THRESHOLD,
+    FHIR_BREAKER_RESET,
+    FHIR_HEDGE_PERCENTILE,
+)
+from utils import telemetry
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+T = TypeVar('T')
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of sending a request while a host's circuit is open."""
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Parse a ``Retry-After`` header given as seconds or an HTTP date.
+
+    Args:
+        value: Header value
+        now: Current epoch time, defaults to ``time.time()``
+
+    Returns:
+        Seconds to wait, or None if the header is missing or malformed
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at - (time.time() if now is None else now))
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for idempotent requests."""
+
+    def __init__(
+        self,
+        max_attempts: int = FHIR_RETRY_ATTEMPTS,
+        backoff_base: float = FHIR_RETRY_BACKOFF,
+        backoff_max: float = FHIR_RETRY_BACKOFF_MAX,
+        retry_statuses: frozenset = RETRY_STATUSES,
+    ):
+        """Initialize the policy.
+
+        Args:
+            max_attempts: Total attempts per request, including the first
+            backoff_base: Backoff ceiling in seconds after the first failure
+            backoff_max: Upper bound for any single wait, including Retry-After
+            retry_statuses: HTTP statuses that are worth retrying
+        """
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = retry_statuses
+
+    def can_retry(self, method: str, attempt: int) -> bool:
+        """Check whether a failed attempt may be retried.
+
+        Args:
+            method: HTTP method
+            attempt: Zero-based index of the attempt that failed
+
+        Returns:
+            True for idempotent methods with attempts left
+        """
+        return method.upper() in IDEMPOTENT_METHODS and attempt + 1 < self.max_attempts
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Return how long to wait before the next attempt.
+
+        Args:
+            attempt: Zero-based index of the attempt that failed
+            retry_after: Server-requested delay from ``Retry-After``
+
+        Returns:
+            Delay in seconds
+        """
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Per-host breaker that fails fast after repeated server failures.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    requests are rejected for ``reset_timeout`` seconds. One trial request is
+    then let through; its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = FHIR_BREAKER_THRESHOLD,
+        reset_timeout: float = FHIR_BREAKER_RESET,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Initialize the breaker.
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds to stay open before a trial request
+            clock: Monotonic time source
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        """Return 'closed', 'open' or 'half_open'."""
+        if self.opened_at is None:
+            return 'closed'
+        if self._clock() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def before_request(self, host: str = '') -> None:
+        """Reject the request if the circuit is open.
+
+        Raises:
+            CircuitOpenError: While the circuit is open or a trial is in flight
+        """
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return
+            if state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            raise CircuitOpenError(f"Circuit open for FHIR server {host}, failing fast")
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful request."""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """Let another trial through after one ended without a server verdict.
+
+        Used when a request fails for a reason that says nothing about the
+        server's health (an invalid URL, a cancelled task), so the circuit
+        neither closes nor re-opens.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        """Count a failure, opening the circuit once the threshold is reached."""
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Opening circuit after {self.failures} consecutive failures")
+                self.opened_at = self._clock()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def circuit_breaker_for(url: str) -> Tuple[str, CircuitBreaker]:
+    """Return the circuit breaker shared by every client talking to a host.
+
+    Args:
+        url: Any URL on the host
+
+    Returns:
+        Tuple of (host, breaker)
+    """
+    host = urlsplit(url).netloc
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker()
+        return host, _breakers[host]
+
+
+class LatencyTracker:
+    """Rolling window of request latencies used to decide when to hedge."""
+
+    def __init__(self, percentile: float = FHIR_HEDGE_PERCENTILE, window: int = 200, min_samples: int = 20):
+        """Initialize the tracker.
+
+        Args:
+            percentile: Latency percentile after which a hedged request is sent,
+                0 disables hedging
+            window: Number of recent latencies kept
+            min_samples: Samples needed before hedging starts
+        """
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.hedged = 0
+
+    def record(self, seconds: float) -> None:
+        """Record the latency of a completed request."""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Return the delay after which to send a duplicate request.
+
+        Returns:
+            Seconds, or None when hedging is disabled or there is too little data
+        """
+        if self.percentile <= 0:
+            return None
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return ordered[index]
+
+
+class SingleFlight:
+    """Coalesces concurrent identical requests so only one reaches the server.
+
+    The first caller of a key runs the request; callers arriving while it is
+    in flight wait for it and share its result or exception. Sync callers
+    share across threads; async callers share within their event loop. An
+    async request is only cancelled once every caller waiting on it has been
+    cancelled.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, concurrent.futures.Future] = {}
+        self._async_flights: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], "_AsyncFlight"] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def _join(self, shared: bool) -> None:
+        self.calls += 1
+        self.shared += shared
+        telemetry.metrics.counter('fhir_single_flight_total', 'FHIR GETs sent (leader) or coalesced (shared)').inc(
+            {'result': 'shared' if shared else 'leader'})
+
+    def do(self, key: Hashable, func: Callable[[], T]) -> T:
+        """Run ``func`` unless an identical call is in flight, then share its outcome.
+
+        Args:
+            key: Identity of the request, e.g. method, URL and sorted params
+            func: Performs the request
+
+        Returns:
+            The result of whichever call ran
+        """
+        with self._lock:
+            future = self._flights.get(key)
+            leader = future is None
+            if leader:
+                future = self._flights[key] = concurrent.futures.Future()
+            self._join(not leader)
+        if not leader:
+            return future.result()
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+    async def ado(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """Async counterpart of ``do``."""
+        flight_key = (asyncio.get_running_loop(), key)
+        with self._lock:
+            flight = self._async_flights.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = self._async_flights[flight_key] = _AsyncFlight(asyncio.ensure_future(func()))
+                flight.task.add_done_callback(lambda _: self._forget(flight_key, flight))
+            flight.waiters += 1
+            self._join(not leader)
+        try:
+            # Shielded so one cancelled caller does not cancel the request for the others
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()
+
+    def _forget(self, flight_key: Tuple[asyncio.AbstractEventLoop, Hashable], flight: "_AsyncFlight") -> None:
+        with self._lock:
+            if self._async_flights.get(flight_key) is flight:
+                del self._async_flights[flight_key]
+        # Keeps asyncio from reporting an exception nobody was left to retrieve
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the GETs made through the single-flight and the share answered by another caller's request."""
+        with self._lock:
+            return {'calls': self.calls, 'shared': self.shared,
+                    'coalescing_ratio': self.shared / self.calls if self.calls else 0.0}
+
+
+class _AsyncFlight:
+    """An async request in flight and the number of callers waiting on it."""
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
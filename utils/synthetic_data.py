@@ -0,0 +1,163 @@
+"""Synthetic FHIR patient generator for offline testing and benchmarks."""
+import copy
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils.fhir_templates import (
+    PATIENT_EXAMPLE,
+    BLOOD_PRESSURE_EXAMPLE,
+    TEMPERATURE_EXAMPLE,
+    CONDITION_EXAMPLE,
+    ENCOUNTER_EXAMPLE,
+    MEDICATION_REQUEST_EXAMPLE,
+)
+
+FAMILY_NAMES = ["Smith", "Johnson", "Garcia", "Nguyen", "Okafor", "Kowalski", "Haddad", "Tanaka", "Silva", "Murphy"]
+GIVEN_NAMES = {
+    "male": ["John", "Carlos", "Wei", "Ahmed", "Liam", "Kenji"],
+    "female": ["Maria", "Aisha", "Emma", "Sofia", "Mei", "Grace"],
+}
+CITIES = [("Boston", "MA", "02101"), ("Austin", "TX", "73301"), ("Denver", "CO", "80201"), ("Seattle", "WA", "98101")]
+
+# (SNOMED code, display) pairs used to vary conditions
+CONDITIONS = [
+    ("38341003", "Hypertensive disorder"),
+    ("44054006", "Diabetes mellitus type 2"),
+    ("195967001", "Asthma"),
+    ("55822004", "Hyperlipidemia"),
+]
+
+# (RxNorm code, display) pairs used to vary medication requests
+MEDICATIONS = [
+    ("314076", "lisinopril 10 MG Oral Tablet"),
+    ("860975", "metformin 500 MG Oral Tablet"),
+    ("617312", "atorvastatin 10 MG Oral Tablet"),
+    ("745679", "albuterol 0.09 MG/ACTUAT Inhaler"),
+]
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+def _instant(rng: random.Random, days: int = 5 * 365) -> datetime:
+    return EPOCH + timedelta(minutes=rng.randrange(days * 24 * 60))
+
+
+def _for_patient(template: Dict[str, Any], resource_id: str, patient_id: str) -> Dict[str, Any]:
+    resource = copy.deepcopy(template)
+    resource["id"] = resource_id
+    resource["subject"] = {"reference": f"Patient/{patient_id}"}
+    return resource
+
+
+def generate_patient(rng: random.Random, patient_id: str) -> Dict[str, Any]:
+    """Generate a Patient shaped like ``PATIENT_EXAMPLE``.
+
+    Args:
+        rng: Random source
+        patient_id: ID to assign
+
+    Returns:
+        Patient resource
+    """
+    patient = copy.deepcopy(PATIENT_EXAMPLE)
+    gender = rng.choice(["male", "female"])
+    city, state, postal_code = rng.choice(CITIES)
+    patient["id"] = patient_id
+    patient["gender"] = gender
+    patient["name"][0]["family"] = rng.choice(FAMILY_NAMES)
+    patient["name"][0]["given"] = [rng.choice(GIVEN_NAMES[gender])]
+    patient["birthDate"] = (datetime(1930, 1, 1) + timedelta(days=rng.randrange(90 * 365))).date().isoformat()
+    patient["address"][0].update({"city": city, "state": state, "postalCode": postal_code})
+    patient["identifier"] = [{"system": "urn:mrn", "value": f"MRN{int(rng.random() * 1e8):08d}"}]
+    return patient
+
+
+def generate_observation(rng: random.Random, resource_id: str, patient_id: str) -> Dict[str, Any]:
+    """Generate a blood pressure or temperature Observation from the templates."""
+    if rng.random() < 0.5:
+        observation = _for_patient(BLOOD_PRESSURE_EXAMPLE, resource_id, patient_id)
+        observation["component"][0]["valueQuantity"]["value"] = rng.randint(95, 170)
+        observation["component"][1]["valueQuantity"]["value"] = rng.randint(55, 105)
+    else:
+        observation = _for_patient(TEMPERATURE_EXAMPLE, resource_id, patient_id)
+        observation["valueQuantity"]["value"] = round(rng.uniform(96.5, 102.5), 1)
+    observation["effectiveDateTime"] = _instant(rng).isoformat().replace("+00:00", "Z")
+    return observation
+
+
+def generate_condition(rng: random.Random, resource_id: str, patient_id: str) -> Dict[str, Any]:
+    """Generate a Condition from ``CONDITION_EXAMPLE``."""
+    condition = _for_patient(CONDITION_EXAMPLE, resource_id, patient_id)
+    code, display = rng.choice(CONDITIONS)
+    condition["code"]["coding"][0].update({"code": code, "display": display})
+    onset = _instant(rng).date().isoformat()
+    condition["onsetDateTime"] = onset
+    condition["recordedDate"] = onset
+    return condition
+
+
+def generate_encounter(rng: random.Random, resource_id: str, patient_id: str) -> Dict[str, Any]:
+    """Generate an Encounter from ``ENCOUNTER_EXAMPLE``."""
+    encounter = _for_patient(ENCOUNTER_EXAMPLE, resource_id, patient_id)
+    start = _instant(rng)
+    encounter["period"] = {
+        "start": start.isoformat().replace("+00:00", "Z"),
+        "end": (start + timedelta(minutes=rng.randint(15, 90))).isoformat().replace("+00:00", "Z"),
+    }
+    return encounter
+
+
+def generate_medication_request(rng: random.Random, resource_id: str, patient_id: str) -> Dict[str, Any]:
+    """Generate a MedicationRequest from ``MEDICATION_REQUEST_EXAMPLE``."""
+    medication = _for_patient(MEDICATION_REQUEST_EXAMPLE, resource_id, patient_id)
+    code, display = rng.choice(MEDICATIONS)
+    medication["medicationCodeableConcept"]["coding"][0].update({"code": code, "display": display})
+    medication["authoredOn"] = _instant(rng).date().isoformat()
+    return medication
+
+
+def iter_patient_records(num_patients: int, observations: int = 20, conditions: int = 3, encounters: int = 5,
+                         medications: int = 3, seed: Optional[int] = 0) -> Iterator[Dict[str, Any]]:
+    """Lazily generate patients and their related resources.
+
+    Patient IDs are ``"1"`` to ``str(num_patients)``; related resources get
+    IDs like ``"1-obs-0"`` so they are unique and easy to trace.
+
+    Args:
+        num_patients: Number of patients
+        observations: Observations per patient
+        conditions: Conditions per patient
+        encounters: Encounters per patient
+        medications: Medication requests per patient
+        seed: Random seed for reproducible output
+
+    Yields:
+        Resources, each patient followed by its related resources
+    """
+    rng = random.Random(seed)
+    generators = [
+        ("obs", observations, generate_observation),
+        ("cond", conditions, generate_condition),
+        ("enc", encounters, generate_encounter),
+        ("med", medications, generate_medication_request),
+    ]
+    for index in range(1, num_patients + 1):
+        patient_id = str(index)
+        yield generate_patient(rng, patient_id)
+        for prefix, count, generate in generators:
+            for n in range(count):
+                yield generate(rng, f"{patient_id}-{prefix}-{n}", patient_id)
+
+
+def generate_dataset(num_patients: int, **kwargs) -> List[Dict[str, Any]]:
+    """Generate patients and related resources as a list.
+
+    Args:
+        num_patients: Number of patients
+        **kwargs: Per-patient counts and seed, see ``iter_patient_records``
+
+    Returns:
+        List of resources
+    """
+    return list(iter_patient_records(num_patients, **kwargs))
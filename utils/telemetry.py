@@ -0,0 +1,467 @@
+"""Tracing spans exported in OpenTelemetry format, and Prometheus-style metrics.
+
+Spans are encoded as OTLP/JSON ``resourceSpans`` and exported in batches,
+either appended to a file (one export request per line, as read by the
+collector's ``otlpjsonfile`` receiver) or posted to a collector's
+``/v1/traces`` endpoint. Every finished span also feeds the metrics
+registry: a ``<kind>_duration_seconds`` histogram and a
+``<kind>_errors_total`` counter labelled with the span name, which
+``render`` serves in the Prometheus text format.
+
+Span attributes must not carry patient data: callers record resource
+types, statuses and sizes, never IDs, URLs with search values or content.
+"""
+import abc
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config import (
+    OTEL_TRACES_EXPORTER,
+    OTEL_EXPORTER_OTLP_ENDPOINT,
+    OTEL_SERVICE_NAME,
+    TRACE_FILE,
+    TRACE_EXPORT_INTERVAL,
+    TRACE_EXPORT_BATCH_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+# OTLP enum values
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Response sizes from 1 KB to 10 MB
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, Any]]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in (labels or {}).items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with one series per label set."""
+
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Optional[Dict[str, Any]] = None, amount: float = 1) -> None:
+        """Add ``amount`` to the series of ``labels``."""
+        key = _label_key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, labels: Optional[Dict[str, Any]] = None) -> float:
+        """Return the current value of one series."""
+        with self._lock:
+            return self.values.get(_label_key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+                    for labels, value in sorted(self.values.items())]
+
+
+class Histogram:
+    """Histogram with cumulative buckets, one series per label set."""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # Per label set: non-cumulative count per bucket plus +Inf, the sum and the count
+        self.series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, labels: Optional[Dict[str, Any]] = None) -> None:
+        """Record one observation in the series of ``labels``."""
+        key = _label_key(labels)
+        with self._lock:
+            counts, totals = self.series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0, 0]))
+            counts[bisect_left(self.buckets, value)] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def count(self, labels: Optional[Dict[str, Any]] = None) -> int:
+        """Return the number of observations in one series."""
+        with self._lock:
+            series = self.series.get(_label_key(labels))
+            return int(series[1][1]) if series else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for labels, (counts, (total, count)) in sorted(self.series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', _format_value(bound)))} "
+                                 f"{cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {int(count)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named counters and histograms, rendered together for a scrape."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, Any] = {}
+
+    def counter(self, name: str, documentation: str = '') -> Counter:
+        """Return the counter called ``name``, creating it on first use."""
+        with self._lock:
+            return self.metrics.setdefault(name, Counter(name, documentation))
+
+    def histogram(self, name: str, documentation: str = '', buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Return the histogram called ``name``, creating it on first use."""
+        with self._lock:
+            return self.metrics.setdefault(name, Histogram(name, documentation, buckets))
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            if metric.documentation:
+                lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+# Span kinds recorded by the agent; each gets a duration histogram and an error counter
+SPAN_METRICS = {
+    'graph_run': 'Agent turn',
+    'graph_node': 'LangGraph node',
+    'tool': 'Tool invocation',
+    'fhir_request': 'FHIR HTTP request, including retries',
+    'llm_call': 'Chat model call',
+    'fhir_sync': 'Delta sync of one resource type',
+}
+
+
+class Span:
+    """One timed operation with attributes, nested under the span active when it started."""
+
+    def __init__(self, category: str, name: str, kind: int = SPAN_KIND_INTERNAL,
+                 attributes: Optional[Dict[str, Any]] = None, parent: Optional["Span"] = None):
+        self.category = category
+        self.name = name
+        self.kind = kind
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent.span_id if parent else ''
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self._started = time.monotonic()
+        self.duration = 0.0
+        self.status = STATUS_UNSET
+        self.status_message = ''
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Set one attribute; None values are skipped."""
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        """Set several attributes; None values are skipped."""
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def record_error(self, error: BaseException) -> None:
+        """Mark the span as failed with the exception's type."""
+        self.status = STATUS_ERROR
+        self.status_message = type(error).__name__
+        self.attributes['error.type'] = type(error).__name__
+
+    def end(self) -> None:
+        self.duration = time.monotonic() - self._started
+        self.end_ns = self.start_ns + int(self.duration * 1e9)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Encode the span as an OTLP/JSON span."""
+        encoded = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns or self.start_ns),
+            'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in self.attributes.items()],
+            'status': {'code': self.status, **({'message': self.status_message} if self.status_message else {})},
+        }
+        if self.parent_span_id:
+            encoded['parentSpanId'] = self.parent_span_id
+        return encoded
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def otlp_payload(spans: Sequence[Span], service_name: str = OTEL_SERVICE_NAME) -> Dict[str, Any]:
+    """Build an OTLP/JSON ``ExportTraceServiceRequest`` for a batch of spans.
+
+    Args:
+        spans: Finished spans
+        service_name: Value of the ``service.name`` resource attribute
+
+    Returns:
+        JSON-serializable export request
+    """
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': service_name}}]},
+        'scopeSpans': [{
+            'scope': {'name': __name__},
+            'spans': [span.to_otlp() for span in spans],
+        }],
+    }]}
+
+
+class BatchSpanExporter(abc.ABC):
+    """Collects finished spans and exports them in batches from a background thread.
+
+    A batch is written every ``interval`` seconds, as soon as ``batch_size``
+    spans are waiting, and on ``shutdown`` (registered with ``atexit``).
+    Spans beyond ``max_queue`` are dropped rather than slowing requests down.
+    """
+
+    def __init__(self, interval: float = TRACE_EXPORT_INTERVAL, batch_size: int = TRACE_EXPORT_BATCH_SIZE,
+                 max_queue: int = 8192, service_name: str = OTEL_SERVICE_NAME):
+        """Initialize the exporter.
+
+        Args:
+            interval: Seconds between exports
+            batch_size: Waiting spans that trigger an export
+            max_queue: Waiting spans kept before new ones are dropped
+            service_name: Value of the ``service.name`` resource attribute
+        """
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.service_name = service_name
+        self.dropped = 0
+        self._queue: List[Span] = []
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def export(self, span: Span) -> None:
+        """Queue a finished span, starting the export thread on first use."""
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                return
+            self._queue.append(span)
+            full = len(self._queue) >= self.batch_size
+            if self._thread is None and not self._stopped:
+                self._thread = threading.Thread(target=self._run, name='span-exporter', daemon=True)
+                self._thread.start()
+                atexit.register(self.shutdown)
+        if full:
+            self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Export every queued span now."""
+        with self._export_lock:
+            with self._lock:
+                batch, self._queue = self._queue, []
+            if not batch:
+                return
+            try:
+                self.write(otlp_payload(batch, self.service_name))
+            except Exception as e:
+                logger.warning(f"Exporting {len(batch)} spans failed: {e}")
+
+    def shutdown(self) -> None:
+        """Stop the export thread and export what is left."""
+        self._stopped = True
+        self._wake.set()
+        self.flush()
+
+    @abc.abstractmethod
+    def write(self, payload: Dict[str, Any]) -> None:
+        """Send one export request.
+
+        Args:
+            payload: OTLP/JSON ``ExportTraceServiceRequest`` body
+        """
+
+
+class FileSpanExporter(BatchSpanExporter):
+    """Appends each batch to a file as one line of OTLP/JSON."""
+
+    def __init__(self, path: str = TRACE_FILE, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+
+    def write(self, payload: Dict[str, Any]) -> None:
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(payload, separators=(',', ':')) + '\n')
+
+
+class OTLPHTTPSpanExporter(BatchSpanExporter):
+    """Posts each batch as OTLP/JSON to a collector's ``/v1/traces`` endpoint."""
+
+    def __init__(self, endpoint: str = OTEL_EXPORTER_OTLP_ENDPOINT, timeout: float = 10, **kwargs):
+        super().__init__(**kwargs)
+        self.url = endpoint.rstrip('/') + '/v1/traces'
+        self.timeout = timeout
+
+    def write(self, payload: Dict[str, Any]) -> None:
+        import requests
+
+        response = requests.post(self.url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+
+
+def build_exporter(name: str = OTEL_TRACES_EXPORTER) -> Optional[BatchSpanExporter]:
+    """Create the span exporter selected by ``OTEL_TRACES_EXPORTER``.
+
+    Args:
+        name: "file", "otlp" or "none"
+
+    Returns:
+        Exporter, or None when spans only feed the metrics
+    """
+    if name == 'file':
+        return FileSpanExporter()
+    if name == 'otlp':
+        return OTLPHTTPSpanExporter()
+    if name not in ('none', ''):
+        logger.warning(f"Unknown OTEL_TRACES_EXPORTER {name!r}, spans are not exported")
+    return None
+
+
+exporter = build_exporter()
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar('current_span', default=None)
+
+
+def current_span() -> Optional[Span]:
+    """Return the span active in this context, if any."""
+    return _current_span.get()
+
+
+@contextmanager
+def span(category: str, name: str, attributes: Optional[Dict[str, Any]] = None,
+         kind: int = SPAN_KIND_INTERNAL) -> Iterator[Span]:
+    """Time a block as a span nested under the current one.
+
+    An exception escaping the block marks the span as failed and is re-raised;
+    cancellation is not counted as an error.
+
+    Args:
+        category: Span kind, one of ``SPAN_METRICS``, used as the metric prefix
+        name: Span name, used as the metric ``name`` label
+        attributes: Initial attributes
+        kind: OTLP span kind
+
+    Yields:
+        The span, to add attributes to
+    """
+    current = Span(category, name, kind, attributes, parent=_current_span.get())
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        finish(current)
+
+
+def finish(finished: Span) -> None:
+    """Record a span's metrics and hand it to the exporter."""
+    finished.end()
+    description = SPAN_METRICS.get(finished.category, finished.category)
+    labels = {'name': finished.name}
+    metrics.histogram(f"{finished.category}_duration_seconds", f"{description} latency in seconds").observe(
+        finished.duration, labels)
+    if finished.status == STATUS_ERROR:
+        metrics.counter(f"{finished.category}_errors_total", f"{description} errors").inc(labels)
+    if exporter is not None:
+        exporter.export(finished)
+
+
+def traced(category: str, name: Optional[str] = None) -> Callable[[Callable], Callable]:
+    """Decorate a sync or async function so each call runs in a span.
+
+    Args:
+        category: Span kind, one of ``SPAN_METRICS``
+        name: Span name, defaults to the function name
+
+    Returns:
+        Decorator keeping the function's signature
+    """
+    def decorate(func: Callable) -> Callable:
+        span_name = name or func.__name__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(category, span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(category, span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
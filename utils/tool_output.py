@@ -0,0 +1,175 @@
+"""Compact rendering of tool results for LLM prompts.
+
+Lists of homogeneous records become a header row plus one ``|``-separated row
+per record, and common FHIR datatypes are flattened to short strings, which
+takes far fewer prompt tokens than indented JSON.
+"""
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from config import TOOL_OUTPUT_FORMAT, TOOL_OUTPUT_MAX_CHARS
+
+logger = logging.getLogger(__name__)
+
+# Bookkeeping fields that carry nothing the model needs
+OMIT_KEYS = ('meta', 'text')
+
+
+def flatten_value(value: Any) -> str:
+    """Flatten a FHIR datatype to a short string.
+
+    Handles CodeableConcept, Coding, Quantity, Reference, Period, HumanName,
+    Address and ContactPoint/Identifier shapes; anything else falls back to
+    compact JSON.
+
+    Args:
+        value: Any JSON value
+
+    Returns:
+        Single-line string, empty for None
+    """
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return '; '.join(filter(None, (flatten_value(item) for item in value)))
+    if not isinstance(value, dict):
+        return str(value)
+    if 'coding' in value or set(value) == {'text'}:
+        codings = [
+            f"{c.get('display') or c.get('code')} [{c.get('code')}]" if c.get('display') else str(c.get('code'))
+            for c in value.get('coding', [])
+        ]
+        return '; '.join(codings) or value.get('text', '')
+    if isinstance(value.get('code'), dict) and any(key.startswith('value') for key in value):
+        # Observation component: "Systolic blood pressure [8480-6]=122 mmHg"
+        measured = next(value[key] for key in value if key.startswith('value'))
+        return f"{flatten_value(value['code'])}={flatten_value(measured)}"
+    if 'value' in value and ('unit' in value or 'code' in value):
+        return f"{value['value']} {value.get('unit') or value.get('code')}"
+    if 'reference' in value or ('display' in value and set(value) <= {'display', 'type', 'identifier'}):
+        return ' '.join(filter(None, (value.get('reference'), value.get('display'))))
+    if set(value) <= {'start', 'end'}:
+        return f"{value.get('start', '')}..{value.get('end', '')}"
+    if 'family' in value or 'given' in value:
+        return ' '.join([*value.get('given', []), value.get('family', '')]).strip()
+    if 'city' in value or 'line' in value:
+        parts = [', '.join(value.get('line', [])), value.get('city'), value.get('state'), value.get('postalCode')]
+        return ', '.join(filter(None, parts))
+    if 'system' in value and 'value' in value:
+        return f"{value['system']}: {value['value']}"
+    if 'code' in value and 'system' in value:
+        return value.get('display') or value['code']
+    return json.dumps(value, separators=(',', ':'))
+
+
+def _cell(value: Any) -> str:
+    return flatten_value(value).replace('|', '/').replace('\n', ' ')
+
+
+def to_table(records: List[Dict[str, Any]]) -> str:
+    """Render records as a header row plus one row per record.
+
+    Columns are the union of keys in first-seen order. Columns that are empty
+    in every record are dropped, and columns with the same value in every
+    record are stated once above the header instead of repeated per row.
+
+    Args:
+        records: List of flat or FHIR-shaped dicts
+
+    Returns:
+        Table text
+    """
+    columns: List[str] = []
+    for record in records:
+        columns.extend(k for k in record if k not in columns and k not in OMIT_KEYS)
+    rows = [[_cell(record.get(column)) for column in columns] for record in records]
+    keep = [i for i in range(len(columns)) if any(row[i] for row in rows)]
+    constant = [i for i in keep if len(rows) > 1 and all(row[i] == rows[0][i] for row in rows)]
+    lines = ['every row: ' + ', '.join(f"{columns[i]}={rows[0][i]}" for i in constant)] if constant else []
+    keep = [i for i in keep if i not in constant]
+    lines.append('|'.join(columns[i] for i in keep))
+    lines.extend('|'.join(row[i] for i in keep) for row in rows)
+    return '\n'.join(lines)
+
+
+def _is_records(value: Any) -> bool:
+    """Whether a value is a list of resources or tool records rather than datatypes."""
+    return (isinstance(value, list) and bool(value)
+            and all(isinstance(item, dict) and ('id' in item or 'resourceType' in item) for item in value))
+
+
+def _is_datatype(value: Dict[str, Any]) -> bool:
+    """Whether ``flatten_value`` has a dedicated rendering for this dict."""
+    return not flatten_value(value).startswith('{')
+
+
+def to_compact(data: Any) -> str:
+    """Render a tool result compactly.
+
+    Args:
+        data: Record list, dict of fields and record lists, or scalar
+
+    Returns:
+        Compact text
+    """
+    if _is_records(data):
+        return f"{len(data)} records\n{to_table(data)}"
+    if not isinstance(data, dict):
+        return flatten_value(data)
+    lines = []
+    for key, value in data.items():
+        if key in OMIT_KEYS or value in (None, [], {}):
+            continue
+        if _is_records(value):
+            lines.append(f"{key} ({len(value)} records):\n{to_table(value)}")
+        elif isinstance(value, dict) and not _is_datatype(value):
+            fields = [f"{k}={flatten_value(v)}" for k, v in value.items()
+                      if k not in OMIT_KEYS and v not in (None, [], {})]
+            lines.append(f"{key}: " + ', '.join(fields))
+        else:
+            lines.append(f"{key}: {flatten_value(value)}")
+    return '\n'.join(lines)
+
+
+def enforce_budget(text: str, max_chars: int) -> str:
+    """Cut text at a line boundary so it fits the budget, saying what was dropped.
+
+    Args:
+        text: Rendered output
+        max_chars: Character budget, 0 for unlimited
+
+    Returns:
+        Text of at most about ``max_chars`` characters
+    """
+    if not max_chars or len(text) <= max_chars:
+        return text
+    cut = text.rfind('\n', 0, max_chars)
+    kept = text[:cut if cut > 0 else max_chars]
+    dropped = text.count('\n', len(kept))
+    return f"{kept}\n[{dropped} more lines omitted to stay within {max_chars} characters; ask for less data to see them]"
+
+
+def format_tool_output(data: Any, output_format: Optional[str] = None, max_chars: Optional[int] = None) -> str:
+    """Render a tool result in the configured format and size budget.
+
+    Args:
+        data: Tool result
+        output_format: "compact" or "json", defaults to TOOL_OUTPUT_FORMAT
+        max_chars: Character budget, defaults to TOOL_OUTPUT_MAX_CHARS
+
+    Returns:
+        Text passed back to the model
+    """
+    output_format = output_format or TOOL_OUTPUT_FORMAT
+    max_chars = TOOL_OUTPUT_MAX_CHARS if max_chars is None else max_chars
+    if output_format == 'json':
+        text = json.dumps(data, indent=2)
+        if max_chars and len(text) > max_chars:
+            logger.warning(f"Tool output of {len(text)} characters exceeds the {max_chars} character budget")
+        return text
+    text = to_compact(data)
+    if max_chars and len(text) > max_chars:
+        logger.warning(f"Tool output of {len(text)} characters truncated to the {max_chars} character budget")
+        text = enforce_budget(text, max_chars)
+    return text